@@ -0,0 +1,193 @@
+#
+# bitree.py
+# Flat (array) representation of the top and left header trees of a table
+#
+
+from array import array
+
+
+class FlatTree(object):
+    """
+    A header tree stored as parallel arrays, one entry per node in preorder
+    (node 0 is the root, at (-1, -1)):
+    - rows, cols: the table coordinates (RI, CI) of the node
+    - parent: the parent node (-1 for the root)
+    - first_child, next_sibling: the first child and the next sibling of the node (-1 if none)
+    The nodes are also indexed by their table coordinates.
+    """
+
+    def __init__(self, rows, cols, parent):
+        """
+        :param rows: the RI of each node, in preorder
+        :param cols: the CI of each node, in preorder
+        :param parent: the parent of each node, in preorder (-1 for the root)
+        """
+        self.rows = array('i', rows)
+        self.cols = array('i', cols)
+        self.parent = array('i', parent)
+        num_nodes = len(self.rows)
+        self.first_child = array('i', [-1]) * num_nodes
+        self.next_sibling = array('i', [-1]) * num_nodes
+        self._index = {}
+        # The last child seen of each node, to link the siblings in order
+        last_child = [-1] * num_nodes
+        for node in range(num_nodes):
+            self._index.setdefault((self.rows[node], self.cols[node]), node)
+            p = self.parent[node]
+            if p < 0:
+                continue
+            if last_child[p] < 0:
+                self.first_child[p] = node
+            else:
+                self.next_sibling[last_child[p]] = node
+            last_child[p] = node
+
+    def __len__(self):
+        return len(self.rows)
+
+    @classmethod
+    def from_nested(cls, root):
+        """
+        Build the flat tree from the nested {'RI', 'CI', 'Cd'} format
+        :param root: the root node dict
+        :return: a FlatTree
+        """
+        rows, cols, parent = [], [], []
+        # Iterative preorder traversal: (node dict, parent id)
+        stack = [(root, -1)]
+        while stack:
+            node, p = stack.pop()
+            rows.append(node['RI'])
+            cols.append(node['CI'])
+            parent.append(p)
+            node_id = len(rows) - 1
+            for child in reversed(node['Cd']):
+                stack.append((child, node_id))
+        return cls(rows, cols, parent)
+
+    def to_nested(self):
+        """
+        Build the nested {'RI', 'CI', 'Cd'} format
+        :return: the root node dict
+        """
+        nodes = [{'RI': self.rows[node], 'CI': self.cols[node], 'Cd': []} for node in range(len(self))]
+        for node in range(1, len(self)):
+            nodes[self.parent[node]]['Cd'].append(nodes[node])
+        return nodes[0]
+
+    def to_json(self):
+        """
+        :return: a dict with the RI, CI and parent of each node (in preorder) that can be serialized to JSON
+        """
+        return {'RI': self.rows.tolist(), 'CI': self.cols.tolist(), 'Parent': self.parent.tolist()}
+
+    @classmethod
+    def from_json(cls, data):
+        """
+        :param data: a dict built by to_json
+        :return: a FlatTree
+        """
+        return cls(data['RI'], data['CI'], data['Parent'])
+
+    def node(self, row, column):
+        """
+        Find the node of a table cell
+        :param row: the row index
+        :param column: the column index
+        :return: the node id, or None if the cell is not a node of the tree
+        """
+        return self._index.get((row, column))
+
+    def children(self, node):
+        """
+        :param node: the node id
+        :return: the ids of the children of the node, in order
+        """
+        children = []
+        child = self.first_child[node]
+        while child >= 0:
+            children.append(child)
+            child = self.next_sibling[child]
+        return children
+
+    def ancestors(self, node, include_self=False):
+        """
+        Get the ancestors of a node, from the top level node down, without the root (O(depth))
+        :param node: the node id
+        :param include_self: whether to include the node
+        :return: a list with the (RI, CI) of the ancestors
+        """
+        path = []
+        if not include_self:
+            node = self.parent[node]
+        while node > 0:
+            path.append((self.rows[node], self.cols[node]))
+            node = self.parent[node]
+        path.reverse()
+        return path
+
+
+class BiTree(object):
+    """
+    The top and the left header trees of a table, with the header path queries of
+    its cells. The header of a column is its deepest node in the top tree and the
+    header of a row is its deepest node in the left tree.
+    """
+
+    def __init__(self, top, left):
+        """
+        :param top: the top tree (FlatTree)
+        :param left: the left tree (FlatTree)
+        """
+        self.top = top
+        self.left = left
+        self._column_nodes = self._deepest(top, top.cols, top.rows)
+        self._row_nodes = self._deepest(left, left.rows, left.cols)
+
+    @staticmethod
+    def _deepest(tree, keys, depths):
+        # The node with the largest depth coordinate for each key coordinate
+        nodes = {}
+        for node in range(1, len(tree)):
+            key = keys[node]
+            current = nodes.get(key)
+            if current is None or depths[node] > depths[current]:
+                nodes[key] = node
+        return nodes
+
+    @classmethod
+    def from_table(cls, table):
+        """
+        :param table: a table (dict or ColumnarTable) with TopTreeRoot and LeftTreeRoot
+        :return: a BiTree
+        """
+        return cls(FlatTree.from_nested(table['TopTreeRoot']), FlatTree.from_nested(table['LeftTreeRoot']))
+
+    def top_header_path(self, row, column):
+        """
+        Get the top header ancestors of a cell: the ancestors of the cell if it is a
+        node of the top tree, otherwise the path to the header of its column
+        :param row: the row index
+        :param column: the column index
+        :return: a list with the (RI, CI) of the headers, from the top level down
+        """
+        return self._path(self.top, self._column_nodes.get(column), row, column)
+
+    def left_header_path(self, row, column):
+        """
+        Get the left header ancestors of a cell: the ancestors of the cell if it is a
+        node of the left tree, otherwise the path to the header of its row
+        :param row: the row index
+        :param column: the column index
+        :return: a list with the (RI, CI) of the headers, from the top level down
+        """
+        return self._path(self.left, self._row_nodes.get(row), row, column)
+
+    @staticmethod
+    def _path(tree, header, row, column):
+        node = tree.node(row, column)
+        if node is not None:
+            return tree.ancestors(node)
+        if header is None:
+            return []
+        return tree.ancestors(header, include_self=True)
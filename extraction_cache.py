@@ -0,0 +1,243 @@
+#
+# extraction_cache.py
+# Content-addressed cache of the output files of the workbooks
+#
+
+import hashlib
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+from table_writer import temporary_path
+
+
+class ExtractionCache(object):
+    """
+    A directory of output files, keyed on the content hash of the workbook, the version
+    of the extractor and the options that change the output (see key), so that a
+    workbook that has already been processed (e.g. a re-filed or re-downloaded report,
+    or an overlapping batch job) is not processed again. Each entry is the output file
+    (<key>) with the number of its tables (<key>.meta). The least recently used entries
+    are evicted when the total size exceeds max_bytes; the modification time of an
+    entry is its last use, so the recency is shared by the processes of a batch run.
+    The total is scanned once when the cache is opened and then kept by each process
+    (adding the entries that it puts), so the directory is only scanned again to evict;
+    the entries put by the other processes meanwhile are counted at that scan.
+    A missing entry is claimed with a lock file (<key>.lock, see get_or_claim), so that
+    the workers that get identical workbooks at the same time wait for the one that
+    processes it instead of all processing it.
+    """
+
+    def __init__(self, directory, max_bytes=1 << 30, lock_timeout=3600, poll_interval=0.05):
+        """
+        :param directory: the cache directory (it is created if it does not exist)
+        :param max_bytes: the maximum total size of the entries
+        :param lock_timeout: the age after which the lock of an entry is ignored (seconds); the lock of a
+            process of this host that has died is ignored at once
+        :param poll_interval: how often to check whether a locked entry is complete (seconds)
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # The counters are shared by the threads of the thread executor
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # The total size of the entries (see _evict)
+        self._total = self._scan()[0]
+
+    def __getstate__(self):
+        # The cache is pickled to the worker processes, each with its own counters lock
+        state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(content_hash, version, **options):
+        """
+        Get the key of the output of a workbook
+        :param content_hash: the content hash of the workbook
+        :param version: the version of the extractor
+        :param options: the options that change the output (their repr must be stable)
+        :return: the key (a hex digest)
+        """
+        data = json.dumps([content_hash, version, sorted(options.items())], default=repr)
+        return hashlib.sha1(data.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _copy(self, key, path):
+        # Copy an entry to an output file; None if it is not cached, or evicted by another process meanwhile
+        entry = self._path(key)
+        tmp_path = temporary_path(path)
+        try:
+            with open(entry + '.meta') as fp:
+                num_tables = json.load(fp)['tables']
+            shutil.copyfile(entry, tmp_path)
+            os.utime(entry)
+        except (OSError, ValueError, KeyError):
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+        os.replace(tmp_path, path)
+        return num_tables
+
+    def get(self, key, path):
+        """
+        Copy the cached output to an output file
+        :param key: the key of the output
+        :param path: the path to the output file
+        :return: the number of tables of the output, or None on a miss
+        """
+        num_tables = self._copy(key, path)
+        self._count(num_tables is not None)
+        return num_tables
+
+    def _is_stale(self, lock):
+        try:
+            with open(lock) as fp:
+                host, _, pid = fp.read().rpartition(':')
+            age = time.time() - os.stat(lock).st_mtime
+        except (OSError, ValueError):
+            # Released meanwhile, or being written
+            return False
+        if age > self.lock_timeout:
+            return True
+        if host == socket.gethostname() and pid.isdigit():
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                return True
+            except OSError:
+                pass
+        return False
+
+    def _claim(self, key):
+        lock = self._path(key) + '.lock'
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if not self._is_stale(lock):
+                return False
+            try:
+                os.remove(lock)
+            except OSError:
+                pass
+            return False
+        with os.fdopen(fd, 'w') as fp:
+            fp.write(f'{socket.gethostname()}:{os.getpid()}')
+        return True
+
+    def get_or_claim(self, key, path):
+        """
+        Copy the cached output to an output file, or claim the entry to put it. If another
+        process (or thread) has claimed it, wait until it releases the entry.
+        :param key: the key of the output
+        :param path: the path to the output file
+        :return: a (number of tables, claimed) tuple: the number is None on a miss, and then the entry
+            is claimed and must be released (see release) after it is put
+        """
+        while True:
+            num_tables = self._copy(key, path)
+            if num_tables is not None:
+                self._count(True)
+                return num_tables, False
+            if self._claim(key):
+                self._count(False)
+                return None, True
+            while os.path.exists(self._path(key) + '.lock') and not self._is_stale(self._path(key) + '.lock'):
+                time.sleep(self.poll_interval)
+
+    def release(self, key):
+        """
+        Release an entry claimed with get_or_claim
+        :param key: the key of the output
+        :return:
+        """
+        try:
+            os.remove(self._path(key) + '.lock')
+        except OSError:
+            pass
+
+    def put(self, key, path, num_tables):
+        """
+        Add an output file to the cache and evict the least recently used entries
+        :param key: the key of the output
+        :param path: the path to the output file
+        :param num_tables: the number of tables of the output
+        :return:
+        """
+        entry = self._path(key)
+        # Each writer has its own temporary files; the metadata is written last, so an entry is only
+        # visible once complete
+        tmp_path = temporary_path(entry)
+        try:
+            shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, entry)
+            with open(tmp_path, 'w') as fp:
+                json.dump({'tables': num_tables}, fp)
+            os.replace(tmp_path, entry + '.meta')
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        size = 0
+        for name in (entry, entry + '.meta'):
+            try:
+                size += os.path.getsize(name)
+            except OSError:
+                pass
+        with self._lock:
+            self._total += size
+            full = self._total > self.max_bytes
+        if full:
+            self._evict()
+
+    def _scan(self):
+        # The total size of the entries, and the (last use, size, path) of each output file
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for item in it:
+                if item.name.endswith('.tmp') or item.name.endswith('.lock'):
+                    continue
+                try:
+                    stat = item.stat()
+                except OSError:
+                    continue
+                total += stat.st_size
+                if not item.name.endswith('.meta'):
+                    entries.append((stat.st_mtime, stat.st_size, item.path))
+        return total, entries
+
+    def _evict(self):
+        total, entries = self._scan()
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            for name in (path + '.meta', path):
+                try:
+                    total -= os.stat(name).st_size
+                    os.remove(name)
+                except OSError:
+                    pass
+            self.evictions += 1
+        with self._lock:
+            self._total = total
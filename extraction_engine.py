@@ -0,0 +1,1893 @@
+#
+# extraction_engine.py
+# Extract tables from xlsx files, in this process or with a pool of processes or threads
+#
+
+import argparse
+from contextlib import nullcontext
+from functools import partial, lru_cache
+from openpyxl import load_workbook
+from tqdm import tqdm
+from os import walk
+from openpyxl.cell.cell import Cell
+from openpyxl.styles.numbers import is_date_format
+from openpyxl.utils.cell import get_column_letter
+import logging
+import itertools
+import os
+import queue
+import re
+import threading
+import time
+import unicodedata
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from tqdm import *
+from table_model import ColumnarTable, MergedRegionIndex, TABLE_CONSTANTS
+from xlsx_stream import StreamWorkbook
+from table_writer import TableWriter, OUTPUT_FORMATS, SCHEMAS, output_path, remove_temporary_files
+from table_shards import ShardWriter, SHARD_BYTES
+from sheet_filter import SheetFilter, parse_positions
+from sheet_grid import SheetGrid, read_grids
+from run_manifest import RunManifest, file_fingerprint, file_hash, DONE, FAILED, TIMEOUT, KILLED
+from extraction_cache import ExtractionCache
+from memory_budget import MemoryAdmission, PeakMemory
+from worker_pool import WorkerPool, WorkerKilled
+from job_queue import JobQueue, Heartbeat, worker_id, RUNNING
+from log_queue import LogListener, LOG_FORMATS, parse_levels, flush_records
+from multiprocessing import Process
+
+logFormatter = logging.Formatter(
+    "%(asctime)s [%(threadName)-12.12s] [%(levelname)-5.5s]\t%(message)s")
+skippedTables_logFormatter = logging.Formatter(
+    "%(message)s")
+
+rootLogger = logging.getLogger('Main')
+skippedLogger = logging.getLogger('SkippedTables')
+
+fileHandler = logging.FileHandler(
+    "{0}/{1}.log".format('./', 'output'), 'w')
+
+skippedTables_fileHandler = logging.FileHandler(
+    "{0}/{1}.log".format('./', 'skipped_tables'), 'w')
+
+fileHandler.setFormatter(logFormatter)
+skippedTables_fileHandler.setFormatter(skippedTables_logFormatter)
+
+rootLogger.addHandler(fileHandler)
+skippedLogger.addHandler(skippedTables_fileHandler)
+
+rootLogger.setLevel(logging.INFO)
+skippedLogger.setLevel(logging.INFO)
+
+# Available workbook readers:
+# openpyxl: load the full openpyxl object model (default)
+# stream: read the xlsx parts directly and parse each sheet lazily (see xlsx_stream.py)
+ENGINES = ('openpyxl', 'stream')
+
+# Footnote marks, e.g. [1]
+_FOOTNOTE_RE = re.compile(r"\[\d\]")
+# The sections of the number formats for _classify_number_format
+_CURRENCY_TAG_RE = re.compile(r"\[\$([^\]-]*)(?:-[^\]]*)?\]")
+_FORMAT_BRACKETS_RE = re.compile(r"\[[^\]]*\]")
+_CURRENCY_SYMBOLS = ('$', '\u20ac', '\u00a3', '\u00a5')  # dollar, euro, pound, yen
+# The numeric texts for the typed values: an optional sign or accounting parentheses,
+# an optional currency symbol and a number with optional thousands separators
+_NUMBER_RE = re.compile(r"^\s*(\()?\s*([-+])?\s*[$\u20ac\u00a3\u00a5]?\s*"
+                        r"((?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d*)?(?:[eE][-+]?\d+)?|\.\d+)\s*(?(1)\))\s*$")
+# The scale of the table values in the title, e.g. "... - USD ($) shares in Thousands, $ in Millions"
+_SCALE_RE = re.compile(r"(\S+) in (Thousands|Millions|Billions)\b")
+_SCALE_FACTORS = {'Thousands': 1000, 'Millions': 1000000, 'Billions': 1000000000}
+
+# Worksheets rejected before the extraction of their styles, per reason:
+# number of sheets, number of cells and estimated time saved (see _record_rejection)
+rejection_stats = {}
+# Workbooks found in the extraction cache by the last batch run, and not found
+cache_stats = {'hits': 0, 'misses': 0}
+# Style extraction cost of the processed worksheets (cells, seconds)
+_style_timing = {'cells': 0, 'seconds': 0.0}
+# Guards the statistics above when the workbooks are processed by threads
+_stats_lock = threading.Lock()
+
+# Executors of the batch processing:
+# serial: the workbooks are processed one by one in this process
+# process: a pool of worker processes (default)
+# thread: a pool of threads, which avoids the pickling of the workbooks and the tables
+#         (for the free-threaded builds of Python; with the GIL the threads do not run in parallel)
+EXECUTORS = ('serial', 'process', 'thread')
+# Units of work of the batch processing:
+# file: each workbook is processed by a single worker
+# sheet: the worksheets of the workbooks are distributed to the workers (requires the stream engine)
+PARALLELISM = ('file', 'sheet')
+# The directory of the grids saved for the rederive mode (see process_wb and rederive_wb)
+GRID_DIR = './grids'
+# The version of the table heuristics, part of the keys of the extraction cache:
+# it must be increased when a change of the heuristics changes the output
+EXTRACTOR_VERSION = 1
+# The default manifest of the batch runs (see run_manifest.py)
+MANIFEST_PATH = './output/manifest.jsonl'
+# The batches of small workbooks that are submitted to the workers as a single task
+# (see _schedule): their total size and their maximum number of workbooks
+BATCH_BYTES = 256 << 10
+BATCH_FILES = 32
+# The end of the items of _imap_bounded
+_NO_ITEM = object()
+# The workbook that a worker keeps open in sheet-level parallelism (see process_sheet)
+_worker_workbook = {}
+# The ShardWriter of each worker process and thread (see _shard_writer)
+_shard_writers = {}
+
+
+def _get_cell_font_attributes(cell):
+    """
+    Get the cell font attributes
+    :param cell:  the input cell
+    :return: a dictionary with the attributes
+    """
+    attrs = {
+        'font_name': None,
+        'font_size': None,
+        'wrap_text': None,
+        'BC': 0,  # non-white background
+        'FC': 0,  # non-black font color
+        'FB': 0,  # has font bold
+        'I': 0,  # has font italic
+    }
+    if cell.has_style:
+        font = cell.font
+        alignment = cell.alignment
+        attrs['font_name'] = font.name
+        attrs['font_size'] = font.sz
+        attrs['wrap_text'] = alignment.wrapText
+        if font.b:
+            attrs['FB'] = 1
+        if font.i:
+            attrs['I'] = 1
+        color = font.color
+        if color is not None:
+            if color.rgb is None or color.type != 'rgb':
+                attrs['FC'] = 0
+            else:
+                attrs['FC'] = 1
+        else:
+            attrs['FC'] = 0
+    return attrs
+
+
+@lru_cache(maxsize=4096)
+def _classify_number_format(number_format):
+    """
+    Get the data type of the numeric cells with the given number format. The
+    format is parsed once and the result is cached (LRU) for the next cells.
+    :param number_format: the number format code of the cell
+    :return: the data type code (DT)
+    """
+    # Keep the symbol of the [$<symbol>-<locale>] currency tags and drop the other bracket
+    # sections (colors, conditions, elapsed time), which do not show up in the cell
+    code = _CURRENCY_TAG_RE.sub(r'\1', number_format)
+    code = _FORMAT_BRACKETS_RE.sub('', code)
+    if '%' in code:
+        return 3  # percentage
+    elif any(symbol in code for symbol in _CURRENCY_SYMBOLS):
+        return 4  # currency
+    elif is_date_format(number_format):
+        return 2  # date
+    return 1  # number
+
+
+def _get_cell_data_type(cell):
+    """
+    Get the data type of a cell
+    :param cell: the input cell
+    :return: the data type code (DT)
+    """
+    dt = cell.data_type
+    if dt == 's':
+        return 0  # 0: string
+    elif dt == 'd':
+        return 2  # 2: date
+    elif dt == 'n':
+        if cell.value is None:
+            return 1  # empty cells have no symbol to show
+        # The percent and currency symbols are in the number format and not in the value
+        return _classify_number_format(cell.number_format)
+    return 5
+
+
+def _get_cell_data_attributes(cell):
+    """
+    Get the data attributes of a cell
+    :param cell: the input cell
+    :return: a dictionary with the data attributes
+    """
+    attrs = {'NS': cell.number_format, 'DT': _get_cell_data_type(cell)}
+    return attrs
+
+
+def _get_cell_border_attributes(cell):
+    """
+    Get the border attributes for the cell
+    :param cell: the input cell
+    :return: a dictionary with the border attributes
+    """
+    attrs = {
+        'LB': 0,  # has left border
+        'TB': 0,  # has top border
+        'BB': 0,  # has bottom border
+        'RB': 0  # has right border
+    }
+    if cell.border is not None:
+        if cell.border.left.style is not None:
+            attrs['LB'] = 1
+        if cell.border.top.style is not None:
+            attrs['TB'] = 1
+        if cell.border.bottom.style is not None:
+            attrs['BB'] = 1
+        if cell.border.right.style is not None:
+            attrs['RB'] = 1
+    return attrs
+
+
+def _get_cell_alignment_attributes(cell):
+    """
+    Get the alignment attributes of the cell
+
+    For the horizontal alignment:
+    # center=0,
+    # center_across_selection=1,
+    # distributed=2,
+    # fill=3,
+    # general=4,
+    # justify=5,
+    # left=6,
+    # right=7
+    Openpyxl offers the following:
+    {fill, left, distributed, general, centerContinuous, justify, center, right}
+
+    For the vertical alignment:
+    # top=0,
+    # center=1,
+    # bottom=2,
+    # justify=3,
+    # distributed=4
+    Openpyxl offers the following:
+    {distributed, top, justify, center, bottom}
+
+    :param cell: the input cell
+    :return: a dictionary with the alignment attributes
+    """
+    attrs = {
+        'O': None,  # orientation?
+        'HA': 0,  # horizontal align
+        'VA': 1  # vertical align
+    }
+    if cell.has_style:
+        alignment = cell.alignment
+        if alignment.horizontal == 'center':
+            attrs['HA'] = 0
+        if alignment.horizontal == 'centerContinuous':
+            attrs['HA'] = 1
+        if alignment.horizontal == 'distributed':
+            attrs['HA'] = 2
+        if alignment.horizontal == 'fill':
+            attrs['HA'] = 3
+        if alignment.horizontal == 'general':
+            attrs['HA'] = 4
+        if alignment.horizontal == 'justify':
+            attrs['HA'] = 5
+        if alignment.horizontal == 'left':
+            attrs['HA'] = 6
+        if alignment.horizontal == 'right':
+            attrs['HA'] = 7
+        if alignment.vertical == 'top':
+            attrs['VA'] = 0
+        if alignment.vertical == 'center':
+            attrs['VA'] = 1
+        if alignment.vertical == 'bottom':
+            attrs['VA'] = 2
+        if alignment.vertical == 'justify':
+            attrs['VA'] = 3
+        if alignment.vertical == 'distributed':
+            attrs['VA'] = 4
+        attrs['O'] = alignment.textRotation
+    return attrs
+
+
+def _get_cell_fill_attributes(cell):
+    """
+    Get the fill attributes of the cell
+    :param cell: the input cell
+    :return: a dictionary with the fill attributes
+    """
+    attrs = {
+        'BC': 0  # non-white background
+    }
+    if cell.has_style:
+        fill = cell.fill
+        if fill.tagname == 'gradientFill':
+            attrs['BC'] = 1
+        elif fill.patternType not in (None, 'none'):
+            color = fill.fgColor
+            if color is None:
+                attrs['BC'] = 1
+            elif color.type == 'rgb':
+                # Alpha is ignored: both FFFFFFFF and 00FFFFFF are white
+                attrs['BC'] = 0 if color.rgb[-6:].upper() == 'FFFFFF' else 1
+            elif color.type == 'theme':
+                # Theme color 0 is the light background (white)
+                attrs['BC'] = 0 if color.theme == 0 and not color.tint else 1
+            elif color.type == 'indexed':
+                # 1 and 9 are white, 64 is the system foreground (automatic)
+                attrs['BC'] = 0 if color.indexed in (1, 9, 64) else 1
+            else:
+                attrs['BC'] = 1
+    return attrs
+
+
+def _get_cell_style_attributes(cell, style_cache):
+    """
+    Get all the style attributes of a cell.
+    The attributes only depend on the cell style and the data type, so they are
+    computed once per (style id, data type) and the resulting dictionary is shared
+    by all the cells with the same key. It must not be modified by the caller.
+    :param cell: the input cell
+    :param style_cache: a dictionary that caches the attributes of a workbook
+    :return: a dictionary with the style attributes
+    """
+    key = (cell.style_id, _get_cell_data_type(cell))
+    style = style_cache.get(key)
+    if style is None:
+        style = {
+            'HF': 0,  # has_formula
+            'A1': '',  # formula-specific
+            'R1': '',  # formula-specific
+        }
+        style.update(_get_cell_font_attributes(cell))
+        style.update(_get_cell_data_attributes(cell))
+        style.update(_get_cell_border_attributes(cell))
+        style.update(_get_cell_alignment_attributes(cell))
+        style.update(_get_cell_fill_attributes(cell))
+        # Other styles to consider in the future: cell.protection
+        style_cache[key] = style
+    return style
+
+
+def _get_merged_regions(merged_bounds, table_content, removed_idx, removed_rows, origin=(1, 1), size=None):
+    """
+    Get the merged regions of a worksheet
+    :param merged_bounds: the (min_row, min_col, max_row, max_col) of the merged ranges of the worksheet
+    :param table_content: the (remaining) rows of the table
+    :param removed_idx: the index of the removed empty row, if any
+    :param removed_rows: the indices of the removed footnote rows
+    :param origin: the (row, column) of the top left cell of the table in the worksheet
+    :param size: the (rows, columns) of the table in the worksheet, before the removal of rows; the regions
+        outside it are dropped and those across it clipped
+    :return: a MergedRegionIndex with the merged regions
+    """
+    merged = MergedRegionIndex.from_bounds(merged_bounds, origin, size)
+    # Sanity checks and corrections due to possibly removed rows
+    if removed_idx is None and len(removed_rows) == 0:
+        return merged
+    # The regions below a removed row move up and those that are not between the table
+    # boundaries were at the bottom (with footnotes) and they have been removed
+    return merged.adjusted(removed_idx, len(table_content))
+
+
+def _get_top_tree(table):
+    """
+    Infer the top tree from the given table
+    :param table: the given table as a ColumnarTable
+    :return: a dictionary with the updated table
+    """
+    top_header_rows_number = 1
+    # All nodes in the tree contain table coordinates (and not tree coordinates)
+    # Set the top tree root which is always (-1,-1)
+    top_tree = {
+        'RI': -1,
+        'CI': -1,
+        'Cd': []
+    }
+    # Check for the header rows
+    # Scan the merged regions to see whether the top left cell is merged
+    merged = table.merged_index
+    if merged.has_region(0, 1, 0, 0):
+        top_header_rows_number = 2
+    num_columns = table.num_columns
+    if top_header_rows_number == 1:
+        for index in range(1, num_columns):
+            node = {
+                'RI': 0,
+                'CI': index,
+                'Cd': []
+            }
+            top_tree['Cd'].append(node)
+
+    if top_header_rows_number == 2:
+        # Check merged regions for top row:
+        merged_columns = merged.top_row_spans
+        for index in range(1, num_columns):
+            node = {
+                'RI': 0,
+                'CI': index,
+                'Cd': []
+            }
+            if table.value(0, index) != 'None':
+                top_tree['Cd'].append(node)
+        # Get the second row (an IndexError is raised if there is none)
+        if table.num_rows < 2:
+            raise IndexError('list index out of range')
+        # Check if we have merged columns on top row
+        if len(merged_columns) == 0:
+            # Then  the first column is child of the above (row,column) and the
+            # remaining columns are childer of topRoot
+            for idx in range(1, num_columns):
+                node = {
+                    'RI': 1,
+                    'CI': idx,
+                    'Cd': []
+                }
+                if table.value(1, idx) != 'None':
+                    if idx == 1:
+                        top_tree['Cd'][0]['Cd'].append(node)
+                    else:
+                        top_tree['Cd'].append(node)
+        else:
+            # There are merged regions in the top row
+            top_nodes_number = len(merged_columns)
+            for index in range(num_columns):
+                node_added = False
+                if index != 0:
+                    node = {
+                        'RI': 1,
+                        'CI': index,
+                        'Cd': []
+                    }
+                    parent_node = merged.top_row_span(index)
+                    if parent_node is not None:
+                        if parent_node < len(top_tree['Cd']):
+                            # This means that there is a parent node for this node
+                            top_tree['Cd'][parent_node]['Cd'].append(node)
+                        else:
+                            # Else although there is a merged region, it is by mistake and
+                            # has no value
+                            # (see: 888491_2020_10-K_0000888491-20-000007.xlsx -> SUMMARY OF SIGNIFICANT ACCOUNTING POLICIES (Narrative) (Detail))
+                            top_tree['Cd'].append(node)
+                        node_added = True
+                    if node_added is False:
+                        # Then this node does not belong under a merged region
+                        # and should be a direct child of the root node
+                        top_tree['Cd'].append(node)
+    # We always need to include the first cell of the row as a child of top tree in the first place
+    # Get the col coordinate of the first child that we have included up to now:
+    row_idx = top_tree['Cd'][0]['RI']
+    col_idx = top_tree['Cd'][0]['CI']
+    for i in reversed(range(0, col_idx)):
+        node = {
+            'RI': row_idx,
+            'CI': i,
+            'Cd': []
+        }
+        top_tree['Cd'].insert(0, node)
+    updated_table = {
+        'TopHeaderRowsNumber': top_header_rows_number,
+        'TopTreeRoot': top_tree
+    }
+    return updated_table
+
+
+def _get_left_tree(table):
+    """
+    Infer the left tree from the given table
+    :param table: the given table as a ColumnarTable
+    :return: an updated table with the left tree info
+    """
+    left_header_columns_number = 1
+    # All nodes in the tree contain table coordinates (and not tree coordinates)
+    # Set the left tree root which is always (-1,-1)
+    left_tree = {
+        'RI': -1,
+        'CI': -1,
+        'Cd': []
+    }
+    # Get the top header rows number to see in which row we should start
+    top_headers = table['TopHeaderRowsNumber']
+    row_start = top_headers
+    # Scan the rows from that starting point
+    have_seen_bolds = False
+    parent = -1
+    for row_number in range(row_start, table.num_rows):
+        # Decide if this is a top child
+        # Check if the cell is bold
+        node = {
+            'RI': row_number,
+            'CI': 0,
+            'Cd': []
+        }
+        if table.style(row_number, 0)['FB'] == 1:
+            left_tree['Cd'].append(node)
+            have_seen_bolds = True
+            left_header_columns_number = 2
+            parent += 1
+        else:
+            if have_seen_bolds is False:
+                left_tree['Cd'].append(node)
+                parent += 1
+            else:
+                left_tree['Cd'][parent]['Cd'].append(node)
+    # We always need to include the first cell of the column as a child of left tree in the first place
+    # Get the row coordinate of the first child that we have included up to now:
+    row_idx = left_tree['Cd'][0]['RI']
+    col_idx = left_tree['Cd'][0]['CI']
+    for i in reversed(range(0, row_idx)):
+        node = {
+            'RI': i,
+            'CI': col_idx,
+            'Cd': []
+        }
+        left_tree['Cd'].insert(0, node)
+    updated_table = {
+        'LeftHeaderColumnsNumber': left_header_columns_number,
+        'LeftTreeRoot': left_tree
+    }
+    return updated_table
+
+
+def _calculate_dimensions(original_dims, table_content):
+    """
+    Calculate the dimensions of the table given the original dimensions
+    and the final content (i.e. table content)
+    :param original_dims: the original dimensions
+    :param table_content: the table content
+    :return: the new dimensions
+    """
+    num_rows_in_content = len(table_content)
+    final_dims = original_dims
+    original_start = original_dims.split(':')[0]
+    original_end = original_dims.split(':')[1]
+    match_start = re.match(r"([a-z]+)([0-9]+)", original_start, re.I)
+    match_end = re.match(r"([a-z]+)([0-9]+)", original_end, re.I)
+    if match_start and match_end:
+        start_items = match_start.groups()
+        start_row = int(start_items[1])
+        start_col = start_items[0]
+        end_items = match_end.groups()
+        end_row = int(end_items[1])
+        end_col = end_items[0]
+        # Check if there is a missmatch because of lines that have been removed
+        if (end_row - start_row + 1) == num_rows_in_content:
+            return final_dims
+        else:
+            diff = end_row - num_rows_in_content
+            end_row = end_row - diff
+            # create final dims
+            final_dims = start_col + str(start_row) + ':' + end_col + str(end_row)
+            return final_dims
+
+
+def _get_used_range(ws):
+    """
+    Get the range of the cells that hold values. Stray formatting outside of it
+    is ignored and only the existing cells are visited, so the cost depends on
+    the content and not on the dimensions of the worksheet.
+    :param ws: the worksheet
+    :return: None if no cell holds a value, otherwise a tuple with:
+        the used range, e.g. A1:D20
+        the (row, column) of its top left cell
+        the cell values, as a list of rows (None for missing cells)
+        the cells, as a list of rows (None for missing cells)
+    """
+    cells = [(coord, cell) for coord, cell in ws._cells.items() if cell.value is not None]
+    if not cells:
+        return None
+    rows = [coord[0] for coord, _ in cells]
+    cols = [coord[1] for coord, _ in cells]
+    min_row, max_row, min_col, max_col = min(rows), max(rows), min(cols), max(cols)
+    num_columns = max_col - min_col + 1
+    content = [[None] * num_columns for _ in range(max_row - min_row + 1)]
+    data = [[None] * num_columns for _ in range(max_row - min_row + 1)]
+    for (row, col), cell in ws._cells.items():
+        if min_row <= row <= max_row and min_col <= col <= max_col:
+            content[row - min_row][col - min_col] = cell.value
+            data[row - min_row][col - min_col] = cell
+    dims = f'{get_column_letter(min_col)}{min_row}:{get_column_letter(max_col)}{max_row}'
+    return dims, (min_row, min_col), content, data
+
+
+def _is_prefiltered(sheet_filter, worksheet, position):
+    """
+    Check whether a worksheet is rejected by the sheet filter, before it is parsed
+    :param sheet_filter: the SheetFilter or None
+    :param worksheet: the worksheet
+    :param position: the position of the worksheet in the workbook
+    :return: True if the worksheet must be skipped
+    """
+    if sheet_filter is None:
+        return False
+    reason = sheet_filter.reject_reason(worksheet, position)
+    if reason is None:
+        return False
+    _record_rejection('prefilter_' + reason, 0)
+    return True
+
+
+def _check_sheet_filter(sheet_filter, engine):
+    """
+    Check that the sheet filter can be applied to the worksheets of the engine
+    :param sheet_filter: the SheetFilter or None
+    :param engine: one of ENGINES
+    :return:
+    """
+    if sheet_filter is not None and sheet_filter.needs_stream_engine and engine != 'stream':
+        raise ValueError('Filtering the sheets by size or dimension requires the stream engine')
+
+
+def _record_rejection(reason, num_cells):
+    """
+    Update the statistics of the worksheets that have been rejected before the
+    extraction of their styles. The time saved is estimated from the average
+    style extraction time per cell of the processed worksheets.
+    :param reason: the rejection reason (empty_rows, long_text or prefilter_<SheetFilter reason>)
+    :param num_cells: the number of cells whose styles have not been extracted
+    :return:
+    """
+    with _stats_lock:
+        stats = rejection_stats.setdefault(reason, {'sheets': 0, 'cells': 0, 'seconds_saved': 0.0})
+        stats['sheets'] += 1
+        stats['cells'] += num_cells
+        if _style_timing['cells']:
+            stats['seconds_saved'] += num_cells * _style_timing['seconds'] / _style_timing['cells']
+
+
+def _rejection_snapshot():
+    """
+    :return: a copy of rejection_stats
+    """
+    with _stats_lock:
+        return {reason: dict(stats) for reason, stats in rejection_stats.items()}
+
+
+def _parse_number(text):
+    """
+    Get the numeric value of a cell text
+    :param text: the cell text, e.g. "1,234.5", "(1,234)" or "$ 100"
+    :return: an int or a float, or None if the text is not a number
+    """
+    match = _NUMBER_RE.match(text)
+    if match is None:
+        return None
+    digits = match.group(3).replace(',', '')
+    number = float(digits) if '.' in digits or 'e' in digits or 'E' in digits else int(digits)
+    if match.group(1) or match.group(2) == '-':
+        number = -number
+    return number
+
+
+def _parse_scale(title):
+    """
+    Get the scale factors of the table values from the table title
+    :param title: the table title, e.g. "Balance Sheet - USD ($) shares in Thousands, $ in Millions"
+    :return: a dictionary with the factor of each unit, e.g. {'shares': 1000, '$': 1000000}
+    """
+    return {unit: _SCALE_FACTORS[scale] for unit, scale in _SCALE_RE.findall(title)}
+
+
+def _scan_content(content, num_columns):
+    """
+    Scan the values of the worksheet in a single pass. The text of every cell,
+    its normalized form and its empty / long text verdicts are computed once
+    per distinct text, since labels like "$" and "None" repeat constantly.
+    :param content: the cell values, as a list of rows
+    :param num_columns: the number of columns
+    :return: a tuple with:
+        the text (str) of each cell, as a list of rows
+        the normalized text (V) of each cell, as a list of rows
+        the indices of the empty rows
+        the indices of the rows with a footnote mark in the first column
+        the indices of the rows with a cell of more than 20 words
+        the error raised when looking for a footnote mark in a non text cell, if any
+    """
+    memo = {}
+    texts = []
+    normalized = []
+    empty_rows = []
+    footnote_rows = []
+    long_text_rows = []
+    footnote_error = None
+    for rowid, row in enumerate(content):
+        row_texts = [str(d) for d in row]
+        row_normalized = []
+        num_nones = 0
+        has_long_text = False
+        for text in row_texts:
+            scanned = memo.get(text)
+            if scanned is None:
+                norm = unicodedata.normalize('NFKD', text).strip()
+                scanned = (
+                    "" if text == "None" else norm,
+                    norm == "" or norm == "None",
+                    # More than 20 words need more than 40 characters
+                    len(text) > 40 and len(text.split()) > 20
+                )
+                memo[text] = scanned
+            row_normalized.append(scanned[0])
+            if scanned[1]:
+                num_nones += 1
+            if scanned[2]:
+                has_long_text = True
+        texts.append(row_texts)
+        normalized.append(row_normalized)
+        if num_nones == num_columns:
+            empty_rows.append(rowid)
+        if has_long_text:
+            long_text_rows.append(rowid)
+        # check if the row is a footnote
+        if row[0] is not None and footnote_error is None:
+            try:
+                if _FOOTNOTE_RE.search(row[0]):
+                    footnote_rows.append(rowid)
+            except TypeError as e:
+                # Not a text cell
+                footnote_error = e
+    return texts, normalized, empty_rows, footnote_rows, long_text_rows, footnote_error
+
+
+class _WorksheetGrid(SheetGrid):
+    """
+    The grid of a worksheet that is being processed: the styles of the cells are
+    only extracted for the rows that the table heuristics keep.
+    """
+
+    def __init__(self, ws, style_cache, used_range):
+        dims, origin, content, data = used_range
+        merged = [(m.min_row, m.min_col, m.max_row, m.max_col) for m in ws.merged_cells.ranges if m is not None]
+        super().__init__(ws.title, dims, origin, content, merged)
+        self._cells = data
+        self._style_cache = style_cache
+        self._empty_cell = Cell(ws)
+
+    def row_styles(self, row):
+        # Missing cells have no style
+        empty_cell = self._empty_cell
+        style_cache = self._style_cache
+        return [_get_cell_style_attributes(cell if cell is not None else empty_cell, style_cache)
+                for cell in self._cells[row]]
+
+    def materialize(self):
+        """
+        Extract the styles of all the cells
+        :return: a SheetGrid that can be saved
+        """
+        palette = []
+        palette_ids = {}
+        style_ids = []
+        for row in range(len(self.values)):
+            row_ids = []
+            for style in self.row_styles(row):
+                palette_id = palette_ids.get(id(style))
+                if palette_id is None:
+                    palette_id = palette_ids[id(style)] = len(palette)
+                    palette.append(style)
+                row_ids.append(palette_id)
+            style_ids.append(row_ids)
+        return SheetGrid(self.title, self.dimensions, self.origin, self.values, self.merged, palette, style_ids)
+
+
+def read_grid(ws, style_cache=None):
+    """
+    Read the grid of the specified worksheet
+    :param ws: The worksheet
+    :param style_cache: The style attributes cache of the workbook (see _get_cell_style_attributes)
+    :return: A SheetGrid, or None if no cell holds a value
+    """
+    if style_cache is None:
+        style_cache = {}
+    # Access the table data based on the range of the cells that hold values
+    used_range = _get_used_range(ws)
+    if used_range is None:
+        return None
+    return _WorksheetGrid(ws, style_cache, used_range)
+
+
+def process_ws(ws, style_cache=None, columnar=False, typed_values=False):
+    """
+    Process the specified worksheet
+    :param ws: The worksheet to be processed
+    :param style_cache: The style attributes cache of the workbook (see _get_cell_style_attributes)
+    :param columnar: Return the table as a ColumnarTable instead of the legacy dict
+    :param typed_values: Add the numeric value of the cells (N) and the scale factors of the title (Scale)
+    :return: The table of the worksheet
+    """
+    grid = read_grid(ws, style_cache)
+    if grid is None:
+        # Nothing to extract
+        return None
+    return process_grid(grid, columnar, typed_values)
+
+
+def process_grid(grid, columnar=False, typed_values=False):
+    """
+    Apply the table heuristics to the grid of a worksheet
+    :param grid: The SheetGrid of the worksheet (see read_grid and sheet_grid.read_grids)
+    :param columnar: Return the table as a ColumnarTable instead of the legacy dict
+    :param typed_values: Add the numeric value of the cells (N) and the scale factors of the title (Scale)
+    :return: The table of the worksheet
+    """
+    dims, origin, content = grid.dimensions, grid.origin, grid.values
+
+    # Do not process the worksheet if there is a tiny table
+    # if len(content) < 5:
+    #    skippedLogger.info(f'{ws.title}')
+    #    return None
+    # Scan the content once: the text of each cell is normalized once and the
+    # empty row, footnote and long text verdicts are all derived from it.
+    # The styles are only extracted for the worksheets that pass these checks.
+    num_columns = len(content[0])
+    texts, normalized, empty_rows, footnote_rows, long_text_rows, footnote_error = \
+        _scan_content(content, num_columns)
+    # Do not process the worksheet if there are many empty rows
+    num_empty_rows = len(empty_rows)
+    empty_row_idx = empty_rows[-1] if empty_rows else None
+    if num_empty_rows > 1:
+        # Don't process the table
+        _record_rejection('empty_rows', len(content) * num_columns)
+        return None
+    removed_rows = set()
+    if 0 < num_empty_rows < 2 and empty_row_idx is not None:
+        removed_rows.add(empty_row_idx)
+    if footnote_error is not None:
+        raise footnote_error
+    # Remove the rows with footnotes (their indices after the removal of the empty row)
+    removed_rows.update(footnote_rows)
+    rows_with_footnotes = [i if empty_row_idx is None or i < empty_row_idx else i - 1
+                           for i in reversed(footnote_rows)]
+    kept = [i for i in range(len(content)) if i not in removed_rows]
+    if removed_rows:
+        content = [content[i] for i in kept]
+        texts = [texts[i] for i in kept]
+        normalized = [normalized[i] for i in kept]
+
+    # Do not process the worksheet if there are cells with large text content
+    if any(i not in removed_rows for i in long_text_rows):
+        skippedLogger.info(f'{grid.title}', extra={'sheet': grid.title, 'reason': 'long_text'})
+        _record_rejection('long_text', len(kept) * num_columns)
+        return None
+
+    # Get the styles of the remaining cells
+    start = time.perf_counter()
+    styles = [grid.row_styles(i) for i in kept]
+    with _stats_lock:
+        _style_timing['cells'] += len(kept) * num_columns
+        _style_timing['seconds'] += time.perf_counter() - start
+
+    # Get table title this is the cell (0,0), otherwise the spreadsheet name
+    title = str(content[0][0])
+    if title is None or title == '' or title == ' ':
+        title = grid.title
+    table_range = _calculate_dimensions(dims, content)
+    table = ColumnarTable({
+        'StorageAccount': TABLE_CONSTANTS['StorageAccount'],
+        'BlobName': TABLE_CONSTANTS['BlobName'],
+        'SheetName': grid.title,
+        'Language': TABLE_CONSTANTS['Language'],
+        'RangeAddress': table_range,
+        'Title': title,
+    }, len(content[0]))
+    # Process content
+    for idx, row in enumerate(content):
+        is_header = False
+        # Assumption about the first row
+        if idx == 0:
+            is_header = True
+
+        # Heuristics to assess whether a row seems like a header
+        if row[0] is None:
+            is_header = True
+        num_of_nones = sum(x is None for x in row)
+        if num_of_nones == len(row) - 1:
+            is_header = True
+
+        # Only the first cell of a non header row can be an attribute
+        is_attribute = not is_header and row[0] is not None
+        table.add_row(texts[idx], styles[idx], is_header, is_attribute, normalized[idx])
+    # Get the merged regions
+    table.merged_index = _get_merged_regions(grid.merged, content, empty_row_idx, rows_with_footnotes, origin,
+                                             (len(grid.values), num_columns))
+    table['MergedRegions'] = table.merged_index.regions
+    # Get the trees
+    top_tree_info = _get_top_tree(table)
+    table.update(top_tree_info)
+    left_tree_info = _get_left_tree(table)
+    table.update(left_tree_info)
+    if typed_values:
+        # Once per distinct text of the table
+        table.numbers = [_parse_number(text) for text in table.strings]
+        table['Scale'] = _parse_scale(title)
+    if columnar:
+        return table
+    return table.to_dict()
+
+
+def _open_workbook(file, engine='openpyxl'):
+    """
+    Open the specified workbook with the selected engine
+    :param file: the path to the workbook
+    :param engine: one of ENGINES
+    :return: the workbook
+    """
+    if engine == 'stream':
+        return StreamWorkbook(file)
+    if engine == 'openpyxl':
+        return load_workbook(file)
+    raise ValueError(f'Unknown engine: {engine}')
+
+
+def _iter_sheet_tables(wb, engine='openpyxl', typed_values=False, sheet_filter=None, grid_writer=None):
+    """
+    Process the sheets of an open workbook one by one
+    :param wb: The workbook (see _open_workbook)
+    :param engine: The engine that has read the workbook (one of ENGINES)
+    :param typed_values: Add the numeric values of the cells and the scale factors of the tables
+    :param sheet_filter: The SheetFilter that selects the worksheets to process
+    :param grid_writer: The TableWriter that saves the grids of the worksheets, if any
+    :return: A generator of the tables (ColumnarTable) of the worksheets that have meaningful information
+    """
+    # Get a list with all the worksheets
+    worksheets = wb.worksheets
+    # The style ids are shared by all the sheets of a workbook
+    style_cache = {}
+    try:
+        for i in range(len(worksheets)):
+            if _is_prefiltered(sheet_filter, worksheets[i], i):
+                continue
+            table = None
+            try:
+                worksheet = wb[worksheets[i].title]
+                grid = read_grid(worksheet, style_cache)
+                if grid is not None:
+                    if grid_writer is not None:
+                        _save_grid(grid_writer, grid)
+                    table = process_grid(grid, columnar=True, typed_values=typed_values)
+            except:
+                rootLogger.error(f'Skipped sheet: {worksheets[i].title}', extra={'sheet': worksheets[i].title})
+            if engine == 'stream':
+                worksheets[i].release()
+            if table is not None:
+                yield table
+    finally:
+        if engine == 'stream':
+            wb.close()
+
+
+def _extract_workbook(source, engine='openpyxl', typed_values=False, sheet_filter=None):
+    """
+    Extract the tables of a workbook in a worker process (see iter_tables)
+    :param source: The path or the file-like object of the workbook
+    :return: A list with the tables (ColumnarTable), empty if the workbook cannot be read
+    """
+    try:
+        return list(_iter_sheet_tables(_open_workbook(source, engine), engine, typed_values, sheet_filter))
+    except:
+        rootLogger.error(f'Skipped file: {source}')
+        return []
+
+
+def _put_result(completed, key, ok, result):
+    completed.put((key, ok, result))
+
+
+def _make_pool(executor, workers, limits=None):
+    """
+    Create the pool of workers of an executor
+    :param executor: process or thread (see EXECUTORS)
+    :param workers: The number of workers
+    :param limits: The time and memory limits of a task and the recycling of the workers (process only,
+        the keyword arguments of WorkerPool)
+    :return: The pool (with the apply_async interface of multiprocessing.Pool)
+    """
+    if executor == 'thread':
+        if limits:
+            raise ValueError('The limits of the workers require the process executor')
+        return ThreadPool(workers)
+    if executor == 'process':
+        return WorkerPool(workers, **limits) if limits else Pool(workers)
+    raise ValueError(f'Unknown executor: {executor}')
+
+
+def _flushed(func, *args):
+    """
+    Run a task in a worker process, and send its log records to the listener before its result, since the
+    worker may be terminated as soon as the result is received (see LogListener)
+    :param func: The function of the task
+    :param args: Its arguments
+    :return: The result of the function
+    """
+    try:
+        return func(*args)
+    finally:
+        flush_records()
+
+
+def _imap_bounded(func, items, workers=None, max_in_flight=None, admission=None, limits=None, executor='process'):
+    """
+    Apply a function to the items lazily, in a pool of workers. At most max_in_flight
+    items are submitted to the workers but not yet consumed, so neither the items
+    nor the results pile up in memory when the consumer is slower than the workers.
+    With an admission control, an item is only submitted while the total memory
+    estimate of the items in flight stays under the budget (an item is always
+    submitted when none is in flight, so that a single large item still runs).
+    :param func: The function (it must be picklable with the process executor)
+    :param items: An iterable of the items (they must be picklable with the process executor)
+    :param workers: The number of workers; None or 0 applies the function in this process
+    :param max_in_flight: The maximum number of items in flight (default: twice the number of workers)
+    :param admission: The MemoryAdmission that estimates the memory of the items
+    :param limits: The time and memory limits of an item and the recycling of the workers (the keyword
+        arguments of WorkerPool); the result of an item whose worker has been killed is the WorkerKilled error
+    :param executor: The executor of the function (one of EXECUTORS)
+    :return: A generator of (item, result) tuples, in the order of completion
+    """
+    if not workers or executor == 'serial':
+        for item in items:
+            yield item, func(item)
+        return
+    if max_in_flight is None:
+        max_in_flight = 2 * workers
+    # The results are put in the queue by the result handler thread of the pool
+    completed = queue.Queue()
+    # The items in flight and their memory estimates, by key
+    in_flight = {}
+    estimates = {}
+    reserved = 0
+    items = iter(items)
+    keys = itertools.count()
+    # The next item, held back until it is admitted
+    item = _NO_ITEM
+    # The worker processes log through a queue to a listener process (see LogListener)
+    listener = LogListener([rootLogger, skippedLogger]) if executor == 'process' else nullcontext()
+    if executor == 'process':
+        func = partial(_flushed, func)
+    with listener, _make_pool(executor, workers, limits) as p:
+        while True:
+            while len(in_flight) < max_in_flight:
+                if item is _NO_ITEM:
+                    item = next(items, _NO_ITEM)
+                    if item is _NO_ITEM:
+                        break
+                estimate = 0
+                if admission is not None:
+                    estimate = admission.estimate(item)
+                    if in_flight and reserved + estimate > admission.budget:
+                        break
+                key = next(keys)
+                in_flight[key] = item
+                estimates[key] = estimate
+                reserved += estimate
+                p.apply_async(func, (item,),
+                              callback=partial(_put_result, completed, key, True),
+                              error_callback=partial(_put_result, completed, key, False))
+                item = _NO_ITEM
+            if not in_flight:
+                return
+            key, ok, result = completed.get()
+            done = in_flight.pop(key)
+            reserved -= estimates.pop(key)
+            if not ok and not isinstance(result, WorkerKilled):
+                raise result
+            yield done, result
+
+
+def iter_tables(sources, engine='openpyxl', workers=None, max_in_flight=None, typed_values=False,
+                sheet_filter=None, executor='process'):
+    """
+    Extract the tables of the given workbooks without writing any file
+    :param sources: An iterable of paths or file-like objects of xlsx workbooks; with the process
+        executor the file-like objects must be picklable (e.g. BytesIO)
+    :param engine: The engine that reads the workbooks (one of ENGINES)
+    :param workers: The number of workers; None or 0 (or the serial executor) extracts the tables in
+        this process, lazily, one worksheet at a time
+    :param max_in_flight: The maximum number of workbooks that are processed or whose tables have not
+        been consumed yet (parallel only, default: twice the number of workers)
+    :param typed_values: Add the numeric values of the cells and the scale factors of the tables
+    :param sheet_filter: The SheetFilter that selects the worksheets to process
+    :param executor: The executor of the extraction (one of EXECUTORS)
+    :return: A generator of (source, table) tuples, where the table is a ColumnarTable (to_dict() gives
+        the JSON dict). In parallel, the workbooks come in the order of completion.
+    """
+    _check_sheet_filter(sheet_filter, engine)
+    if not workers or executor == 'serial':
+        for source in sources:
+            try:
+                wb = _open_workbook(source, engine)
+            except:
+                rootLogger.error(f'Skipped file: {source}')
+                continue
+            for table in _iter_sheet_tables(wb, engine, typed_values, sheet_filter):
+                yield source, table
+        return
+    extract = partial(_extract_workbook, engine=engine, typed_values=typed_values, sheet_filter=sheet_filter)
+    for source, tables in _imap_bounded(extract, sources, workers, max_in_flight, executor=executor):
+        for table in tables:
+            yield source, table
+
+
+def _shard_writer(directory, max_bytes=SHARD_BYTES, schema=1):
+    """
+    Get the ShardWriter of the current worker process and thread, so that the workers never share a shard
+    (a worker that replaces another one continues the shards of its slot, see ShardWriter)
+    :param directory: The directory of the shards
+    :param max_bytes: The size of the shards
+    :param schema: The schema of the tables (one of SCHEMAS)
+    :return: The ShardWriter
+    """
+    key = (directory, max_bytes, schema, os.getpid(), threading.get_ident())
+    if key not in _shard_writers:
+        _shard_writers[key] = ShardWriter(directory, max_bytes=max_bytes, schema=schema)
+    return _shard_writers[key]
+
+
+def close_shard_writers():
+    """
+    Close the ShardWriters of the current process (the workbooks are indexed as they complete, this only
+    closes the files)
+    :return:
+    """
+    for key in [key for key in _shard_writers if key[3] == os.getpid()]:
+        _shard_writers.pop(key).close()
+
+
+def _output(file, output_format='json', compress=False, shards=None):
+    # The output of a workbook: its output file, or the directory of the shards
+    return shards if shards is not None else output_path(file, output_format=output_format, compress=compress)
+
+
+def process_wb(file, engine='openpyxl', output_format='json', compress=False, schema=1, typed_values=False,
+               sheet_filter=None, save_grids=False, cache=None, content_hash=None, shards=None,
+               shard_size=SHARD_BYTES):
+    """
+    Process the sheets of the specified workbook
+    :param file: The path to the workbook to be processed
+    :param engine: The engine that reads the workbook (one of ENGINES)
+    :param output_format: The layout of the output file (one of OUTPUT_FORMATS)
+    :param compress: Whether to gzip compress the output file
+    :param schema: The schema of the output file (one of SCHEMAS)
+    :param typed_values: Add the numeric values of the cells and the scale factors of the tables
+    :param sheet_filter: The SheetFilter that selects the worksheets to process
+    :param save_grids: Also save the grids of the worksheets to GRID_DIR (see rederive_wb)
+    :param cache: The ExtractionCache of the output files; a cached output is copied instead of processing
+        the workbook (unless the grids are saved)
+    :param content_hash: The content hash of the workbook, if known (see file_hash)
+    :param shards: The directory of the shards to append the tables to (see ShardWriter), instead of an output
+        file per workbook (output_format and compress are ignored, and so is the cache)
+    :param shard_size: The size of the shards in bytes
+    :return: A (number of tables, error) tuple; the number is None and the error is set if the file has been skipped
+    """
+    num_tables, error, cached = _process_wb(file, engine, output_format, compress, schema, typed_values,
+                                            sheet_filter, save_grids, cache, content_hash, shards, shard_size)
+    return num_tables, error
+
+
+def _process_wb(file, engine='openpyxl', output_format='json', compress=False, schema=1, typed_values=False,
+                sheet_filter=None, save_grids=False, cache=None, content_hash=None, shards=None,
+                shard_size=SHARD_BYTES):
+    """
+    Process the sheets of the specified workbook (see process_wb)
+    :return: A (number of tables, error, cached) tuple, where cached tells whether the output has been
+        copied from the cache
+    """
+    _check_sheet_filter(sheet_filter, engine)
+    start = time.perf_counter()
+    cache_key = None
+    claimed = False
+    try:
+        if shards is not None:
+            cache = None
+        output = output_path(file, output_format=output_format, compress=compress)
+        if cache is not None:
+            cache_key = cache.key(content_hash or file_hash(file), EXTRACTOR_VERSION, engine=engine,
+                                  output_format=output_format, compress=compress, schema=schema,
+                                  typed_values=typed_values, sheet_filter=sheet_filter)
+            if not save_grids:
+                # The identical workbooks that are processed meanwhile wait for the first one
+                num_tables, claimed = cache.get_or_claim(cache_key, output)
+                if num_tables is not None:
+                    rootLogger.info(f'Cached file: {file}: Found {num_tables} tables.',
+                                    extra={'file': file, 'tables': num_tables,
+                                           'duration': time.perf_counter() - start})
+                    return num_tables, None, True
+        wb = _open_workbook(file, engine)
+        rejected_before = _rejection_snapshot()
+        if save_grids:
+            os.makedirs(GRID_DIR, exist_ok=True)
+        # Save each table as soon as it is extracted
+        with (_shard_writer(shards, shard_size, schema).workbook(file) if shards is not None
+              else TableWriter(output, output_format, compress, schema)) as writer, \
+                (TableWriter(output_path(file, GRID_DIR, 'jsonl', True), 'jsonl', True) if save_grids
+                 else nullcontext()) as grid_writer:
+            for table in _iter_sheet_tables(wb, engine, typed_values, sheet_filter, grid_writer):
+                writer.write(table)
+        rootLogger.info(f'Processed file: {file}: Found {writer.num_tables} tables.',
+                        extra={'file': file, 'tables': writer.num_tables, 'duration': time.perf_counter() - start})
+        # With the thread executor, the rejections of the workbooks processed meanwhile are included
+        for reason, stats in _rejection_snapshot().items():
+            before = rejected_before.get(reason, {'sheets': 0, 'seconds_saved': 0.0})
+            if stats['sheets'] > before['sheets'] and reason.startswith('prefilter'):
+                rootLogger.info(f'Rejected sheets in {file}: {reason}: {stats["sheets"] - before["sheets"]}',
+                                extra={'file': file, 'reason': reason})
+            elif stats['sheets'] > before['sheets']:
+                rootLogger.info(f'Rejected sheets in {file}: {reason}: {stats["sheets"] - before["sheets"]} '
+                                f'(~{stats["seconds_saved"] - before["seconds_saved"]:.3f}s saved)',
+                                extra={'file': file, 'reason': reason})
+        if cache_key is not None:
+            try:
+                cache.put(cache_key, output, writer.num_tables)
+            except OSError:
+                rootLogger.error(f'Not cached file: {file}')
+        return writer.num_tables, None, False
+    except Exception as e:
+        rootLogger.error(f'Skipped file: {file}',
+                         extra={'file': file, 'reason': repr(e), 'duration': time.perf_counter() - start})
+        return None, repr(e), False
+    finally:
+        if claimed:
+            cache.release(cache_key)
+
+
+def _manifest_entry(file, output, num_tables, error, fingerprint=None, status=None):
+    """
+    Build the manifest entry of a processed workbook (see RunManifest)
+    :param file: The path to the workbook
+    :param output: The path to its output file
+    :param num_tables: The number of tables found (None if the workbook has been skipped)
+    :param error: The error, if the workbook has been skipped
+    :param fingerprint: The fingerprint of the workbook (default: taken now)
+    :param status: The status of the workbook (default: DONE, or FAILED if there is an error)
+    :return: The entry dict
+    """
+    if fingerprint is None:
+        try:
+            fingerprint = file_fingerprint(file)
+        except OSError as e:
+            fingerprint = {'file': file, 'size': None, 'mtime': None, 'hash': None}
+            error = error or repr(e)
+    entry = dict(fingerprint)
+    entry.update(status=status or (FAILED if error else DONE), tables=num_tables, error=error, output=output)
+    return entry
+
+
+def _remove_partial_output(file, output):
+    """
+    Remove the temporary output files of a workbook left behind by a worker that has been killed
+    :param file: The path to the workbook
+    :param output: The path to its output file
+    :return:
+    """
+    remove_temporary_files(output)
+    remove_temporary_files(output_path(file, GRID_DIR, 'jsonl', True))
+
+
+def _killed_entry(file, output, error):
+    """
+    Build the manifest entry of a workbook whose worker has been killed, and remove its partial output
+    :param file: The path to the workbook
+    :param output: The path to its output file
+    :param error: The WorkerKilled error
+    :return: The entry dict
+    """
+    if error.reason == 'timeout':
+        rootLogger.error(f'Timed out file: {file}', extra={'file': file, 'reason': error.reason})
+    else:
+        rootLogger.error(f'Killed file: {file}: {error}', extra={'file': file, 'reason': error.reason})
+    _remove_partial_output(file, output)
+    entry = _manifest_entry(file, output, None, str(error), status=TIMEOUT if error.reason == 'timeout' else KILLED)
+    entry['cached'] = False
+    return entry
+
+
+def process_wb_tracked(file, **kwargs):
+    """
+    Process a workbook (see process_wb) and build its manifest entry. The fingerprint
+    is taken before the workbook is read, so a change during the processing is
+    detected by the next run.
+    :param file: The path to the workbook
+    :param kwargs: The options of process_wb
+    :return: The manifest entry of the workbook, with whether its output has been found in the cache ('cached')
+    """
+    try:
+        fingerprint = file_fingerprint(file)
+    except OSError:
+        fingerprint = None
+    num_tables, error, cached = _process_wb(file, content_hash=fingerprint and fingerprint['hash'], **kwargs)
+    output = _output(file, kwargs.get('output_format', 'json'), kwargs.get('compress', False), kwargs.get('shards'))
+    entry = _manifest_entry(file, output, num_tables, error, fingerprint)
+    entry['cached'] = cached
+    return entry
+
+
+def _save_grid(grid_writer, grid):
+    """
+    Save the grid of a worksheet, with the styles of all its cells
+    :param grid_writer: The TableWriter of the grids of the workbook
+    :param grid: The grid of the worksheet (see read_grid)
+    :return:
+    """
+    try:
+        grid_writer.write(grid.materialize().to_json())
+    except:
+        rootLogger.error(f'Skipped grid of sheet: {grid.title}')
+
+
+def rederive_wb(grid_file, output_format='json', compress=False, schema=1, typed_values=False):
+    """
+    Rebuild the tables of a workbook from the grids saved by process_wb, without
+    reading the workbook, e.g. after a change of the table heuristics
+    :param grid_file: The path to the grid file of the workbook
+    :param output_format: The layout of the output file (one of OUTPUT_FORMATS)
+    :param compress: Whether to gzip compress the output file
+    :param schema: The schema of the output file (one of SCHEMAS)
+    :param typed_values: Add the numeric values of the cells and the scale factors of the tables
+    :return:
+    """
+    try:
+        with TableWriter(output_path(grid_file, output_format=output_format, compress=compress),
+                         output_format, compress, schema) as writer:
+            for grid in read_grids(grid_file):
+                try:
+                    table = process_grid(grid, columnar=True, typed_values=typed_values)
+                    if table is not None:
+                        writer.write(table)
+                except:
+                    rootLogger.error(f'Skipped sheet: {grid.title}')
+        rootLogger.info(f'Rederived file: {grid_file}: Found {writer.num_tables} tables.')
+    except:
+        rootLogger.error(f'Skipped file: {grid_file}')
+
+
+def _count_worksheets(file):
+    """
+    Count the worksheets of a workbook without parsing them (sheet-level parallelism)
+    :param file: The path to the workbook
+    :return: A (file, number of worksheets) tuple; the number is None if the workbook cannot be read
+    """
+    try:
+        wb = StreamWorkbook(file)
+        num_worksheets = len(wb.worksheets)
+        wb.close()
+        return file, num_worksheets
+    except:
+        return file, None
+
+
+def process_sheet(task, typed_values=False, sheet_filter=None):
+    """
+    Process a single worksheet of a workbook (sheet-level parallelism).
+    The workbook (with its shared strings and styles) stays open in the worker,
+    so the following sheets of the same workbook do not read them again.
+    :param task: A (file, sheet index) tuple
+    :param typed_values: Add the numeric values of the cells and the scale factors of the table
+    :param sheet_filter: The SheetFilter that selects the worksheets to process
+    :return: A (file, sheet index, table) tuple; the table is None if the sheet has been skipped
+    """
+    file, index = task
+    if _worker_workbook.get('file') != file:
+        if 'workbook' in _worker_workbook:
+            _worker_workbook['workbook'].close()
+        _worker_workbook.clear()
+        try:
+            _worker_workbook.update(file=file, workbook=StreamWorkbook(file), style_cache={})
+        except:
+            _worker_workbook.clear()
+            rootLogger.error(f'Skipped sheet {index} of file: {file}', extra={'file': file, 'sheet': index})
+            return file, index, None
+    worksheet = _worker_workbook['workbook'].worksheets[index]
+    if _is_prefiltered(sheet_filter, worksheet, index):
+        return file, index, None
+    table = None
+    try:
+        table = process_ws(worksheet, _worker_workbook['style_cache'], columnar=True, typed_values=typed_values)
+    except:
+        rootLogger.error(f'Skipped sheet: {worksheet.title}', extra={'file': file, 'sheet': worksheet.title})
+    worksheet.release()
+    return file, index, table
+
+
+def _schedule(files, batch_bytes=BATCH_BYTES, batch_files=BATCH_FILES):
+    """
+    Order the workbooks of a batch run longest first (by file size, the proxy of their
+    processing time), so that the largest workbooks do not start last and keep a single
+    worker busy at the end of the run, and group the small workbooks into batches, so
+    that they do not pay the cost of a task each
+    :param files: The paths to the workbooks
+    :param batch_bytes: The total size of a batch of small workbooks
+    :param batch_files: The maximum number of workbooks of a batch
+    :return: A list of batches (lists of paths), the largest workbooks first
+    """
+    sizes = {}
+    for file in files:
+        try:
+            sizes[file] = os.path.getsize(file)
+        except OSError:
+            sizes[file] = 0
+    batches = []
+    batch, batch_size = [], 0
+    for file in sorted(files, key=sizes.get, reverse=True):
+        batch.append(file)
+        batch_size += sizes[file]
+        if batch_size >= batch_bytes or len(batch) >= batch_files:
+            batches.append(batch)
+            batch, batch_size = [], 0
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _process_batch(files, process):
+    """
+    Process a batch of workbooks in a worker (see _schedule)
+    :param files: The paths to the workbooks
+    :param process: The function that processes a workbook
+    :return: A list with the (file, result, peak memory) of each workbook (see PeakMemory)
+    """
+    results = []
+    for file in files:
+        with PeakMemory() as memory:
+            result = process(file)
+        results.append((file, result, memory.peak))
+    return results
+
+
+def batch_process_wb(directory, engine='openpyxl', parallelism='file', output_format='json', compress=False,
+                     schema=1, typed_values=False, sheet_filter=None, save_grids=False, workers=None,
+                     max_in_flight=None, manifest=None, retry_failed=False, reprocess=False, cache=None,
+                     memory_budget=None, timeout=None, memory_limit=None, max_tasks_per_worker=None,
+                     executor='process', shards=None, shard_size=SHARD_BYTES):
+    """
+    Batch processing of workbooks in the specified directory
+    :param directory: The dirrectory containing the workbooks
+    :param engine: The engine that reads the workbooks (one of ENGINES)
+    :param parallelism: The unit of work that is distributed to the workers (one of PARALLELISM)
+    :param output_format: The layout of the output files (one of OUTPUT_FORMATS)
+    :param compress: Whether to gzip compress the output files
+    :param schema: The schema of the output files (one of SCHEMAS)
+    :param typed_values: Add the numeric values of the cells and the scale factors of the tables
+    :param sheet_filter: The SheetFilter that selects the worksheets to process
+    :param save_grids: Also save the grids of the worksheets to GRID_DIR (file-level parallelism only)
+    :param workers: The number of worker processes (default: the number of CPUs)
+    :param max_in_flight: The maximum number of batches of workbooks submitted to the workers at a time
+        (see _imap_bounded and _schedule)
+    :param manifest: The path to the manifest of the run (see RunManifest); the workbooks that are already
+        done and have not changed since are skipped. None: no manifest
+    :param retry_failed: Process again the workbooks that have failed in a previous run
+    :param reprocess: Process all the workbooks, whatever their manifest entries (they are still recorded)
+    :param cache: The ExtractionCache of the output files (file-level parallelism only, see process_wb)
+    :param memory_budget: The memory budget of the workers in bytes (file-level parallelism only): the
+        workbooks are submitted while their estimated total peak memory stays under it (see MemoryAdmission).
+        Not with the thread executor: the peak memory is measured per process (see PeakMemory)
+    :param timeout: The time limit of a workbook in seconds (file-level parallelism only, see WorkerPool)
+    :param memory_limit: The memory limit of a worker in bytes (file-level parallelism only, see WorkerPool)
+    :param max_tasks_per_worker: The number of workbooks after which a worker is replaced (file-level parallelism only)
+    :param executor: The executor of the batch (one of EXECUTORS; the limits of the workers and sheet-level
+        parallelism require the process executor)
+    :param shards: The directory of the shards to append the tables to, instead of an output file per workbook
+        (file-level parallelism only, see ShardWriter)
+    :param shard_size: The size of the shards in bytes
+    :return:
+    """
+    if executor not in EXECUTORS:
+        raise ValueError(f'Unknown executor: {executor}')
+    if parallelism == 'sheet' and executor != 'process':
+        raise ValueError('Sheet-level parallelism requires the process executor')
+    if parallelism == 'sheet' and engine != 'stream':
+        raise ValueError('Sheet-level parallelism requires the stream engine')
+    if parallelism == 'sheet' and save_grids:
+        raise ValueError('Saving the grids requires file-level parallelism')
+    if parallelism == 'sheet' and cache is not None:
+        raise ValueError('The extraction cache requires file-level parallelism')
+    if parallelism == 'sheet' and shards is not None:
+        raise ValueError('The sharded output requires file-level parallelism')
+    if shards is not None and cache is not None:
+        raise ValueError('The extraction cache requires an output file per workbook')
+    if parallelism == 'sheet' and memory_budget is not None:
+        raise ValueError('The memory budget requires file-level parallelism')
+    if executor == 'thread' and memory_budget is not None:
+        raise ValueError('The memory budget requires the process or the serial executor')
+    limits = {name: value for name, value in
+              [('timeout', timeout), ('memory_limit', memory_limit), ('max_tasks', max_tasks_per_worker)]
+              if value is not None}
+    if parallelism == 'sheet' and limits:
+        raise ValueError('The limits of the workers require file-level parallelism')
+    if (workers == 0 or executor != 'process') and limits:
+        raise ValueError('The limits of the workers require worker processes')
+    _check_sheet_filter(sheet_filter, engine)
+    print("Getting filenames..")
+    files = []
+    for (dirpath, dirnames, filenames) in walk(directory):
+        for file in filenames:
+            files.append(os.path.join(dirpath, file))
+
+    with RunManifest(manifest) if manifest is not None else nullcontext() as run_manifest:
+        if run_manifest is not None and not reprocess:
+            num_files = len(files)
+            files = [file for file in files if run_manifest.needs_processing(
+                file, _output(file, output_format, compress, shards), retry_failed)]
+            print(f'Skipping {num_files - len(files)} workbooks of the manifest..')
+
+        print('Processing workbooks..')
+        if workers is None:
+            workers = os.cpu_count()
+        if parallelism == 'sheet':
+            # The worksheets of the largest workbooks first
+            files = [file for batch in _schedule(files) for file in batch]
+            # The worker processes log through a queue to a listener process (see LogListener)
+            with LogListener([rootLogger, skippedLogger]), Pool(workers) as p:
+                _batch_process_sheets(p, files, output_format, compress, schema, typed_values, sheet_filter,
+                                      run_manifest)
+            return
+        tracked = run_manifest is not None or cache is not None or bool(limits)
+        process = partial(process_wb_tracked if tracked else process_wb, engine=engine,
+                          output_format=output_format, compress=compress, schema=schema,
+                          typed_values=typed_values, sheet_filter=sheet_filter, save_grids=save_grids, cache=cache,
+                          shards=shards, shard_size=shard_size)
+        admission = MemoryAdmission(memory_budget, engine) if memory_budget is not None else None
+        cache_stats.update(hits=0, misses=0)
+        with tqdm(total=len(files)) as pbar:
+            # With limits, each workbook is a task of its own, so that a killed worker only loses that workbook
+            batches = _schedule(files, batch_files=1 if limits else BATCH_FILES)
+            for batch, results in _imap_bounded(partial(_process_batch, process=process), batches,
+                                                workers, max_in_flight, admission, limits, executor):
+                if isinstance(results, WorkerKilled):
+                    results = [(file, _killed_entry(file, _output(file, output_format, compress, shards),
+                                                    results), None)
+                               for file in batch]
+                for file, result, peak in results:
+                    # A cached workbook is not parsed: its peak says nothing about the others
+                    if admission is not None and peak is not None and (cache is None or not result['cached']):
+                        admission.observe(file, peak)
+                    # The entries are recorded by the parent process as the workbooks complete
+                    if run_manifest is not None:
+                        run_manifest.record(result)
+                    if cache is not None:
+                        cache_stats['hits' if result['cached'] else 'misses'] += 1
+                pbar.update(len(results))
+        close_shard_writers()
+        if cache is not None:
+            rootLogger.info(f'Extraction cache: {cache_stats["hits"]} hits, {cache_stats["misses"]} misses.')
+
+
+def _batch_process_sheets(p, files, output_format='json', compress=False, schema=1, typed_values=False,
+                          sheet_filter=None, run_manifest=None):
+    """
+    Process the worksheets of the given workbooks in parallel. The tables of each
+    workbook are saved in the original sheet order: a table is written as soon as
+    the tables of all the previous worksheets have been written, so only the
+    tables that arrive out of order are kept in memory.
+    :param p: The process pool
+    :param files: The paths to the workbooks
+    :param output_format: The layout of the output files (one of OUTPUT_FORMATS)
+    :param compress: Whether to gzip compress the output files
+    :param schema: The schema of the output files (one of SCHEMAS)
+    :param typed_values: Add the numeric values of the cells and the scale factors of the tables
+    :param sheet_filter: The SheetFilter that selects the worksheets to process
+    :param run_manifest: The RunManifest that records the completed workbooks
+    :return:
+    """
+    def record(file, num_tables, error=None):
+        if run_manifest is not None:
+            run_manifest.record(_manifest_entry(
+                file, output_path(file, output_format=output_format, compress=compress), num_tables, error))
+
+    # Find the number of worksheets of each workbook
+    num_worksheets = {}
+    for file, num in p.imap(partial(_flushed, _count_worksheets), files):
+        if num is None:
+            rootLogger.error(f'Skipped file: {file}')
+            record(file, None, 'The workbook cannot be read')
+        elif num == 0:
+            rootLogger.info(f'Processed file: {file}: Found 0 tables.')
+            with TableWriter(output_path(file, output_format=output_format, compress=compress),
+                             output_format, compress, schema):
+                pass
+            record(file, 0)
+        else:
+            num_worksheets[file] = num
+    tasks = [(file, index) for file, num in num_worksheets.items() for index in range(num)]
+    # The writer, the index of the next sheet to write and the tables that arrived
+    # out of order (by sheet index) of the workbooks that are being processed
+    pending = {}
+    with tqdm(total=len(tasks)) as pbar:
+        process = partial(process_sheet, typed_values=typed_values, sheet_filter=sheet_filter)
+        for file, index, table in p.imap_unordered(partial(_flushed, process), tasks):
+            if file not in pending:
+                try:
+                    writer = TableWriter(output_path(file, output_format=output_format, compress=compress),
+                                         output_format, compress, schema)
+                except Exception as e:
+                    writer = None
+                    rootLogger.error(f'Skipped file: {file}')
+                    record(file, None, repr(e))
+                pending[file] = {'writer': writer, 'next': 0, 'tables': {}}
+            state = pending[file]
+            state['tables'][index] = table
+            while state['next'] in state['tables']:
+                table = state['tables'].pop(state['next'])
+                state['next'] += 1
+                if table is not None and state['writer'] is not None:
+                    try:
+                        state['writer'].write(table)
+                    except Exception as e:
+                        state['writer'].abort()
+                        state['writer'] = None
+                        rootLogger.error(f'Skipped file: {file}')
+                        record(file, None, repr(e))
+            if state['next'] == num_worksheets[file]:
+                del pending[file]
+                if state['writer'] is not None:
+                    state['writer'].close()
+                    rootLogger.info(f'Processed file: {file}: Found {state["writer"].num_tables} tables.')
+                    record(file, state['writer'].num_tables)
+            pbar.update()
+
+
+def batch_rederive(directory=GRID_DIR, output_format='json', compress=False, schema=1, typed_values=False,
+                   workers=None, executor='process'):
+    """
+    Batch rebuilding of the tables from the grid files in the specified directory
+    :param directory: The directory containing the grid files (see process_wb)
+    :param output_format: The layout of the output files (one of OUTPUT_FORMATS)
+    :param compress: Whether to gzip compress the output files
+    :param schema: The schema of the output files (one of SCHEMAS)
+    :param typed_values: Add the numeric values of the cells and the scale factors of the tables
+    :param workers: The number of workers (default: the number of CPUs)
+    :param executor: The executor of the batch (one of EXECUTORS)
+    :return:
+    """
+    files = []
+    for (dirpath, dirnames, filenames) in walk(directory):
+        for file in filenames:
+            files.append(os.path.join(dirpath, file))
+    rederive = partial(rederive_wb, output_format=output_format, compress=compress, schema=schema,
+                       typed_values=typed_values)
+    with tqdm(total=len(files)) as pbar:
+        for _ in _imap_bounded(rederive, files, workers or os.cpu_count(), executor=executor):
+            pbar.update()
+
+
+def enqueue(queue_path, directory):
+    """
+    Add the workbooks of a directory to a job queue (the coordinator of a distributed run)
+    :param queue_path: The path to the SQLite file of the queue (see JobQueue)
+    :param directory: The directory containing the workbooks
+    :return: The number of workbooks added (those already in the queue are ignored)
+    """
+    files = []
+    for (dirpath, dirnames, filenames) in walk(directory):
+        for file in filenames:
+            files.append(os.path.join(dirpath, file))
+    with JobQueue(queue_path) as jobs:
+        added = jobs.add(files)
+    rootLogger.info(f'Enqueued {added} of {len(files)} files to {queue_path}.')
+    return added
+
+
+def run_queue_worker(queue_path, lease=60, timeout=None, memory_limit=None, max_tasks_per_worker=None,
+                     poll_interval=1.0, **options):
+    """
+    Process the workbooks of a job queue one at a time, until none is left to claim and
+    none is being processed by another worker (its lease may still expire). Any number
+    of workers may run on any number of hosts with the same queue. The workbooks are
+    processed by a child process (see WorkerPool), which is killed when a workbook exceeds
+    the limits (the workbook fails) or when the lease of the workbook is lost (another
+    worker may have claimed it), so that two workers never process the same workbook.
+    :param queue_path: The path to the SQLite file of the queue (see JobQueue)
+    :param lease: The duration of the lease of a workbook in seconds (it is renewed while it is processed)
+    :param timeout: The time limit of a workbook in seconds (default: no limit)
+    :param memory_limit: The memory limit of the child process in bytes (default: no limit)
+    :param max_tasks_per_worker: The number of workbooks after which the child process is replaced
+    :param poll_interval: How often to look for expired leases when all the workbooks have been claimed
+    :param options: The options of process_wb (e.g. engine, output_format, schema, cache)
+    :return: The number of workbooks processed by this worker
+    """
+    owner = worker_id()
+    processed = 0
+    limits = (timeout, memory_limit, max_tasks_per_worker)
+    process = partial(_flushed, partial(process_wb, **options))
+    output = partial(_output, output_format=options.get('output_format', 'json'),
+                     compress=options.get('compress', False), shards=options.get('shards'))
+    pool = WorkerPool(1, *limits)
+    try:
+        with JobQueue(queue_path) as jobs:
+            while True:
+                file = jobs.claim(owner, lease)
+                if file is None:
+                    if not jobs.counts().get(RUNNING):
+                        return processed
+                    time.sleep(poll_interval)
+                    continue
+                results = queue.Queue()
+                result = None
+                with Heartbeat(queue_path, file, owner, lease) as heartbeat:
+                    pool.apply_async(process, (file,), results.put, results.put)
+                    while result is None and not heartbeat.lost.is_set():
+                        try:
+                            result = results.get(timeout=poll_interval)
+                        except queue.Empty:
+                            pass
+                if result is None:
+                    # Another worker may have claimed the workbook: kill the child process that processes it
+                    pool.terminate()
+                    pool = WorkerPool(1, *limits)
+                    _remove_partial_output(file, output(file))
+                    rootLogger.error(f'Lost the lease of file: {file}', extra={'file': file, 'reason': 'lease'})
+                    continue
+                if isinstance(result, WorkerKilled):
+                    num_tables, error = None, _killed_entry(file, output(file), result)['error']
+                elif isinstance(result, Exception):
+                    num_tables, error = None, repr(result)
+                else:
+                    num_tables, error = result
+                if not jobs.complete(file, owner, num_tables, error):
+                    rootLogger.error(f'Lost the lease of file: {file}', extra={'file': file, 'reason': 'lease'})
+                processed += 1
+    finally:
+        pool.terminate()
+
+
+def run_queue_workers(queue_path, workers=None, retry_failed=False, **kwargs):
+    """
+    Run queue workers in processes of this host (see run_queue_worker)
+    :param queue_path: The path to the SQLite file of the queue (see JobQueue)
+    :param workers: The number of worker processes (default: the number of CPUs)
+    :param retry_failed: Make the failed workbooks of the queue pending again first
+    :param kwargs: The options of run_queue_worker
+    :return: The number of workbooks of each status in the queue
+    """
+    _check_sheet_filter(kwargs.get('sheet_filter'), kwargs.get('engine', 'openpyxl'))
+    if kwargs.get('shards') is not None and kwargs.get('cache') is not None:
+        raise ValueError('The extraction cache requires an output file per workbook')
+    with JobQueue(queue_path) as jobs:
+        if retry_failed:
+            jobs.retry_failed()
+    processes = [Process(target=run_queue_worker, args=(queue_path,), kwargs=kwargs)
+                 for _ in range(workers or os.cpu_count())]
+    with LogListener([rootLogger, skippedLogger]):
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+    with JobQueue(queue_path) as jobs:
+        counts = jobs.counts()
+    rootLogger.info(f'Job queue {queue_path}: {counts}')
+    return counts
+
+
+def main(argv=None, executor='process'):
+    """
+    The command line interface of the extraction
+    :param argv: The command line arguments (default: sys.argv)
+    :param executor: The default executor (one of EXECUTORS)
+    :return:
+    """
+    parser = argparse.ArgumentParser(description='Extract tables from the xlsx files of a directory')
+    parser.add_argument('directory', nargs='?', default='./data',
+                        help='the directory with the xlsx files (default: ./data)')
+    parser.add_argument('--engine', choices=ENGINES, default='openpyxl',
+                        help='the workbook reader to use (default: openpyxl)')
+    parser.add_argument('--parallelism', choices=PARALLELISM, default='file',
+                        help='process whole workbooks or single worksheets in parallel; '
+                             'sheet requires --engine stream (default: file)')
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS, default='json',
+                        help='save the tables of a workbook as a JSON array or one table per line (default: json)')
+    parser.add_argument('--compress', action='store_true',
+                        help='gzip compress the output files')
+    parser.add_argument('--schema', type=int, choices=SCHEMAS, default=1,
+                        help='2 saves the tables in the compact schema, see table_writer.py (default: 1)')
+    parser.add_argument('--typed-values', action='store_true',
+                        help='add the numeric value of the cells (N) and the scale factors of the titles (Scale)')
+    parser.add_argument('--include', help='process only the sheets whose name matches this regular expression')
+    parser.add_argument('--exclude', help='skip the sheets whose name matches this regular expression')
+    parser.add_argument('--positions', type=parse_positions,
+                        help='process only the sheets at these positions, e.g. 0-5,8 (starting at 0)')
+    parser.add_argument('--min-size', type=int,
+                        help='skip the sheets whose XML is smaller than this (bytes); requires --engine stream')
+    parser.add_argument('--max-size', type=int,
+                        help='skip the sheets whose XML is larger than this (bytes); requires --engine stream')
+    parser.add_argument('--max-compressed-size', type=int,
+                        help='skip the sheets whose compressed XML is larger than this (bytes); '
+                             'requires --engine stream')
+    parser.add_argument('--max-cells', type=int,
+                        help='skip the sheets whose declared dimension has more cells than this; '
+                             'requires --engine stream')
+    parser.add_argument('--save-grids', action='store_true',
+                        help=f'also save the grids of the worksheets to {GRID_DIR}')
+    parser.add_argument('--rederive', action='store_true',
+                        help='rebuild the tables from the grids saved with --save-grids in the directory, '
+                             'without reading the workbooks')
+    parser.add_argument('--executor', choices=EXECUTORS, default=executor,
+                        help=f'process the workbooks one by one, or with a pool of processes or threads '
+                             f'(default: {executor})')
+    parser.add_argument('--workers', type=int, help='the number of workers (default: the number of CPUs)')
+    parser.add_argument('--shards',
+                        help='append the tables to compressed shards in this directory, with an offset index, '
+                             'instead of an output file per workbook (see table_shards.py)')
+    parser.add_argument('--shard-size', type=int, default=SHARD_BYTES >> 20,
+                        help=f'the size of the shards in MB (default: {SHARD_BYTES >> 20})')
+    parser.add_argument('--cache', help='the directory of the extraction cache (default: no cache)')
+    parser.add_argument('--cache-size', type=int, default=1024,
+                        help='the maximum size of the extraction cache in MB (default: 1024)')
+    parser.add_argument('--memory-budget', type=int,
+                        help='the memory budget of the workers in MB: the workbooks are submitted while their '
+                             'estimated peak memory fits in it (default: no budget)')
+    parser.add_argument('--timeout', type=float,
+                        help='the time limit of a workbook in seconds: its worker is killed and replaced')
+    parser.add_argument('--memory-limit', type=int,
+                        help='the memory limit of a worker in MB: it is killed and replaced with its workbook')
+    parser.add_argument('--max-tasks-per-worker', type=int,
+                        help='the number of workbooks after which a worker is replaced')
+    parser.add_argument('--queue',
+                        help='the SQLite job queue of a distributed run (see job_queue.py): run --workers queue '
+                             'workers on this host, or add the workbooks of the directory with --enqueue')
+    parser.add_argument('--enqueue', action='store_true', help='add the workbooks of the directory to --queue')
+    parser.add_argument('--lease', type=float, default=60,
+                        help='the lease of a workbook claimed from --queue in seconds (default: 60)')
+    parser.add_argument('--log-format', choices=LOG_FORMATS, default='text',
+                        help='write the logs as text, or as a JSON object per line with the file, sheet, reason and '
+                             'duration of the records (default: text)')
+    parser.add_argument('--log-level', type=parse_levels, default={},
+                        help='the levels of the loggers, e.g. Main=WARNING,SkippedTables=ERROR (default: INFO)')
+    parser.add_argument('--manifest',
+                        help=f'the manifest of the run, to skip the workbooks already done (default: {MANIFEST_PATH})')
+    parser.add_argument('--no-manifest', action='store_true', help='process all the workbooks without a manifest')
+    parser.add_argument('--retry-failed', action='store_true',
+                        help='process again the workbooks that have failed in a previous run')
+    parser.add_argument('--reprocess', action='store_true',
+                        help='process all the workbooks, whatever their manifest entries')
+    args = parser.parse_args(argv)
+    if args.queue and not args.enqueue:
+        # The queue records the status of the workbooks, and its workers are processes of their own
+        for option, value in (('--manifest', args.manifest), ('--reprocess', args.reprocess),
+                              ('--memory-budget', args.memory_budget), ('--rederive', args.rederive),
+                              ('--parallelism sheet', args.parallelism == 'sheet')):
+            if value:
+                parser.error(f'{option} is not supported with --queue')
+    # The format and the levels of the logs (the workers log through a queue to a listener process)
+    with LogListener([rootLogger, skippedLogger], args.log_format, args.log_level):
+        _run(args)
+
+
+def _run(args):
+    """
+    Run the command of the command line interface
+    :param args: The parsed arguments (see main)
+    :return:
+    """
+    if args.queue and args.enqueue:
+        enqueue(args.queue, args.directory)
+    elif args.queue:
+        run_queue_workers(args.queue, args.workers, args.retry_failed, lease=args.lease, timeout=args.timeout,
+                          memory_limit=args.memory_limit << 20 if args.memory_limit else None,
+                          max_tasks_per_worker=args.max_tasks_per_worker,
+                          cache=ExtractionCache(args.cache, args.cache_size << 20) if args.cache else None,
+                          engine=args.engine, output_format=args.output_format, compress=args.compress,
+                          schema=args.schema, typed_values=args.typed_values,
+                          sheet_filter=SheetFilter(args.include, args.exclude, args.positions, args.min_size,
+                                                   args.max_size, args.max_compressed_size, args.max_cells),
+                          save_grids=args.save_grids, shards=args.shards, shard_size=args.shard_size << 20)
+    elif args.rederive:
+        batch_rederive(args.directory, output_format=args.output_format, compress=args.compress,
+                       schema=args.schema, typed_values=args.typed_values, workers=args.workers,
+                       executor=args.executor)
+    else:
+        sheet_filter = SheetFilter(args.include, args.exclude, args.positions, args.min_size, args.max_size,
+                                   args.max_compressed_size, args.max_cells)
+        batch_process_wb(args.directory, engine=args.engine, parallelism=args.parallelism,
+                         output_format=args.output_format, compress=args.compress, schema=args.schema,
+                         typed_values=args.typed_values, sheet_filter=sheet_filter, save_grids=args.save_grids,
+                         workers=args.workers, manifest=None if args.no_manifest else args.manifest or MANIFEST_PATH,
+                         retry_failed=args.retry_failed, reprocess=args.reprocess,
+                         cache=ExtractionCache(args.cache, args.cache_size << 20) if args.cache else None,
+                         memory_budget=args.memory_budget << 20 if args.memory_budget else None,
+                         timeout=args.timeout, memory_limit=args.memory_limit << 20 if args.memory_limit else None,
+                         max_tasks_per_worker=args.max_tasks_per_worker, executor=args.executor,
+                         shards=args.shards, shard_size=args.shard_size << 20)
+
+
+if __name__ == "__main__":
+    main()
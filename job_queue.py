@@ -0,0 +1,213 @@
+#
+# job_queue.py
+# Shared job queue of the workbooks, for batch runs distributed over several hosts
+#
+
+import os
+import sqlite3
+import socket
+import threading
+import time
+
+# The status of the jobs
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    file TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    tables INTEGER,
+    error TEXT,
+    updated REAL
+)
+"""
+
+
+def worker_id():
+    """
+    :return: an id of the current process that is unique across hosts (host:pid)
+    """
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class JobQueue(object):
+    """
+    A queue of workbooks in a SQLite file, that any number of processes on any number
+    of hosts share: a coordinator adds the workbooks (add), and the workers claim them
+    one at a time with a lease (claim), renew the lease while they process a workbook
+    (heartbeat) and complete it (complete). The lease of a worker that has died
+    expires and the workbook is claimed again, up to max_attempts times. The largest
+    workbooks are claimed first. The workers of several hosts need a shared file system
+    with working file locks (SQLite locking is not reliable on some network file systems).
+    A JobQueue (its connection) must only be used by the thread that created it.
+    """
+
+    def __init__(self, path, max_attempts=3, timeout=60):
+        """
+        :param path: the path to the SQLite file (it is created if it does not exist)
+        :param max_attempts: the maximum number of claims of a workbook
+        :param timeout: how long to wait for the lock of the database (seconds)
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self._db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self._db.execute(_SCHEMA)
+        self._db.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, size)')
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def add(self, files):
+        """
+        Add workbooks to the queue (the workbooks already in the queue are ignored)
+        :param files: the paths to the workbooks
+        :return: the number of workbooks added
+        """
+        rows = []
+        for file in files:
+            try:
+                size = os.path.getsize(file)
+            except OSError:
+                size = 0
+            rows.append((file, size, PENDING, time.time()))
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            before = self._db.total_changes
+            self._db.executemany('INSERT OR IGNORE INTO jobs (file, size, status, updated) VALUES (?, ?, ?, ?)', rows)
+            added = self._db.total_changes - before
+            self._db.execute('COMMIT')
+        except BaseException:
+            self._db.execute('ROLLBACK')
+            raise
+        return added
+
+    def claim(self, owner, lease):
+        """
+        Claim the next workbook: the largest pending one, or one whose lease has expired
+        :param owner: the id of the worker (see worker_id)
+        :param lease: the duration of the lease (seconds)
+        :return: the path to the workbook, or None if there is no workbook to claim
+        """
+        now = time.time()
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            # The expired workbooks that have been claimed too many times fail
+            self._db.execute('UPDATE jobs SET status = ?, owner = NULL, error = ?, updated = ? '
+                             'WHERE status = ? AND lease_expires < ? AND attempts >= ?',
+                             (FAILED, 'The lease has expired', now, RUNNING, now, self.max_attempts))
+            row = self._db.execute('SELECT file FROM jobs WHERE status = ? OR (status = ? AND lease_expires < ?) '
+                                   'ORDER BY size DESC LIMIT 1', (PENDING, RUNNING, now)).fetchone()
+            if row is not None:
+                self._db.execute('UPDATE jobs SET status = ?, owner = ?, lease_expires = ?, attempts = attempts + 1, '
+                                 'updated = ? WHERE file = ?', (RUNNING, owner, now + lease, now, row[0]))
+            self._db.execute('COMMIT')
+        except BaseException:
+            self._db.execute('ROLLBACK')
+            raise
+        return row[0] if row is not None else None
+
+    def heartbeat(self, file, owner, lease):
+        """
+        Renew the lease of a workbook
+        :param file: the path to the workbook
+        :param owner: the id of the worker
+        :param lease: the duration of the lease from now (seconds)
+        :return: whether the worker still holds the lease
+        """
+        now = time.time()
+        cursor = self._db.execute('UPDATE jobs SET lease_expires = ?, updated = ? '
+                                  'WHERE file = ? AND owner = ? AND status = ?',
+                                  (now + lease, now, file, owner, RUNNING))
+        return cursor.rowcount == 1
+
+    def complete(self, file, owner, num_tables, error=None):
+        """
+        Complete a workbook
+        :param file: the path to the workbook
+        :param owner: the id of the worker
+        :param num_tables: the number of tables found (None if the workbook has been skipped)
+        :param error: the error, if the workbook has been skipped
+        :return: whether the worker still held the lease (otherwise the workbook is left to its new owner)
+        """
+        cursor = self._db.execute('UPDATE jobs SET status = ?, owner = NULL, lease_expires = NULL, tables = ?, '
+                                  'error = ?, updated = ? WHERE file = ? AND owner = ? AND status = ?',
+                                  (FAILED if error else DONE, num_tables, error, time.time(), file, owner, RUNNING))
+        return cursor.rowcount == 1
+
+    def retry_failed(self):
+        """
+        Make the failed workbooks pending again
+        :return: the number of workbooks
+        """
+        cursor = self._db.execute('UPDATE jobs SET status = ?, attempts = 0, error = NULL, updated = ? '
+                                  'WHERE status = ?', (PENDING, time.time(), FAILED))
+        return cursor.rowcount
+
+    def counts(self):
+        """
+        :return: a dict with the number of workbooks of each status
+        """
+        return dict(self._db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+    def jobs(self):
+        """
+        :return: a list with a dict per workbook (file, size, status, owner, attempts, tables, error)
+        """
+        return [{'file': file, 'size': size, 'status': status, 'owner': owner, 'attempts': attempts,
+                 'tables': tables, 'error': error}
+                for file, size, status, owner, attempts, tables, error in self._db.execute(
+                    'SELECT file, size, status, owner, attempts, tables, error FROM jobs ORDER BY file')]
+
+
+class Heartbeat(object):
+    """
+    Renew the lease of a workbook from a thread (with its own connection) while the
+    workbook is processed within a with block. lost is set if the lease could not be
+    renewed (it has expired and the workbook may have been claimed by another worker),
+    so that the processing can be aborted.
+    """
+
+    def __init__(self, path, file, owner, lease):
+        """
+        :param path: the path to the SQLite file of the queue
+        :param file: the path to the workbook
+        :param owner: the id of the worker
+        :param lease: the duration of the lease (seconds); it is renewed every third of it
+        """
+        self.path = path
+        self.file = file
+        self.owner = owner
+        self.lease = lease
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        with JobQueue(self.path) as queue:
+            while not self._stop.wait(self.lease / 3):
+                if not queue.heartbeat(self.file, self.owner, self.lease):
+                    self.lost.set()
+                    return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+        return False
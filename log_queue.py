@@ -0,0 +1,295 @@
+#
+# log_queue.py
+# Logging of the worker processes through a queue to a single listener process
+#
+
+import json
+import logging
+import os
+import pickle
+import queue
+import shutil
+import socket
+import tempfile
+import threading
+from multiprocessing import Process, util
+
+# text: the formats of the log files; json: a JSON object per line
+LOG_FORMATS = ('text', 'json')
+# The structured fields of the log records (passed with extra=), e.g. extra={'file': file, 'duration': 0.5}
+FIELDS = ('file', 'sheet', 'reason', 'duration', 'tables')
+# The maximum size of a datagram of records (a batch is split, and a longer message truncated, to fit)
+_DATAGRAM_BYTES = 1 << 16
+
+# The handler of the running listener (inherited by the forked workers), see flush_records
+_active = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format a log record as a JSON object: its time, level, logger, process, message
+    and the structured fields (FIELDS) that it has.
+    """
+
+    def format(self, record):
+        entry = {'time': record.created, 'level': record.levelname, 'logger': record.name,
+                 'process': record.process, 'message': record.getMessage()}
+        for field in FIELDS:
+            if field in record.__dict__:
+                entry[field] = record.__dict__[field]
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _send(sock, address, entries):
+    # Send a batch of records in datagrams of at most _DATAGRAM_BYTES
+    data = pickle.dumps(entries)
+    if len(data) > _DATAGRAM_BYTES and len(entries) > 1:
+        _send(sock, address, entries[:len(entries) // 2])
+        _send(sock, address, entries[len(entries) // 2:])
+        return
+    if len(data) > _DATAGRAM_BYTES:
+        entries[0]['msg'] = entries[0]['msg'][:_DATAGRAM_BYTES // 2] + ' [truncated]'
+        data = pickle.dumps(entries)
+    if len(data) <= _DATAGRAM_BYTES:
+        sock.sendto(data, address)
+
+
+class _ForwardingHandler(logging.Handler):
+    """
+    Put the records (only what the listener formats, as dicts) in a queue of the process,
+    from which a thread of the process sends them in batches to the listener, as
+    datagrams: a logging call never waits for the listener, and a process killed while
+    it sends (e.g. over a time limit) loses its own last records only.
+    """
+
+    def __init__(self, address, batch_size):
+        super().__init__()
+        self.address = address
+        self.batch_size = batch_size
+        self._pid = None
+        self._records = None
+
+    def prepare(self, record):
+        message = record.getMessage()
+        if record.exc_info:
+            message += '\n' + logging.Formatter().formatException(record.exc_info)
+        entry = {'name': record.name, 'levelno': record.levelno, 'levelname': record.levelname,
+                 'created': record.created, 'msecs': record.msecs, 'process': record.process,
+                 'threadName': record.threadName, 'msg': message}
+        for field in FIELDS:
+            if field in record.__dict__:
+                entry[field] = record.__dict__[field]
+        return entry
+
+    def emit(self, record):
+        try:
+            if self._pid != os.getpid():
+                # The first record of the process (the thread of the parent is not forked)
+                self._pid = os.getpid()
+                self._records = queue.SimpleQueue()
+                threading.Thread(target=self._forward, args=(self._records,), daemon=True).start()
+                util.Finalize(self, self.flush, exitpriority=10)
+            self._records.put(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def _forward(self, records):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        while True:
+            batch = [records.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(records.get_nowait())
+                except queue.Empty:
+                    break
+            entries = [entry for entry in batch if isinstance(entry, dict)]
+            try:
+                if entries:
+                    _send(sock, self.address, entries)
+            except OSError:
+                # The listener has stopped
+                pass
+            for entry in batch:
+                if isinstance(entry, threading.Event):
+                    entry.set()
+
+    def flush(self):
+        """
+        Wait until the records of the process have been sent to the listener
+        :return:
+        """
+        if self._pid == os.getpid():
+            sent = threading.Event()
+            self._records.put(sent)
+            sent.wait()
+
+
+def flush_records():
+    """
+    Wait until the records of the current process have been sent to the listener, e.g. at the end
+    of a task of a worker, which may be terminated as soon as its results have been received
+    :return:
+    """
+    if _active is not None:
+        _active.flush()
+
+
+class _BatchFileHandler(logging.FileHandler):
+    # A FileHandler that leaves the flushes to the listener, once per batch of records
+
+    def emit(self, record):
+        if self.stream is None:
+            self.stream = self._open()
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
+def _listen(sock, files, log_format, batch_size):
+    """
+    Write the records received on the socket to the log files until None is received
+    :param sock: the datagram socket of the listener (see _ForwardingHandler)
+    :param files: a list of (logger name, path, format) tuples
+    :param log_format: one of LOG_FORMATS
+    :param batch_size: the maximum number of records written between two flushes
+    :return:
+    """
+    handlers = {}
+    for name, path, fmt in files:
+        handler = _BatchFileHandler(path, 'a')
+        handler.setFormatter(JsonFormatter() if log_format == 'json' else logging.Formatter(fmt))
+        handlers.setdefault(name, []).append(handler)
+    done = False
+    while not done:
+        batch = pickle.loads(sock.recv(_DATAGRAM_BYTES))
+        while batch is not None and len(batch) < batch_size:
+            try:
+                entries = pickle.loads(sock.recv(_DATAGRAM_BYTES, socket.MSG_DONTWAIT))
+            except BlockingIOError:
+                break
+            if entries is None:
+                done = True
+                break
+            batch.extend(entries)
+        for entry in batch or []:
+            record = logging.makeLogRecord(entry)
+            for handler in handlers.get(record.name, []):
+                handler.handle(record)
+        done = done or batch is None
+        for name in handlers:
+            for handler in handlers[name]:
+                handler.flush()
+    for name in handlers:
+        for handler in handlers[name]:
+            handler.close()
+    sock.close()
+
+
+def parse_levels(text):
+    """
+    Parse the log levels of the loggers
+    :param text: comma separated logger=level pairs, e.g. Main=WARNING,SkippedTables=INFO
+    :return: a dict with the level of each logger name
+    """
+    levels = {}
+    for part in text.split(','):
+        name, _, level = part.partition('=')
+        if not name.strip() or logging.getLevelName(level.strip().upper()) not in range(0, 101):
+            raise ValueError(f'Invalid log level: {part}')
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+class LogListener(object):
+    """
+    Move the file handlers of loggers to a listener process, within a with block:
+    the loggers get a QueueHandler instead, so the processes forked meanwhile (the
+    workers) put their records in a queue rather than writing to the files themselves,
+    and the listener writes the records of all the processes in batches, without
+    interleaving. The file handlers and the levels are restored at the end.
+    Each process sends its records to the listener from a thread of its own (see
+    _ForwardingHandler), as datagrams: a worker killed while it logs cannot hold a lock
+    that the other processes need, as with a multiprocessing.Queue. The workers call
+    flush at the end of their tasks. A LogListener within the block of another one
+    (e.g. of the command line) does nothing.
+    """
+
+    def __init__(self, loggers, log_format='text', levels=None, batch_size=1000):
+        """
+        :param loggers: the loggers whose FileHandlers are moved to the listener
+        :param log_format: one of LOG_FORMATS
+        :param levels: the level of each logger name, if it changes (see parse_levels)
+        :param batch_size: the maximum number of records written between two flushes
+        """
+        if log_format not in LOG_FORMATS:
+            raise ValueError(f'Unknown log format: {log_format}')
+        self.loggers = loggers
+        self.log_format = log_format
+        self.levels = levels or {}
+        self.batch_size = batch_size
+        self._directory = None
+        self._process = None
+        self._moved = []
+        self._levels = {}
+        self._handler = None
+
+    def start(self):
+        global _active
+        if any(isinstance(handler, _ForwardingHandler) for logger in self.loggers for handler in logger.handlers):
+            return
+        for name, level in self.levels.items():
+            self._levels[name] = logging.getLogger(name).level
+            logging.getLogger(name).setLevel(level)
+        files = []
+        for logger in self.loggers:
+            for handler in list(logger.handlers):
+                if isinstance(handler, logging.FileHandler):
+                    fmt = handler.formatter._fmt if handler.formatter is not None else None
+                    files.append((logger.name, handler.baseFilename, fmt))
+                    self._moved.append((logger, handler.baseFilename, handler.formatter))
+                    logger.removeHandler(handler)
+                    handler.close()
+        self._directory = tempfile.mkdtemp(prefix='log_queue-')
+        address = os.path.join(self._directory, 'records')
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.bind(address)
+            self._process = Process(target=_listen, args=(sock, files, self.log_format, self.batch_size),
+                                    daemon=True)
+            self._process.start()
+        self._handler = _active = _ForwardingHandler(address, self.batch_size)
+        for logger in self.loggers:
+            logger.addHandler(self._handler)
+
+    def stop(self):
+        global _active
+        if self._process is None:
+            return
+        _active = None
+        for logger in self.loggers:
+            logger.removeHandler(self._handler)
+        self._handler.flush()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.sendto(pickle.dumps(None), self._handler.address)
+        self._process.join()
+        self._process = None
+        shutil.rmtree(self._directory, ignore_errors=True)
+        self._directory = None
+        for name, level in self._levels.items():
+            logging.getLogger(name).setLevel(level)
+        self._levels = {}
+        for logger, path, formatter in self._moved:
+            handler = logging.FileHandler(path, 'a')
+            handler.setFormatter(formatter)
+            logger.addHandler(handler)
+        self._moved = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
@@ -0,0 +1,137 @@
+#
+# memory_budget.py
+# Memory-aware admission of the workbooks to the workers of a batch run
+#
+
+import os
+import sys
+import zipfile
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows: the peak memory is not measured
+    resource = None
+
+# The initial estimate of the peak memory of a workbook, per byte of its uncompressed
+# parts (measured on EDGAR reports: ~7.5-10 with openpyxl, ~3-6 with the stream engine)
+DEFAULT_RATIOS = {'openpyxl': 10.0, 'stream': 4.0}
+
+
+def workbook_size(path):
+    """
+    Get the uncompressed size of a workbook, from the central directory of the archive
+    :param path: the path to the workbook
+    :return: the total uncompressed size of its parts (the file size if it is not an archive)
+    """
+    try:
+        with zipfile.ZipFile(path) as archive:
+            return sum(info.file_size for info in archive.infolist())
+    except (OSError, zipfile.BadZipFile):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+
+def _current_rss():
+    # The current RSS (bytes) from /proc, or None if not available
+    try:
+        with open('/proc/self/statm') as fp:
+            return int(fp.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _max_rss():
+    # The peak RSS (bytes) of the process since it started
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+# The RSS of the process before its first measured block (see PeakMemory)
+_baseline = []
+
+
+class PeakMemory(object):
+    """
+    Measure the memory that the processing within a with block requires (peak, in bytes):
+    if the block raises the peak RSS of the process, it is the new peak over the RSS of
+    the process before its first measured block. Otherwise it is None: the memory that
+    the block needed was already resident (e.g. left by a larger workbook), so its
+    peak is unknown (it is also None where the RSS cannot be measured).
+    The peak RSS is that of the whole process, so the blocks of a process must not run
+    concurrently: with threads, a block would be charged the memory of the others
+    (batch_process_wb refuses a memory budget with the thread executor).
+    """
+
+    def __init__(self):
+        self.peak = None
+        self._max_rss = None
+
+    def __enter__(self):
+        if resource is not None:
+            self._max_rss = _max_rss()
+            if not _baseline:
+                _baseline.append(_current_rss() or self._max_rss)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._max_rss is not None:
+            max_rss = _max_rss()
+            if max_rss > self._max_rss:
+                self.peak = max_rss - _baseline[0]
+        return False
+
+
+class MemoryAdmission(object):
+    """
+    Estimate the peak memory of the workbooks, so that they are only submitted to the
+    workers while the total estimate of the submitted workbooks stays under a budget
+    (see _imap_bounded). The estimate of a workbook is its uncompressed size times a
+    ratio that is learned from the peak memory measured by the workers (see PeakMemory):
+    it follows the larger peaks quickly and the smaller ones slowly, so as to stay on
+    the safe side.
+    """
+
+    def __init__(self, budget, engine='openpyxl', ratio=None):
+        """
+        :param budget: the memory budget of the workers (bytes)
+        :param engine: the engine that reads the workbooks, for the initial ratio
+        :param ratio: the initial ratio (default: DEFAULT_RATIOS of the engine)
+        """
+        self.budget = budget
+        self.ratio = DEFAULT_RATIOS[engine] if ratio is None else ratio
+        self._sizes = {}
+
+    def size(self, file):
+        """
+        :param file: the path to a workbook
+        :return: its uncompressed size (see workbook_size)
+        """
+        size = self._sizes.get(file)
+        if size is None:
+            size = self._sizes[file] = workbook_size(file)
+        return size
+
+    def estimate(self, files):
+        """
+        Estimate the peak memory of a batch of workbooks, processed one after the other
+        :param files: the paths to the workbooks
+        :return: the estimate of the largest peak (bytes)
+        """
+        return max((self.ratio * self.size(file) for file in files), default=0)
+
+    def observe(self, file, peak):
+        """
+        Learn from the peak memory of a processed workbook
+        :param file: the path to the workbook
+        :param peak: its measured peak memory (bytes)
+        :return:
+        """
+        size = self.size(file)
+        if not size:
+            return
+        sample = peak / size
+        alpha = 0.5 if sample > self.ratio else 0.1
+        self.ratio += alpha * (sample - self.ratio)
@@ -0,0 +1,115 @@
+#
+# run_manifest.py
+# Processing manifest of the batch runs, so that an interrupted run can be resumed
+#
+
+import hashlib
+import json
+import os
+
+# The status of the processed files: done, failed (skipped because of an error), timed
+# out or killed (their worker has been killed, e.g. over its memory limit, or has died)
+DONE = 'done'
+FAILED = 'failed'
+TIMEOUT = 'timeout'
+KILLED = 'killed'
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """
+    Get the content hash of a file
+    :param path: the path to the file
+    :param chunk_size: the size of the chunks that are read
+    :return: the hex SHA-1 digest of the file content
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path):
+    """
+    Get the fingerprint of an input file
+    :param path: the path to the file
+    :return: a dict with the file, its size, its modification time and its content hash
+    """
+    stat = os.stat(path)
+    return {'file': path, 'size': stat.st_size, 'mtime': stat.st_mtime, 'hash': file_hash(path)}
+
+
+class RunManifest(object):
+    """
+    The manifest of the processed files: one JSON entry per line with the fingerprint
+    of the file (see file_fingerprint), its status (DONE, FAILED, TIMEOUT or KILLED), the number of
+    extracted tables, the error (if any) and the output file. Each entry is appended
+    and flushed to disk as soon as a file is complete, so an interrupted run only loses
+    the files that were in flight. The last entry of a file is the current one.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: the path to the manifest file (it is created if it does not exist)
+        """
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            self._load()
+        self._fp = open(path, 'a')
+
+    def _load(self):
+        with open(self.path, 'rb') as fp:
+            data = fp.read()
+        # An interrupted write leaves a partial last line, which is dropped
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            with open(self.path, 'r+b') as fp:
+                fp.truncate(end)
+        for line in data[:end].decode().splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                self.entries[entry['file']] = entry
+
+    def needs_processing(self, file, output, retry_failed=False):
+        """
+        Check whether an input file must be processed
+        :param file: the path to the input file
+        :param output: the path to its output file
+        :param retry_failed: whether to process again the files that have failed (or timed out or been killed)
+        :return: True if the file is new or has changed (the content hash is only computed if
+            the modification time has changed), if it has failed and retry_failed is set, or if
+            its output file is missing
+        """
+        entry = self.entries.get(file)
+        if entry is None:
+            return True
+        stat = os.stat(file)
+        if stat.st_size != entry['size']:
+            return True
+        if stat.st_mtime != entry['mtime'] and file_hash(file) != entry['hash']:
+            return True
+        if entry['status'] != DONE:
+            return retry_failed
+        return not os.path.exists(output)
+
+    def record(self, entry):
+        """
+        Append the entry of a processed file
+        :param entry: the fingerprint of the file with its status, tables, error and output
+        :return:
+        """
+        self._fp.write(json.dumps(entry) + '\n')
+        self._fp.flush()
+        os.fsync(self._fp.fileno())
+        self.entries[entry['file']] = entry
+
+    def close(self):
+        self._fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
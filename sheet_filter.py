@@ -0,0 +1,99 @@
+#
+# sheet_filter.py
+# Select the worksheets of a workbook before they are parsed
+#
+
+import re
+from openpyxl.utils import range_boundaries
+
+
+def parse_positions(text):
+    """
+    Parse a list of worksheet positions
+    :param text: comma separated positions or ranges of positions, e.g. "0-5,8"
+    :return: a set with the positions (starting at 0)
+    """
+    positions = set()
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            positions.update(range(int(first), int(last) + 1))
+        else:
+            positions.add(int(part))
+    return positions
+
+
+class SheetFilter(object):
+    """
+    Select the worksheets to process from the workbook metadata:
+    - the sheet names of workbook.xml (include / exclude regular expressions, case insensitive)
+    - the position of the sheet in the workbook
+    - the compressed and the uncompressed size of the sheet XML in the archive
+    - the number of cells of the dimension element of the sheet XML
+    The sizes and the dimension are only available with the stream engine
+    (StreamWorksheet), which decompresses and parses the accepted sheets only.
+    """
+
+    def __init__(self, include=None, exclude=None, positions=None, min_size=None, max_size=None,
+                 max_compressed_size=None, max_cells=None):
+        """
+        :param include: process only the sheets whose name matches this regular expression
+        :param exclude: skip the sheets whose name matches this regular expression
+        :param positions: process only the sheets at these positions (starting at 0)
+        :param min_size: skip the sheets whose XML is smaller than this (bytes, uncompressed)
+        :param max_size: skip the sheets whose XML is larger than this (bytes, uncompressed)
+        :param max_compressed_size: skip the sheets whose XML is larger than this in the archive (bytes)
+        :param max_cells: skip the sheets whose declared dimension has more cells than this
+        """
+        self.include = re.compile(include, re.IGNORECASE) if include else None
+        self.exclude = re.compile(exclude, re.IGNORECASE) if exclude else None
+        self.positions = set(positions) if positions is not None else None
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_compressed_size = max_compressed_size
+        self.max_cells = max_cells
+
+    def __repr__(self):
+        # A stable description of the criteria (e.g. for the keys of the extraction cache)
+        return (f'SheetFilter(include={self.include.pattern if self.include else None!r}, '
+                f'exclude={self.exclude.pattern if self.exclude else None!r}, '
+                f'positions={sorted(self.positions) if self.positions is not None else None}, '
+                f'min_size={self.min_size}, max_size={self.max_size}, '
+                f'max_compressed_size={self.max_compressed_size}, max_cells={self.max_cells})')
+
+    @property
+    def needs_stream_engine(self):
+        """
+        Whether the filter uses the sizes or the dimension of the sheet XML
+        """
+        return any(bound is not None for bound in
+                   (self.min_size, self.max_size, self.max_compressed_size, self.max_cells))
+
+    def reject_reason(self, worksheet, position):
+        """
+        Check a worksheet against the filter. The cheapest criteria are checked first.
+        :param worksheet: the worksheet (its XML is not parsed)
+        :param position: the position of the worksheet in the workbook
+        :return: the reason for the rejection of the worksheet, or None if it is accepted
+        """
+        if self.positions is not None and position not in self.positions:
+            return 'position'
+        if self.include is not None and not self.include.search(worksheet.title):
+            return 'title'
+        if self.exclude is not None and self.exclude.search(worksheet.title):
+            return 'title'
+        if self.min_size is not None and worksheet.uncompressed_size < self.min_size:
+            return 'size'
+        if self.max_size is not None and worksheet.uncompressed_size > self.max_size:
+            return 'size'
+        if self.max_compressed_size is not None and worksheet.compressed_size > self.max_compressed_size:
+            return 'size'
+        if self.max_cells is not None and worksheet.declared_dimensions:
+            min_col, min_row, max_col, max_row = range_boundaries(worksheet.declared_dimensions)
+            if max_row is not None and max_col is not None and \
+                    (max_row - min_row + 1) * (max_col - min_col + 1) > self.max_cells:
+                return 'dimension'
+        return None
@@ -0,0 +1,109 @@
+#
+# sheet_grid.py
+# Intermediate form of the worksheets: what the table heuristics need from the xlsx
+#
+
+import gzip
+import json
+
+
+class OpaqueValue(object):
+    """
+    A cell value that JSON cannot represent (e.g. a date). Only its text is kept:
+    like the original value it is not a str and str() gives the same text, which
+    is all that the table heuristics use.
+    """
+
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f'OpaqueValue({self.text!r})'
+
+
+# The values that are stored as they are
+_NATIVE_TYPES = (str, int, float, bool)
+
+
+def _encode_value(value):
+    if value is None or type(value) in _NATIVE_TYPES:
+        return value
+    return {'s': str(value)}
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        return OpaqueValue(value['s'])
+    return value
+
+
+class SheetGrid(object):
+    """
+    The content of a worksheet that the table heuristics work on:
+    - title: the worksheet name
+    - dimensions: the used range (e.g. A1:D20) and origin: the (row, column) of its top left cell
+    - values: the raw cell values, as a list of rows (None for missing cells)
+    - merged: the (min_row, min_col, max_row, max_col) of each merged range (worksheet coordinates)
+    - palette, style_ids: the style attributes of each cell, as an index into the palette
+    It is saved once, so that the tables can be rebuilt with changed heuristics
+    without parsing the workbooks again.
+    """
+
+    def __init__(self, title, dimensions, origin, values, merged, palette=None, style_ids=None):
+        self.title = title
+        self.dimensions = dimensions
+        self.origin = origin
+        self.values = values
+        self.merged = merged
+        self.palette = palette
+        self.style_ids = style_ids
+
+    def row_styles(self, row):
+        """
+        Get the style attributes of the cells of a row
+        :param row: the row index (in the grid)
+        :return: a list with the (shared) style attributes dictionary of each cell
+        """
+        palette = self.palette
+        return [palette[i] for i in self.style_ids[row]]
+
+    def to_json(self):
+        """
+        :return: a dict with the grid that can be serialized to JSON
+        """
+        return {
+            'SheetName': self.title,
+            'Dimensions': self.dimensions,
+            'Origin': list(self.origin),
+            'Values': [[_encode_value(value) for value in row] for row in self.values],
+            'Merged': [list(bounds) for bounds in self.merged],
+            'Palette': self.palette,
+            'Styles': self.style_ids
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        """
+        :param data: a dict built by to_json
+        :return: a SheetGrid
+        """
+        return cls(data['SheetName'], data['Dimensions'], tuple(data['Origin']),
+                   [[_decode_value(value) for value in row] for row in data['Values']],
+                   [tuple(bounds) for bounds in data['Merged']], data['Palette'], data['Styles'])
+
+
+def read_grids(path):
+    """
+    Read the grids that have been saved for a workbook (one JSON grid per line, gzip compressed)
+    :param path: the path to the grid file
+    :return: a generator of SheetGrid
+    """
+    with gzip.open(path, 'rt') as fp:
+        for line in fp:
+            if line.strip():
+                yield SheetGrid.from_json(json.loads(line))
@@ -0,0 +1,415 @@
+#
+# table_model.py
+# Columnar in-memory representation of an extracted table
+#
+
+import unicodedata
+from array import array
+from bisect import bisect_right
+from bitree import FlatTree
+
+# The keys of the legacy table dict that precede and follow the 'Cells' key
+METADATA_KEYS = ('StorageAccount', 'BlobName', 'SheetName', 'Language', 'RangeAddress', 'Title')
+# The metadata that is the same for all the extracted tables (stored once per file in the v2 schema)
+TABLE_CONSTANTS = {'StorageAccount': 'EDGARExcelCrawled', 'BlobName': 'DataSpreadsheet', 'Language': 'english'}
+# The keys of the header trees of the table
+TREE_KEYS = ('TopTreeRoot', 'LeftTreeRoot')
+# The size of the palette up to which the style ids are unsigned shorts (then unsigned ints)
+_SHORT_IDS = 1 << 16
+
+
+class ColumnarTable(object):
+    """
+    A table whose cells are stored as parallel arrays in row-major order:
+    - text_ids: index of the cell text in the table string list
+    - style_ids: index of the cell style attributes in the table style palette (unsigned
+      shorts, widened to unsigned ints if the palette outgrows them)
+    and per row:
+    - header_rows: 1 if the row is a header row
+    - attribute_rows: 1 if the first cell of the row is an attribute
+    The texts and the style dictionaries are stored once per table, as well as the
+    numeric value of the texts (numbers) when the typed values are extracted. The merged
+    regions are indexed in merged_index (see MergedRegionIndex). The legacy
+    list-of-dicts form of the cells is only built when table['Cells'] or
+    to_dict() is called.
+    """
+
+    def __init__(self, metadata, num_columns):
+        """
+        :param metadata: a dict with the METADATA_KEYS of the table
+        :param num_columns: the number of columns of the table
+        """
+        self.metadata = metadata
+        self.info = {}
+        self.num_rows = 0
+        self.num_columns = num_columns
+        self.strings = []
+        self.normalized = []
+        self.numbers = None
+        self.palette = []
+        self.text_ids = array('I')
+        self.style_ids = array('H')
+        self.header_rows = array('b')
+        self.attribute_rows = array('b')
+        self._string_ids = {}
+        self._palette_ids = {}
+        self.merged_index = MergedRegionIndex([])
+        self._cells = None
+
+    def _add_string(self, text, normalized=None):
+        string_id = self._string_ids.get(text)
+        if string_id is None:
+            string_id = len(self.strings)
+            self._string_ids[text] = string_id
+            self.strings.append(text)
+            self.normalized.append(normalized)
+        return string_id
+
+    def _add_style(self, style):
+        # Style dictionaries are shared by reference (see _get_cell_style_attributes)
+        palette_id = self._palette_ids.get(id(style))
+        if palette_id is None:
+            palette_id = len(self.palette)
+            self._palette_ids[id(style)] = palette_id
+            self.palette.append(style)
+            if palette_id == _SHORT_IDS:
+                self.style_ids = array('I', self.style_ids)
+        return palette_id
+
+    def add_row(self, texts, styles, is_header, is_attribute, normalized=None):
+        """
+        Append a row to the table
+        :param texts: the text of each cell
+        :param styles: the style attributes dictionary of each cell
+        :param is_header: whether the row is a header row
+        :param is_attribute: whether the first cell of the row is an attribute
+        :param normalized: the normalized text (V) of each cell, if already computed
+        :return:
+        """
+        if normalized is None:
+            normalized = [None] * len(texts)
+        for text, style, norm in zip(texts, styles, normalized):
+            self.text_ids.append(self._add_string(text, norm))
+            # The style ids may be widened by _add_style
+            style_id = self._add_style(style)
+            self.style_ids.append(style_id)
+        self.header_rows.append(1 if is_header else 0)
+        self.attribute_rows.append(1 if is_attribute else 0)
+        self.num_rows += 1
+        self._cells = None
+
+    def value(self, row, column):
+        """
+        Get the text of a cell
+        :param row: the row index
+        :param column: the column index
+        :return: the cell text (str(value) of the original cell)
+        """
+        return self.strings[self.text_ids[row * self.num_columns + column]]
+
+    def normalized_value(self, row, column):
+        """
+        Get the normalized text of a cell (V)
+        :param row: the row index
+        :param column: the column index
+        :return: the normalized text
+        """
+        return self._normalized(self.text_ids[row * self.num_columns + column])
+
+    def _normalized(self, string_id):
+        norm = self.normalized[string_id]
+        if norm is None:
+            text = self.strings[string_id]
+            norm = "" if text == "None" else unicodedata.normalize('NFKD', text).strip()
+            self.normalized[string_id] = norm
+        return norm
+
+    def style(self, row, column):
+        """
+        Get the style attributes of a cell
+        :param row: the row index
+        :param column: the column index
+        :return: the (shared) style attributes dictionary
+        """
+        return self.palette[self.style_ids[row * self.num_columns + column]]
+
+    def is_header(self, row):
+        return self.header_rows[row] == 1
+
+    def cells(self):
+        """
+        Build the legacy list-of-dicts representation of the cells
+        :return: a list of rows, each one a list with a dict per cell
+        """
+        rows = []
+        num_columns = self.num_columns
+        strings = self.strings
+        for idx in range(self.num_rows):
+            is_header = self.header_rows[idx] == 1
+            is_attribute = self.attribute_rows[idx] == 1
+            offset = idx * num_columns
+            cells = []
+            for i in range(num_columns):
+                string_id = self.text_ids[offset + i]
+                text = strings[string_id]
+                cell = {
+                    'T': text,  # cell text
+                    'V': self._normalized(string_id),
+                    'is_header': is_header,
+                    'value': text
+                }
+                if self.numbers is not None:
+                    cell['N'] = self.numbers[string_id]  # typed numeric value
+                cell['is_attribute'] = is_attribute if i == 0 else False
+                cell['coordinates'] = (idx, i)  # (x,y)
+                cell.update(self.palette[self.style_ids[offset + i]])
+                cells.append(cell)
+            rows.append(cells)
+        return rows
+
+    def __getitem__(self, key):
+        if key == 'Cells':
+            if self._cells is None:
+                self._cells = self.cells()
+            return self._cells
+        if key in self.metadata:
+            return self.metadata[key]
+        return self.info[key]
+
+    def __setitem__(self, key, value):
+        if key == 'Cells':
+            raise KeyError('The cells of a columnar table are read only')
+        if key in self.metadata:
+            self.metadata[key] = value
+        else:
+            self.info[key] = value
+
+    def __contains__(self, key):
+        return key == 'Cells' or key in self.metadata or key in self.info
+
+    def update(self, other):
+        for key, value in other.items():
+            self[key] = value
+
+    def to_dict(self):
+        """
+        Build the legacy (JSON) dict representation of the table
+        :return: a dict with the table
+        """
+        table = dict(self.metadata)
+        table['Cells'] = self['Cells']
+        table.update(self.info)
+        return table
+
+    def to_compact(self, constants=None):
+        """
+        Build the compact (v2 schema) dict representation of the table:
+        - Metadata: the metadata that differs from the given (file level) constants
+        - Shape: the number of rows and columns
+        - Strings: the distinct cell texts (T, which is also the value of the cell)
+        - Normalized: the normalized texts (V) that cannot be derived from their T
+        - Numbers: the numeric value of each string (only with typed values)
+        - Palette: the distinct cell style attributes
+        - Text, Style: the string and palette index of each cell, in row-major order
+        - HeaderRows, AttributeRows: a 0/1 flag per row
+        - Info: the merged regions and the trees (as flat trees, see bitree.FlatTree)
+        :param constants: the metadata stored in the file header
+        :return: a dict with the table
+        """
+        constants = constants or {}
+        normalized = {}
+        for string_id, text in enumerate(self.strings):
+            norm = self._normalized(string_id)
+            if norm != ("" if text == "None" else unicodedata.normalize('NFKD', text).strip()):
+                normalized[str(string_id)] = norm
+        compact = {
+            'Metadata': {key: value for key, value in self.metadata.items()
+                         if key not in constants or constants[key] != value},
+            'Shape': [self.num_rows, self.num_columns],
+            'Strings': self.strings,
+            'Normalized': normalized
+        }
+        if self.numbers is not None:
+            compact['Numbers'] = self.numbers
+        compact.update({
+            'Palette': self.palette,
+            'Text': self.text_ids.tolist(),
+            'Style': self.style_ids.tolist(),
+            'HeaderRows': self.header_rows.tolist(),
+            'AttributeRows': self.attribute_rows.tolist(),
+            'Info': {key: FlatTree.from_nested(value).to_json() if key in TREE_KEYS else value
+                     for key, value in self.info.items()}
+        })
+        return compact
+
+    @classmethod
+    def from_compact(cls, data, constants=None):
+        """
+        Rebuild a table from its compact (v2 schema) dict representation
+        :param data: the dict built by to_compact
+        :param constants: the metadata stored in the file header
+        :return: a ColumnarTable
+        """
+        constants = constants or {}
+        metadata = {}
+        for key in METADATA_KEYS:
+            if key in data['Metadata']:
+                metadata[key] = data['Metadata'][key]
+            elif key in constants:
+                metadata[key] = constants[key]
+        table = cls(metadata, data['Shape'][1])
+        table.num_rows = data['Shape'][0]
+        table.strings = data['Strings']
+        table.normalized = [None] * len(table.strings)
+        for string_id, norm in data['Normalized'].items():
+            table.normalized[int(string_id)] = norm
+        table.numbers = data.get('Numbers')
+        table.palette = data['Palette']
+        table.text_ids = array('I', data['Text'])
+        table.style_ids = array('H' if len(table.palette) <= _SHORT_IDS else 'I', data['Style'])
+        table.header_rows = array('b', data['HeaderRows'])
+        table.attribute_rows = array('b', data['AttributeRows'])
+        # The trees of the files written before the flat trees are nested
+        table.info = {key: FlatTree.from_json(value).to_nested() if key in TREE_KEYS and 'Parent' in value else value
+                      for key, value in data['Info'].items()}
+        table.merged_index = MergedRegionIndex(table.info.get('MergedRegions', []))
+        table.__setstate__({})
+        return table
+
+    def __getstate__(self):
+        # Do not pickle the lookup dicts and the materialized cells
+        state = self.__dict__.copy()
+        state['_string_ids'] = None
+        state['_palette_ids'] = None
+        state['_cells'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._string_ids = {text: i for i, text in enumerate(self.strings)}
+        self._palette_ids = {id(style): i for i, style in enumerate(self.palette)}
+
+
+class MergedRegionIndex(object):
+    """
+    Index of the merged regions of a table, in table coordinates. It is built once
+    per worksheet from the numeric bounds of the merged ranges and answers:
+    - has_region: is there a region with the given bounds (O(1))
+    - region_at: which region covers a cell (O(log n))
+    - top_row_span: which region of the top row owns a column (O(log n))
+    """
+
+    def __init__(self, regions):
+        """
+        :param regions: a list of dicts with FirstRow, LastRow, FirstColumn and LastColumn
+        """
+        self.regions = regions
+        self._bounds = {}
+        for i, region in enumerate(regions):
+            self._bounds.setdefault(self._key(region), i)
+        # The single row regions of the top row, in the order of the regions list
+        self.top_row_spans = [(region['FirstColumn'], region['LastColumn']) for region in regions
+                              if region['FirstRow'] == 0 and region['LastRow'] == 0]
+        spans = sorted((span[0], span[1], i) for i, span in enumerate(self.top_row_spans))
+        self._top_span_starts = [span[0] for span in spans]
+        self._top_spans = spans
+        self._rows = None
+
+    @staticmethod
+    def _key(region):
+        return region['FirstRow'], region['LastRow'], region['FirstColumn'], region['LastColumn']
+
+    @classmethod
+    def from_ranges(cls, ranges, origin=(1, 1), size=None):
+        """
+        Build the index from the merged ranges of a worksheet
+        :param ranges: the merged cell ranges (with min_row, max_row, min_col and max_col)
+        :param origin: the (row, column) of the top left cell of the table in the worksheet
+        :param size: the (rows, columns) of the table in the worksheet (default: no limit)
+        :return: a MergedRegionIndex
+        """
+        return cls.from_bounds([(m.min_row, m.min_col, m.max_row, m.max_col) for m in ranges if m is not None],
+                               origin, size)
+
+    @classmethod
+    def from_bounds(cls, bounds, origin=(1, 1), size=None):
+        """
+        Build the index from the bounds of the merged ranges of a worksheet. The ranges
+        outside the table (e.g. above or left of its used range) are dropped, and those
+        across its boundaries are clipped to it.
+        :param bounds: the (min_row, min_col, max_row, max_col) of each merged range
+        :param origin: the (row, column) of the top left cell of the table in the worksheet
+        :param size: the (rows, columns) of the table in the worksheet (default: no limit)
+        :return: a MergedRegionIndex
+        """
+        max_row, max_col = (None, None) if size is None else (size[0] - 1, size[1] - 1)
+        regions = []
+        for first_row, first_col, last_row, last_col in bounds:
+            # index starts at (0,0)
+            first_row, last_row = first_row - origin[0], last_row - origin[0]
+            first_col, last_col = first_col - origin[1], last_col - origin[1]
+            if last_row < 0 or last_col < 0:
+                continue
+            if max_row is not None and (first_row > max_row or first_col > max_col):
+                continue
+            regions.append({
+                'FirstRow': max(first_row, 0),
+                'LastRow': last_row if max_row is None else min(last_row, max_row),
+                'FirstColumn': max(first_col, 0),
+                'LastColumn': last_col if max_col is None else min(last_col, max_col)
+            })
+        return cls(regions)
+
+    def adjusted(self, removed_idx, num_rows):
+        """
+        Get the index of the regions after the removal of table rows: the regions
+        below a removed (empty) row move up and the regions that are not within
+        the remaining rows (e.g. with footnotes at the bottom) are dropped
+        :param removed_idx: the index of the removed empty row, if any
+        :param num_rows: the number of the remaining table rows
+        :return: a new MergedRegionIndex
+        """
+        regions = []
+        for region in self.regions:
+            region = dict(region)
+            if removed_idx and region['FirstRow'] > removed_idx and region['LastRow'] > removed_idx:
+                region['FirstRow'] -= 1
+                region['LastRow'] -= 1
+            if region['FirstRow'] < num_rows and region['LastRow'] < num_rows:
+                regions.append(region)
+        return MergedRegionIndex(regions)
+
+    def has_region(self, first_row, last_row, first_column, last_column):
+        return (first_row, last_row, first_column, last_column) in self._bounds
+
+    def top_row_span(self, column):
+        """
+        Find the region of the top row that spans the given column
+        :param column: the column index
+        :return: the index of the region in top_row_spans, or None
+        """
+        i = bisect_right(self._top_span_starts, column) - 1
+        if i >= 0 and column <= self._top_spans[i][1]:
+            return self._top_spans[i][2]
+        return None
+
+    def region_at(self, row, column):
+        """
+        Find the region that covers the given cell
+        :param row: the row index
+        :param column: the column index
+        :return: the region dict, or None
+        """
+        if self._rows is None:
+            # Per row, the regions that cover it sorted by their first column
+            rows = {}
+            for i, region in enumerate(self.regions):
+                for r in range(max(region['FirstRow'], 0), region['LastRow'] + 1):
+                    rows.setdefault(r, []).append((region['FirstColumn'], region['LastColumn'], i))
+            self._rows = {r: ([span[0] for span in spans], spans)
+                          for r, spans in ((r, sorted(spans)) for r, spans in rows.items())}
+        starts, spans = self._rows.get(row, ((), ()))
+        i = bisect_right(starts, column) - 1
+        if i >= 0 and column <= spans[i][1]:
+            return self.regions[spans[i][2]]
+        return None
@@ -0,0 +1,316 @@
+#
+# table_shards.py
+# Sharded, compressed output of the tables of many workbooks, with a table-level offset index
+#
+
+import fcntl
+import gzip
+import itertools
+import json
+import os
+import re
+import socket
+import time
+import zlib
+from table_model import ColumnarTable, TABLE_CONSTANTS
+
+# The size after which a shard is closed and the next one is started (bytes)
+SHARD_BYTES = 256 << 20
+# The compression level of the tables (the gzip default, 9, is much slower for little gain)
+COMPRESS_LEVEL = 6
+
+_INDEX_SUFFIX = '.index.jsonl'
+_LOCK_SUFFIX = '.lock'
+
+
+def _shard_name(prefix, sequence):
+    return f'{prefix}-{sequence:05d}.jsonl.gz'
+
+
+def _claim_slot(directory):
+    """
+    Claim the first free writer slot of this host in a directory, with a lock on a file
+    that is released when the writer is closed or its process dies (even if killed)
+    :param directory: the directory of the shards
+    :return: a (prefix, file descriptor of the lock) tuple
+    """
+    host = re.sub(r'[^\w.-]', '_', socket.gethostname())
+    for slot in itertools.count():
+        prefix = f'{host}-{slot}'
+        fd = os.open(os.path.join(directory, prefix + _LOCK_SUFFIX), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return prefix, fd
+        except BlockingIOError:
+            os.close(fd)
+
+
+class _WorkbookTables(object):
+    """
+    The tables of a workbook that is being written to a shard, with the interface of
+    TableWriter: the workbook is committed to the index when it is closed, and its
+    tables are truncated from the shard when it is aborted.
+    """
+
+    def __init__(self, shards, file):
+        self._shards = shards
+        self.file = file
+        self.tables = []
+        self.num_tables = 0
+        self._start = None
+
+    def write(self, table):
+        """
+        Compress a table and append it to the shard
+        :param table: a table dict or a ColumnarTable (required by the v2 schema)
+        :return:
+        """
+        if self._start is None:
+            self._start = self._shards._begin()
+        if self._shards.schema == 2:
+            data = table.to_compact(self._shards.constants)
+        else:
+            data = table if isinstance(table, dict) else table.to_dict()
+        offset, length = self._shards._append((json.dumps(data) + '\n').encode())
+        self.tables.append([table['SheetName'], offset, length])
+        self.num_tables += 1
+
+    def close(self):
+        self._shards._commit(self)
+
+    def abort(self):
+        if self._start is not None:
+            self._shards._truncate(self._start)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class ShardWriter(object):
+    """
+    Append the tables of many workbooks to a few large shards instead of a file per
+    workbook. Each table is a gzip member of its own, so each table can be read on its
+    own from its offset. The index of the writer has a JSON line per workbook with the
+    shard and the (sheet, offset, length) of each table; the line is appended when all
+    the tables of the workbook have been written, so an interrupted workbook is not
+    indexed. Each writer (a worker process or thread) has its own shards and index,
+    named after its prefix, so the writers never contend on a file. The default prefix
+    is a slot of the host that no running writer holds: a writer that replaces another
+    one (a recycled or restarted worker) continues its last shard, after truncating
+    the tables that it has not indexed (e.g. a partial gzip member of a killed writer).
+    A shard is then a valid .jsonl.gz file (see read_tables) unless its writer has been
+    killed and has not been replaced yet; ShardIndex reads the indexed tables only.
+    """
+
+    def __init__(self, directory, prefix=None, max_bytes=SHARD_BYTES, schema=1, constants=None):
+        """
+        :param directory: the directory of the shards (it is created if it does not exist)
+        :param prefix: the name of the shards and the index of the writer (default: host-slot, see _claim_slot);
+            the writers of a prefix must not run at the same time
+        :param max_bytes: the size after which a shard is closed and the next one is started
+        :param schema: one of SCHEMAS (the v2 constants are in a header member at the start of each shard)
+        :param constants: the metadata stored once in the shard header (v2 schema, default: TABLE_CONSTANTS)
+        """
+        if schema not in (1, 2):
+            raise ValueError(f'Unknown schema: {schema}')
+        os.makedirs(directory, exist_ok=True)
+        self._lock = None
+        if prefix is None:
+            prefix, self._lock = _claim_slot(directory)
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.schema = schema
+        self.constants = TABLE_CONSTANTS if constants is None else constants
+        self._fp = None
+        # The end of the indexed tables of each shard of the prefix
+        self._ends = {}
+        index = os.path.join(directory, prefix + _INDEX_SUFFIX)
+        if os.path.exists(index):
+            # A writer interrupted while indexing leaves a partial last line, which is dropped
+            with open(index, 'r+b') as fp:
+                data = fp.read()
+                fp.truncate(data.rfind(b'\n') + 1)
+            for line in data[:data.rfind(b'\n') + 1].decode().splitlines():
+                if line.strip():
+                    entry = json.loads(line)
+                    for sheet, offset, length in entry['tables']:
+                        self._ends[entry['shard']] = max(self._ends.get(entry['shard'], 0), offset + length)
+        self._index = open(index, 'a')
+        # Continue the last shard of a previous writer with the same prefix (see _begin)
+        self._sequence = 0
+        while os.path.exists(os.path.join(directory, _shard_name(prefix, self._sequence + 1))):
+            self._sequence += 1
+
+    @property
+    def shard(self):
+        """
+        :return: the name of the current shard
+        """
+        return _shard_name(self.prefix, self._sequence)
+
+    def workbook(self, file):
+        """
+        Start the tables of a workbook
+        :param file: the path to the workbook
+        :return: a writer of the tables of the workbook (see TableWriter)
+        """
+        return _WorkbookTables(self, file)
+
+    def _header(self):
+        # The first line of the shards, if any: the v2 constants
+        if self.schema == 2:
+            return {'Schema': 2, 'Constants': self.constants}
+        return None
+
+    def _continues(self, path, end):
+        # Whether the tables can be appended to an existing shard, whose indexed tables end at end
+        if end >= self.max_bytes:
+            return False
+        if end == 0:
+            return True
+        with open(path, 'rb') as fp:
+            first = json.loads(gzip.GzipFile(fileobj=fp).readline())
+        return (first if 'Schema' in first else None) == json.loads(json.dumps(self._header()))
+
+    def _begin(self):
+        if self._fp is None:
+            path = os.path.join(self.directory, self.shard)
+            while os.path.exists(path) and not self._continues(path, self._ends.get(self.shard, 0)):
+                self._sequence += 1
+                path = os.path.join(self.directory, self.shard)
+            self._fp = open(path, 'ab')
+            # Drop what has not been indexed, e.g. the partial tables of a killed writer
+            self._truncate(self._ends.get(self.shard, 0))
+            if self._fp.tell() == 0 and self.schema == 2:
+                self._append((json.dumps(self._header()) + '\n').encode())
+        return self._fp.tell()
+
+    def _append(self, data):
+        offset = self._fp.tell()
+        self._fp.write(gzip.compress(data, COMPRESS_LEVEL))
+        return offset, self._fp.tell() - offset
+
+    def _truncate(self, offset):
+        self._fp.truncate(offset)
+        self._fp.seek(offset)
+
+    def _commit(self, tables):
+        if tables._start is None:
+            entry = {'file': tables.file, 'shard': None, 'tables': [], 'time': time.time()}
+        else:
+            self._fp.flush()
+            entry = {'file': tables.file, 'shard': self.shard, 'tables': tables.tables, 'time': time.time()}
+        self._index.write(json.dumps(entry) + '\n')
+        self._index.flush()
+        if self._fp is not None and self._fp.tell() >= self.max_bytes:
+            self._fp.close()
+            self._fp = None
+            self._sequence += 1
+
+    def close(self):
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+        self._index.close()
+        if self._lock is not None:
+            os.close(self._lock)
+            self._lock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def _decompress(data):
+    # A gzip member (the decompressobj is faster than gzip.decompress for single members)
+    return zlib.decompressobj(31).decompress(data)
+
+
+class ShardIndex(object):
+    """
+    The index of the shards of a directory: the last indexed entry of each workbook
+    (a workbook processed again by a later run replaces the earlier one).
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory: the directory of the shards
+        """
+        self.directory = directory
+        self.workbooks = {}
+        for name in os.listdir(directory):
+            if not name.endswith(_INDEX_SUFFIX):
+                continue
+            with open(os.path.join(directory, name), 'rb') as fp:
+                data = fp.read()
+            # A writer interrupted while indexing leaves a partial last line, which is ignored
+            for line in data[:data.rfind(b'\n') + 1].decode().splitlines():
+                if line.strip():
+                    entry = json.loads(line)
+                    if entry['file'] not in self.workbooks or \
+                            self.workbooks[entry['file']]['time'] <= entry['time']:
+                        self.workbooks[entry['file']] = entry
+        self._constants = {}
+
+    def __len__(self):
+        return len(self.workbooks)
+
+    def locate(self, file):
+        """
+        Locate the tables of a workbook
+        :param file: the path to the workbook
+        :return: a list with a dict per table (sheet, table: its position in the workbook, shard, offset, length)
+        """
+        entry = self.workbooks[file]
+        return [{'sheet': sheet, 'table': i, 'shard': entry['shard'], 'offset': offset, 'length': length}
+                for i, (sheet, offset, length) in enumerate(entry['tables'])]
+
+    def _table(self, shard, data):
+        table = json.loads(_decompress(data))
+        if 'Cells' in table:
+            return table
+        if shard not in self._constants:
+            with open(os.path.join(self.directory, shard), 'rb') as fp:
+                header = json.loads(gzip.GzipFile(fileobj=fp).readline())
+            self._constants[shard] = header['Constants']
+        return ColumnarTable.from_compact(table, self._constants[shard]).to_dict()
+
+    def read_table(self, file, sheet, table=0):
+        """
+        Read a table of a workbook
+        :param file: the path to the workbook
+        :param sheet: the name of the worksheet
+        :param table: the position of the table among the tables of the worksheet
+        :return: the table dict (in the v1 schema)
+        """
+        located = [location for location in self.locate(file) if location['sheet'] == sheet][table]
+        with open(os.path.join(self.directory, located['shard']), 'rb') as fp:
+            fp.seek(located['offset'])
+            return self._table(located['shard'], fp.read(located['length']))
+
+    def iter_tables(self):
+        """
+        Read all the indexed tables, shard by shard in the order of the shards (sequentially)
+        :return: a generator of (workbook, table dict in the v1 schema) tuples
+        """
+        shards = {}
+        for entry in self.workbooks.values():
+            for sheet, offset, length in entry['tables']:
+                shards.setdefault(entry['shard'], []).append((offset, length, entry['file']))
+        for shard in sorted(shards):
+            with open(os.path.join(self.directory, shard), 'rb') as fp:
+                for offset, length, file in sorted(shards[shard]):
+                    if fp.tell() != offset:
+                        fp.seek(offset)
+                    yield file, self._table(shard, fp.read(length))
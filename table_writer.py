@@ -0,0 +1,206 @@
+#
+# table_writer.py
+# Streaming output of the tables extracted from a workbook
+#
+
+import glob
+import gzip
+import json
+import os
+import socket
+import threading
+from table_model import ColumnarTable, TABLE_CONSTANTS
+
+# json: a JSON array with all the tables of the workbook (the original layout)
+# jsonl: one table per line
+OUTPUT_FORMATS = ('json', 'jsonl')
+# 1: the original schema, with a dict per cell
+# 2: the compact schema (see ColumnarTable.to_compact) with the constant metadata in a file header:
+#    json: {"Schema": 2, "Constants": {...}, "Tables": [...]}
+#    jsonl: a header line {"Schema": 2, "Constants": {...}} followed by a table per line
+SCHEMAS = (1, 2)
+# The host in the names of the temporary files (see temporary_path)
+_HOST = socket.gethostname().replace('.', '_')
+
+
+def output_path(file, output_dir='./output', output_format='json', compress=False):
+    """
+    Get the path to the output file of a workbook
+    :param file: the path to the workbook
+    :param output_dir: the output directory
+    :param output_format: one of OUTPUT_FORMATS
+    :param compress: whether the output is gzip compressed
+    :return: the path to the output file
+    """
+    name = file.split('/')[-1].split('.')[0] + '.' + output_format
+    if compress:
+        name += '.gz'
+    return os.path.join(output_dir, name)
+
+
+def temporary_path(path):
+    """
+    Get the path to a temporary file for a file, unique to this host, process and thread,
+    so that the writers of the same file (e.g. the workers of a job queue) never share it
+    :param path: the path to the file
+    :return: the path to the temporary file
+    """
+    return f'{path}.{_HOST}-{os.getpid()}-{threading.get_ident()}.tmp'
+
+
+def remove_temporary_files(path):
+    """
+    Remove the temporary files of a file (see temporary_path) left behind by the processes
+    of this host that have died (e.g. killed over a time limit)
+    :param path: the path to the file
+    :return: the number of files removed
+    """
+    removed = 0
+    for tmp_path in glob.glob(glob.escape(path) + '.*.tmp'):
+        host, _, pid = tmp_path[len(path) + 1:-len('.tmp')].rpartition('-')[0].rpartition('-')
+        if host != _HOST or not pid.isdigit():
+            continue
+        try:
+            os.kill(int(pid), 0)
+            continue
+        except ProcessLookupError:
+            pass
+        except OSError:
+            continue
+        try:
+            os.remove(tmp_path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+class TableWriter(object):
+    """
+    Write the tables of a workbook one by one, as soon as they are extracted, so
+    that neither the list of the tables nor its serialized form are kept in memory.
+    The output is written to a temporary file (see temporary_path) that replaces the
+    output file when the writer is closed; if the writer is aborted (e.g. when an exception is raised
+    within a with block) no output file is left behind.
+    """
+
+    def __init__(self, path, output_format='json', compress=False, schema=1, constants=None):
+        """
+        :param path: the path to the output file
+        :param output_format: one of OUTPUT_FORMATS
+        :param compress: whether to gzip compress the output on the fly
+        :param schema: one of SCHEMAS
+        :param constants: the metadata stored once in the file header (v2 schema, default: TABLE_CONSTANTS)
+        """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f'Unknown output format: {output_format}')
+        if schema not in SCHEMAS:
+            raise ValueError(f'Unknown schema: {schema}')
+        self.path = path
+        self.output_format = output_format
+        self.schema = schema
+        self.constants = TABLE_CONSTANTS if constants is None else constants
+        self.num_tables = 0
+        self._tmp_path = temporary_path(path)
+        if compress:
+            self._fp = gzip.open(self._tmp_path, 'wt', encoding='utf-8')
+        else:
+            self._fp = open(self._tmp_path, 'w')
+        if schema == 2:
+            header = json.dumps({'Schema': 2, 'Constants': self.constants})
+            if output_format == 'jsonl':
+                self._fp.write(header + '\n')
+            else:
+                self._fp.write(header[:-1] + ', "Tables": ')
+
+    def write(self, table):
+        """
+        Serialize a table to the output
+        :param table: a table dict or a ColumnarTable (required by the v2 schema)
+        :return:
+        """
+        if self.schema == 2:
+            table = table.to_compact(self.constants)
+        elif not isinstance(table, dict):
+            table = table.to_dict()
+        if self.output_format == 'jsonl':
+            self._fp.write(json.dumps(table))
+            self._fp.write('\n')
+        else:
+            # The same separators as json.dumps() of the list of the tables
+            self._fp.write(', ' if self.num_tables else '[')
+            self._fp.write(json.dumps(table))
+        self.num_tables += 1
+
+    def close(self):
+        """
+        Finish the output and move it to the output file
+        :return:
+        """
+        if self._fp is None:
+            return
+        if self.output_format == 'json':
+            self._fp.write(']' if self.num_tables else '[]')
+            if self.schema == 2:
+                self._fp.write('}')
+        self._fp.close()
+        self._fp = None
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        """
+        Discard the output
+        :return:
+        """
+        if self._fp is None:
+            return
+        self._fp.close()
+        self._fp = None
+        os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def _expand(data, constants):
+    # A v2 table back to the v1 dict
+    return ColumnarTable.from_compact(data, constants).to_dict()
+
+
+def read_tables(path):
+    """
+    Read the tables of an output file in any of the OUTPUT_FORMATS and SCHEMAS
+    :param path: the path to the output file
+    :return: a list with the table dicts (in the v1 schema)
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt') as fp:
+        if path.endswith('.jsonl') or path.endswith('.jsonl.gz'):
+            tables = [json.loads(line) for line in fp if line.strip()]
+            if tables and tables[0].get('Schema') == 2:
+                return [_expand(table, tables[0]['Constants']) for table in tables[1:]]
+            return tables
+        tables = json.load(fp)
+        if isinstance(tables, dict) and tables.get('Schema') == 2:
+            return [_expand(table, tables['Constants']) for table in tables['Tables']]
+        return tables
+
+
+def expand(path, expanded_path):
+    """
+    Convert an output file to the v1 schema (in the same output format)
+    :param path: the path to the output file
+    :param expanded_path: the path to the converted file
+    :return:
+    """
+    output_format = 'jsonl' if '.jsonl' in os.path.basename(path) else 'json'
+    with TableWriter(expanded_path, output_format, expanded_path.endswith('.gz')) as writer:
+        for table in read_tables(path):
+            writer.write(table)
@@ -0,0 +1,64 @@
+#
+# data_type_test.py
+# Test the number format driven data type (DT) of the cells
+#
+
+import sys
+import unittest
+from datetime import datetime
+from extraction_engine import _classify_number_format, _get_cell_data_type
+from openpyxl import Workbook
+
+sys.path.append('../')
+
+
+class TestDataType(unittest.TestCase):
+    """Test the data type classification of the cells"""
+
+    def test_number_formats(self):
+        """
+        Test the data type of the common number formats
+        :return:
+        """
+        self.assertEqual(_classify_number_format('General'), 1)
+        self.assertEqual(_classify_number_format('#,##0_);(#,##0)'), 1)
+        self.assertEqual(_classify_number_format('[Red]#,##0;[>=100]0.00'), 1)
+        self.assertEqual(_classify_number_format('0.0%'), 3)
+        self.assertEqual(_classify_number_format('_("$ "#,##0_);_("$ "(#,##0)'), 4)
+        self.assertEqual(_classify_number_format('_($* #,##0.00_)'), 4)
+        self.assertEqual(_classify_number_format('[$€-407]#,##0.00'), 4)
+        self.assertEqual(_classify_number_format('[$-409]mmmm d, yyyy'), 2)
+        self.assertEqual(_classify_number_format('yyyy-mm-dd'), 2)
+
+    def test_cells(self):
+        """
+        Test the data type of the cells
+        :return:
+        """
+        worksheet = Workbook().active
+        worksheet['A1'] = 'Revenue $'
+        worksheet['A2'] = 0.25
+        worksheet['A2'].number_format = '0%'
+        worksheet['A3'] = 100
+        worksheet['A3'].number_format = '"$"#,##0'
+        worksheet['A4'] = 100
+        worksheet['A5'] = datetime(2020, 12, 31)
+        worksheet['A6'].number_format = '"$"#,##0'
+        worksheet['A7'] = True
+        types = [_get_cell_data_type(worksheet.cell(row, 1)) for row in range(1, 8)]
+        self.assertEqual(types, [0, 3, 4, 1, 2, 1, 5])
+
+    def test_cache(self):
+        """
+        Test that each number format is parsed once
+        :return:
+        """
+        _classify_number_format.cache_clear()
+        for _ in range(10):
+            _classify_number_format('#,##0.00')
+        info = _classify_number_format.cache_info()
+        self.assertEqual((info.hits, info.misses), (9, 1))
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestDataType)
+unittest.TextTestRunner(verbosity=2).run(suite)
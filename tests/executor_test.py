@@ -0,0 +1,65 @@
+#
+# executor_test.py
+# Test that the executors of the extraction engine give the same tables
+#
+
+import sys
+import unittest
+import os
+import json
+import extract_tables
+import extract_tables_multiprocess
+import extraction_engine
+from extraction_engine import iter_tables, batch_process_wb, EXECUTORS
+
+sys.path.append('../')
+
+
+class TestExecutors(unittest.TestCase):
+    """Test the executors"""
+
+    def setUp(self):
+        ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+        self.files = [ROOT_DIR + '/test-data/' + name for name in ('8-K.xlsx', '10-Q.xlsx', '8-K_sample2.xlsx')]
+
+    def tables(self, executor):
+        tables = {}
+        for source, table in iter_tables(self.files, workers=2, executor=executor):
+            tables.setdefault(source, []).append(table.to_dict())
+        return json.loads(json.dumps(tables))
+
+    def test_same_tables(self):
+        """
+        Test that the serial, process and thread executors give the same tables
+        :return:
+        """
+        expected = self.tables('serial')
+        self.assertEqual(sorted(expected), sorted(self.files))
+        for executor in EXECUTORS:
+            self.assertEqual(self.tables(executor), expected)
+
+    def test_entry_points(self):
+        """
+        Test that the former modules are entry points of the engine
+        :return:
+        """
+        self.assertIs(extract_tables_multiprocess.main, extraction_engine.main)
+        from openpyxl import load_workbook
+        tables = extract_tables.process_wb(load_workbook(self.files[0]))
+        self.assertEqual(json.loads(json.dumps(tables)), self.tables('serial')[self.files[0]])
+
+    def test_invalid_executor(self):
+        """
+        Test the executors that cannot run a batch
+        :return:
+        """
+        with self.assertRaises(ValueError):
+            batch_process_wb('./data', executor='cluster')
+        with self.assertRaises(ValueError):
+            batch_process_wb('./data', engine='stream', parallelism='sheet', executor='thread')
+        with self.assertRaises(ValueError):
+            batch_process_wb('./data', executor='thread', timeout=10)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestExecutors)
+unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,158 @@
+#
+# extraction_cache_test.py
+# Test the content-addressed cache of the output files
+#
+
+import sys
+import unittest
+import os
+import shutil
+import socket
+import tempfile
+from multiprocessing import Process
+import extraction_engine
+from extraction_engine import process_wb, batch_process_wb
+from extraction_cache import ExtractionCache
+from run_manifest import RunManifest
+from sheet_filter import SheetFilter
+
+sys.path.append('../')
+
+
+class TestExtractionCache(unittest.TestCase):
+    """Test the extraction cache"""
+
+    def setUp(self):
+        ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+        self.data_dir = ROOT_DIR + '/test-data'
+        self.directory = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory.name)
+        os.mkdir('data')
+        os.mkdir('output')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def test_hit(self):
+        """
+        Test that a byte-identical workbook is served from the cache with the same output
+        :return:
+        """
+        cache = ExtractionCache('cache')
+        shutil.copy(self.data_dir + '/8-K.xlsx', 'data/8-K.xlsx')
+        shutil.copy(self.data_dir + '/8-K.xlsx', 'data/8-K_amended.xlsx')
+        num_tables, error = process_wb('data/8-K.xlsx', cache=cache)
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        self.assertEqual(process_wb('data/8-K_amended.xlsx', cache=cache), (num_tables, None))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        with open('output/8-K.json') as fp, open('output/8-K_amended.json') as fp_cached:
+            self.assertEqual(fp.read(), fp_cached.read())
+        # Another content, version or option is another key
+        shutil.copy(self.data_dir + '/10-Q.xlsx', 'data/8-K.xlsx')
+        process_wb('data/8-K.xlsx', cache=cache)
+        process_wb('data/8-K_amended.xlsx', cache=cache, schema=2)
+        process_wb('data/8-K_amended.xlsx', cache=cache, sheet_filter=SheetFilter(include='x'))
+        self.assertEqual((cache.hits, cache.misses), (1, 4))
+        self.assertNotEqual(ExtractionCache.key('h', 1), ExtractionCache.key('h', 2))
+        self.assertEqual(ExtractionCache.key('h', 1, sheet_filter=SheetFilter(positions=[2, 1])),
+                         ExtractionCache.key('h', 1, sheet_filter=SheetFilter(positions=[1, 2])))
+
+    def test_eviction(self):
+        """
+        Test that the least recently used entries are evicted
+        :return:
+        """
+        with open('output/a', 'w') as fp:
+            fp.write('x' * 1000)
+        cache = ExtractionCache('cache', max_bytes=2500)
+        cache.put('a', 'output/a', 1)
+        cache.put('b', 'output/a', 2)
+        os.utime('cache/a', (0, 0))
+        os.utime('cache/b', (1, 1))
+        # Using a makes b the least recently used entry
+        self.assertEqual(cache.get('a', 'output/out'), 1)
+        cache.put('c', 'output/a', 3)
+        self.assertEqual(cache.evictions, 1)
+        self.assertIsNone(cache.get('b', 'output/out'))
+        self.assertEqual(cache.get('c', 'output/out'), 3)
+        self.assertEqual(sorted(os.listdir('cache')), ['a', 'a.meta', 'c', 'c.meta'])
+
+    def test_total(self):
+        """
+        Test that the directory is only scanned to evict, once the total is over the maximum size
+        :return:
+        """
+        with open('output/a', 'w') as fp:
+            fp.write('x' * 1000)
+        cache = ExtractionCache('cache', max_bytes=2500)
+        cache.put('a', 'output/a', 1)
+        # Another cache of the same directory starts from its total
+        cache = ExtractionCache('cache', max_bytes=2500)
+        scans = []
+        scan = cache._scan
+        cache._scan = lambda: scans.append(None) or scan()
+        cache.put('b', 'output/a', 2)
+        self.assertEqual((len(scans), cache.evictions), (0, 0))
+        cache.put('c', 'output/a', 3)
+        self.assertEqual((len(scans), cache.evictions), (1, 1))
+        self.assertEqual(cache._total, sum(os.path.getsize(os.path.join('cache', name))
+                                           for name in os.listdir('cache')))
+
+    def test_batch(self):
+        """
+        Test the hit and miss counters of the batch runs
+        :return:
+        """
+        shutil.copy(self.data_dir + '/8-K.xlsx', 'data/8-K.xlsx')
+        shutil.copy(self.data_dir + '/10-Q.xlsx', 'data/10-Q.xlsx')
+        batch_process_wb('data', workers=0, cache=ExtractionCache('cache'))
+        self.assertEqual(extraction_engine.cache_stats, {'hits': 0, 'misses': 2})
+        shutil.copy(self.data_dir + '/8-K.xlsx', 'data/8-K_copy.xlsx')
+        # The counters are those of the last run
+        batch_process_wb('data', workers=0, cache=ExtractionCache('cache'))
+        self.assertEqual(extraction_engine.cache_stats, {'hits': 3, 'misses': 0})
+        with self.assertRaises(ValueError):
+            batch_process_wb('data', engine='stream', parallelism='sheet', cache=ExtractionCache('cache'))
+
+    def test_duplicates(self):
+        """
+        Test that identical workbooks processed at the same time wait for the first one
+        :return:
+        """
+        for i in range(4):
+            shutil.copy(self.data_dir + '/8-K.xlsx', f'data/8-K_{i}.xlsx')
+        for executor in ('process', 'thread'):
+            batch_process_wb('data', workers=2, cache=ExtractionCache(executor), manifest=executor + '.jsonl',
+                             executor=executor)
+            self.assertEqual(extraction_engine.cache_stats, {'hits': 3, 'misses': 1})
+            with RunManifest(executor + '.jsonl') as manifest:
+                self.assertEqual(sorted(entry['cached'] for entry in manifest.entries.values()),
+                                 [False, True, True, True])
+            self.assertEqual(len(os.listdir(executor)), 2)
+
+    def test_claim(self):
+        """
+        Test the claims of the entries, and that the claim of a process that has died is ignored
+        :return:
+        """
+        with open('output/a', 'w') as fp:
+            fp.write('x')
+        cache = ExtractionCache('cache')
+        self.assertEqual(cache.get_or_claim('a', 'output/out'), (None, True))
+        self.assertTrue(os.path.exists('cache/a.lock'))
+        cache.put('a', 'output/a', 1)
+        cache.release('a')
+        self.assertEqual(cache.get_or_claim('a', 'output/out'), (1, False))
+        process = Process(target=os.getpid)
+        process.start()
+        process.join()
+        with open('cache/b.lock', 'w') as fp:
+            fp.write(f'{socket.gethostname()}:{process.pid}')
+        self.assertEqual(cache.get_or_claim('b', 'output/out'), (None, True))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestExtractionCache)
+unittest.TextTestRunner(verbosity=2).run(suite)
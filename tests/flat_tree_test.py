@@ -0,0 +1,88 @@
+#
+# flat_tree_test.py
+# Test the flat representation of the header trees and the header path queries
+#
+
+import sys
+import unittest
+import json
+from extraction_engine import process_ws
+from openpyxl import load_workbook
+from bitree import FlatTree, BiTree
+import os
+
+sys.path.append('../')
+
+
+def _nested_path(root, row, column):
+    # The header path of a cell by walking the nested tree (the reference)
+    def walk(node, path):
+        for child in node['Cd']:
+            if (child['RI'], child['CI']) == (row, column):
+                return path
+            found = walk(child, path + [(child['RI'], child['CI'])])
+            if found is not None:
+                return found
+        return None
+    return walk(root, [])
+
+
+class TestFlatBiTree(unittest.TestCase):
+    """Test the flat header trees"""
+
+    def setUp(self):
+        # Load a test 10-K report and extract the income statement
+        ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+        workbook = load_workbook(ROOT_DIR + '/test-data/10-K.xlsx')
+        self.worksheets = workbook.worksheets
+        self.table = process_ws(self.worksheets[1])
+        self.bitree = BiTree.from_table(self.table)
+
+    def test_conversion(self):
+        """
+        Test that the nested trees are converted to flat trees and back without changes
+        :return:
+        """
+        for worksheet in self.worksheets[:30]:
+            try:
+                table = process_ws(worksheet)
+            except IndexError:
+                continue
+            if table is None:
+                continue
+            for key in ('TopTreeRoot', 'LeftTreeRoot'):
+                flat = FlatTree.from_json(json.loads(json.dumps(FlatTree.from_nested(table[key]).to_json())))
+                self.assertEqual(flat.to_nested(), table[key])
+                self.assertLess(len(json.dumps(flat.to_json())), len(json.dumps(table[key])))
+
+    def test_structure(self):
+        """
+        Test the arrays of the top tree
+        :return:
+        """
+        top = self.bitree.top
+        self.assertEqual((top.rows[0], top.cols[0], top.parent[0]), (-1, -1, -1))
+        node = top.node(0, 1)
+        self.assertEqual([(top.rows[child], top.cols[child]) for child in top.children(node)],
+                         [(1, 1), (1, 2), (1, 3)])
+        self.assertIsNone(top.node(5, 5))
+
+    def test_header_paths(self):
+        """
+        Test the header paths of the cells against the nested trees
+        :return:
+        """
+        self.assertEqual(self.bitree.top_header_path(5, 2), [(0, 1), (1, 2)])
+        self.assertEqual(self.bitree.left_header_path(5, 2), [(5, 0)])
+        self.assertEqual(self.bitree.left_header_path(6, 2), [(5, 0), (6, 0)])
+        # Header cells have their ancestors as path
+        self.assertEqual(self.bitree.top_header_path(1, 2), [(0, 1)])
+        self.assertEqual(self.bitree.left_header_path(6, 0), [(5, 0)])
+        top_root = self.table['TopTreeRoot']
+        for column in range(1, len(self.table['Cells'][0])):
+            path = self.bitree.top_header_path(10, column)
+            self.assertEqual(_nested_path(top_root, *path[-1]) + [path[-1]], path)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestFlatBiTree)
+unittest.TextTestRunner(verbosity=2).run(suite)
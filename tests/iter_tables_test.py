@@ -0,0 +1,86 @@
+#
+# iter_tables_test.py
+# Test the in-process extraction of the tables of workbooks
+#
+
+import sys
+import unittest
+import json
+import os
+from io import BytesIO
+from extraction_engine import iter_tables, process_ws
+from openpyxl import load_workbook
+
+sys.path.append('../')
+
+
+class TestIterTables(unittest.TestCase):
+    """Test the generator of the tables"""
+
+    def setUp(self):
+        ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+        self.files = [ROOT_DIR + '/test-data/8-K.xlsx', ROOT_DIR + '/test-data/8-K_sample2.xlsx']
+        self.expected = {}
+        for file in self.files:
+            tables = [process_ws(ws) for ws in load_workbook(file).worksheets]
+            self.expected[file] = [json.dumps(table) for table in tables if table is not None]
+        self.pulled = []
+
+    def sources(self, files):
+        # Record when each source is taken from the iterable
+        for file in files:
+            self.pulled.append(file)
+            yield file
+
+    def test_serial(self):
+        """
+        Test the tables extracted in this process, from paths and file-like objects
+        :return:
+        """
+        with open(self.files[1], 'rb') as fp:
+            buffer = BytesIO(fp.read())
+        results = iter_tables(self.sources([self.files[0], buffer]))
+        source, table = next(results)
+        # The second workbook is not touched before its tables are requested
+        self.assertEqual(self.pulled, [self.files[0]])
+        self.assertEqual(json.dumps(table.to_dict()), self.expected[self.files[0]][0])
+        rest = list(results)
+        self.assertEqual([json.dumps(table.to_dict()) for source, table in rest if source is buffer],
+                         self.expected[self.files[1]])
+
+    def test_parallel(self):
+        """
+        Test that the tables extracted in worker processes are the same
+        :return:
+        """
+        files = self.files * 3
+        results = iter_tables(self.sources(files), workers=2, max_in_flight=2)
+        tables = {}
+        for source, table in results:
+            tables.setdefault(source, []).append(json.dumps(table.to_dict()))
+        self.assertEqual(len(self.pulled), len(files))
+        for file in self.files:
+            self.assertEqual(tables[file], self.expected[file] * 3)
+
+    def test_bounded(self):
+        """
+        Test that no more than max_in_flight workbooks are in flight
+        :return:
+        """
+        results = iter_tables(self.sources(self.files * 5), workers=2, max_in_flight=3)
+        next(results)
+        self.assertLessEqual(len(self.pulled), 3)
+        results.close()
+
+    def test_skipped_file(self):
+        """
+        Test that a workbook that cannot be read is skipped
+        :return:
+        """
+        for workers in (None, 2):
+            results = list(iter_tables([self.files[0] + '.missing', self.files[0]], workers=workers))
+            self.assertEqual([source for source, _ in results], [self.files[0]])
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestIterTables)
+unittest.TextTestRunner(verbosity=2).run(suite)
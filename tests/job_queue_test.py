@@ -0,0 +1,141 @@
+#
+# job_queue_test.py
+# Test the shared job queue of a distributed run
+#
+
+import sys
+import unittest
+import os
+import shutil
+import tempfile
+import time
+from extraction_engine import enqueue, run_queue_workers, main
+from job_queue import JobQueue, Heartbeat, RUNNING, DONE, FAILED
+
+sys.path.append('../')
+
+
+class TestJobQueue(unittest.TestCase):
+    """Test the job queue"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'jobs.sqlite')
+        self.files = []
+        for name, size in (('small', 10), ('large', 1000), ('medium', 100)):
+            file = os.path.join(self.directory.name, name)
+            with open(file, 'wb') as fp:
+                fp.write(b'x' * size)
+            self.files.append(file)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_claim(self):
+        """
+        Test that the largest workbooks are claimed first, once each, and completed by their owner only
+        :return:
+        """
+        with JobQueue(self.path) as jobs:
+            self.assertEqual(jobs.add(self.files), 3)
+            self.assertEqual(jobs.add(self.files), 0)
+            claimed = [jobs.claim('a', 60), jobs.claim('b', 60), jobs.claim('a', 60)]
+            self.assertEqual([os.path.basename(file) for file in claimed], ['large', 'medium', 'small'])
+            self.assertIsNone(jobs.claim('b', 60))
+            self.assertFalse(jobs.complete(claimed[0], 'b', 1))
+            self.assertTrue(jobs.complete(claimed[0], 'a', 1))
+            self.assertTrue(jobs.complete(claimed[1], 'b', None, 'Error'))
+            self.assertEqual(jobs.counts(), {DONE: 1, FAILED: 1, RUNNING: 1})
+            self.assertEqual(jobs.retry_failed(), 1)
+            self.assertEqual(jobs.claim('b', 60), claimed[1])
+
+    def test_expired_lease(self):
+        """
+        Test that the workbook of an expired lease is claimed again, until max_attempts
+        :return:
+        """
+        with JobQueue(self.path, max_attempts=2) as jobs:
+            jobs.add(self.files[:1])
+            file = jobs.claim('a', 0.1)
+            self.assertIsNone(jobs.claim('b', 0.1))
+            time.sleep(0.2)
+            self.assertEqual(jobs.claim('b', 0.1), file)
+            # The former owner has lost the lease
+            self.assertFalse(jobs.heartbeat(file, 'a', 0.1))
+            self.assertFalse(jobs.complete(file, 'a', 1))
+            time.sleep(0.2)
+            self.assertIsNone(jobs.claim('c', 0.1))
+            job, = jobs.jobs()
+            self.assertEqual((job['status'], job['attempts']), (FAILED, 2))
+
+    def test_heartbeat(self):
+        """
+        Test that the lease is renewed while a workbook is processed, and that a lost lease is reported
+        :return:
+        """
+        with JobQueue(self.path) as jobs:
+            jobs.add(self.files[:1])
+            file = jobs.claim('a', 0.3)
+            with Heartbeat(self.path, file, 'a', 0.3) as heartbeat:
+                time.sleep(0.6)
+                self.assertIsNone(jobs.claim('b', 0.3))
+            self.assertFalse(heartbeat.lost.is_set())
+            time.sleep(0.4)
+            self.assertEqual(jobs.claim('b', 0.3), file)
+            with Heartbeat(self.path, file, 'a', 0.3) as heartbeat:
+                self.assertTrue(heartbeat.lost.wait(1))
+
+    def test_workers(self):
+        """
+        Test that several worker processes share the workbooks of a queue
+        :return:
+        """
+        ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+        cwd = os.getcwd()
+        os.chdir(self.directory.name)
+        try:
+            os.mkdir('data')
+            os.mkdir('output')
+            names = ['10-K', '10-Q', '8-K', '8-K_sample2']
+            for name in names:
+                shutil.copy(ROOT_DIR + '/test-data/' + name + '.xlsx', 'data/' + name + '.xlsx')
+            self.assertEqual(enqueue('jobs.sqlite', 'data'), 4)
+            self.assertEqual(run_queue_workers('jobs.sqlite', workers=3, lease=10), {DONE: 4})
+            with JobQueue('jobs.sqlite') as jobs:
+                for job in jobs.jobs():
+                    self.assertEqual(job['attempts'], 1)
+                    self.assertGreater(job['tables'], 0)
+            self.assertEqual(sorted(os.listdir('output')), [name + '.json' for name in sorted(names)])
+            # Nothing is left to process
+            self.assertEqual(run_queue_workers('jobs.sqlite', workers=1), {DONE: 4})
+        finally:
+            os.chdir(cwd)
+
+    def test_timeout(self):
+        """
+        Test that the processing of a workbook over the time limit is killed, and the workbook failed
+        :return:
+        """
+        ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+        cwd = os.getcwd()
+        os.chdir(self.directory.name)
+        try:
+            os.mkdir('data')
+            os.mkdir('output')
+            shutil.copy(ROOT_DIR + '/test-data/10-K.xlsx', 'data/10-K.xlsx')
+            enqueue('jobs.sqlite', 'data')
+            self.assertEqual(run_queue_workers('jobs.sqlite', workers=1, lease=10, timeout=0.01), {FAILED: 1})
+            with JobQueue('jobs.sqlite') as jobs:
+                job, = jobs.jobs()
+            self.assertEqual(job['attempts'], 1)
+            self.assertIn('Timed out', job['error'])
+            self.assertEqual(os.listdir('output'), [])
+            # The options that the queue does not support are rejected
+            with self.assertRaises(SystemExit):
+                main(['data', '--queue', 'jobs.sqlite', '--manifest', 'manifest.jsonl'])
+        finally:
+            os.chdir(cwd)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestJobQueue)
+unittest.TextTestRunner(verbosity=2).run(suite)
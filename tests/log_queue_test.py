@@ -0,0 +1,141 @@
+#
+# log_queue_test.py
+# Test the logging of the worker processes through the listener process
+#
+
+import sys
+import unittest
+import os
+import json
+import logging
+import tempfile
+import threading
+import time
+from multiprocessing import Process
+from extraction_engine import process_wb, rootLogger
+from log_queue import LogListener, parse_levels
+
+sys.path.append('../')
+
+
+class TestLogQueue(unittest.TestCase):
+    """Test the log listener"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'test.log')
+        self.logger = logging.getLogger('log_queue_test')
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        handler = logging.FileHandler(self.path, 'w')
+        handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+        self.logger.addHandler(handler)
+
+    def tearDown(self):
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+            handler.close()
+        self.directory.cleanup()
+
+    def lines(self):
+        with open(self.path) as fp:
+            return fp.read().splitlines()
+
+    def test_workers(self):
+        """
+        Test that the records of the worker processes are written by the listener, whole, with their fields
+        :return:
+        """
+        self.logger.info('Before')
+        with LogListener([self.logger], 'json'):
+            self.assertFalse([handler for handler in self.logger.handlers
+                              if isinstance(handler, logging.FileHandler)])
+            processes = [Process(target=self.logger.info, args=('Worker %d', i), kwargs={'extra': {'file': str(i)}})
+                         for i in range(3)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+            self.logger.error('Parent', extra={'reason': 'test', 'duration': 0.5})
+        self.logger.info('After')
+        lines = self.lines()
+        self.assertEqual((lines[0], lines[-1]), ('INFO Before', 'INFO After'))
+        records = [json.loads(line) for line in lines[1:-1]]
+        self.assertEqual(sorted(record['message'] for record in records), ['Parent', 'Worker 0', 'Worker 1',
+                                                                          'Worker 2'])
+        for record in records:
+            if record['message'] == 'Parent':
+                self.assertEqual((record['level'], record['reason'], record['duration']), ('ERROR', 'test', 0.5))
+            else:
+                self.assertEqual(record['file'], record['message'][-1])
+                self.assertNotEqual(record['process'], os.getpid())
+
+    def test_levels(self):
+        """
+        Test the text format and the levels of the loggers
+        :return:
+        """
+        with LogListener([self.logger], levels=parse_levels('log_queue_test=warning')):
+            self.logger.info('Filtered')
+            self.logger.warning('Kept')
+            # A listener within the block of another one does nothing
+            with LogListener([self.logger], levels=parse_levels('log_queue_test=error')):
+                self.logger.warning('Nested')
+        self.assertEqual(self.logger.level, logging.INFO)
+        self.assertEqual(self.lines(), ['WARNING Kept', 'WARNING Nested'])
+        with self.assertRaises(ValueError):
+            parse_levels('Main=LOUD')
+
+    def log_forever(self):
+        while True:
+            self.logger.info('Killed')
+
+    def test_killed(self):
+        """
+        Test that a worker killed while it logs neither blocks the other processes nor the listener
+        :return:
+        """
+        def run():
+            with LogListener([self.logger]):
+                killed = Process(target=self.log_forever)
+                killed.start()
+                time.sleep(0.5)
+                killed.kill()
+                killed.join()
+                worker = Process(target=self.logger.info, args=('Worker',))
+                worker.start()
+                worker.join()
+                self.logger.info('Parent')
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        thread.join(60)
+        self.assertFalse(thread.is_alive())
+        lines = self.lines()
+        self.assertEqual(lines[-2:], ['INFO Worker', 'INFO Parent'])
+        self.assertEqual(set(lines[:-2]), {'INFO Killed'})
+
+    def test_fields(self):
+        """
+        Test the structured fields of the records of a processed workbook
+        :return:
+        """
+        ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+        file = ROOT_DIR + '/test-data/8-K.xlsx'
+        cwd = os.getcwd()
+        os.chdir(self.directory.name)
+        try:
+            os.mkdir('output')
+            with self.assertLogs(rootLogger) as logs:
+                num_tables, error = process_wb(file)
+                process_wb(ROOT_DIR + '/test-data/missing.xlsx')
+        finally:
+            os.chdir(cwd)
+        processed, skipped = logs.records[0], logs.records[-1]
+        self.assertEqual((processed.file, processed.tables), (file, num_tables))
+        self.assertGreater(processed.duration, 0)
+        self.assertIn('FileNotFoundError', skipped.reason)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestLogQueue)
+unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,103 @@
+#
+# memory_budget_test.py
+# Test the memory-aware admission of the workbooks to the workers
+#
+
+import sys
+import unittest
+import os
+import time
+from extraction_engine import _imap_bounded, batch_process_wb
+from memory_budget import MemoryAdmission, PeakMemory, workbook_size
+
+sys.path.append('../')
+
+
+class _Admission(object):
+    # The estimate of an item is its value; the estimates and the results are logged (see TestMemoryBudget.admitted)
+    def __init__(self, budget):
+        self.budget = budget
+        self.log = []
+
+    def estimate(self, item):
+        self.log.append(('estimate', item))
+        return item
+
+
+class TestMemoryBudget(unittest.TestCase):
+    """Test the memory budget"""
+
+    def setUp(self):
+        ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+        self.file = ROOT_DIR + '/test-data/10-K.xlsx'
+
+    def admitted(self, items, budget):
+        """
+        Replay the log of an admission: an item is admitted at its last estimate (a held back
+        item is estimated again), and leaves when its result is consumed
+        :param items: distinct sleep durations, which are also their estimates
+        :param budget: the budget of the admission
+        :return: a list with the items in flight after each admission
+        """
+        admission = _Admission(budget)
+        for item, result in _imap_bounded(time.sleep, items, 3, admission=admission):
+            admission.log.append(('done', item))
+        last = {item: i for i, (event, item) in enumerate(admission.log) if event == 'estimate'}
+        in_flight = set()
+        admitted = []
+        for i, (event, item) in enumerate(admission.log):
+            if event == 'done':
+                in_flight.remove(item)
+            elif last[item] == i:
+                in_flight.add(item)
+                admitted.append(sorted(in_flight))
+        self.assertFalse(in_flight)
+        return admitted
+
+    def test_admission(self):
+        """
+        Test that the items in flight stay under the budget, and that a larger item still runs alone
+        :return:
+        """
+        self.assertEqual(self.admitted([0.03, 0.031, 0.032], float('inf'))[-1], [0.03, 0.031, 0.032])
+        self.assertEqual(self.admitted([0.03, 0.031, 0.032], 0.05), [[0.03], [0.031], [0.032]])
+        self.assertEqual(self.admitted([0.06, 0.02], 0.05), [[0.06], [0.02]])
+        self.assertEqual(self.admitted([0.02, 0.021], 0.05), [[0.02], [0.02, 0.021]])
+
+    def test_estimate(self):
+        """
+        Test the estimates and their learning from the measured peaks
+        :return:
+        """
+        size = workbook_size(self.file)
+        self.assertGreater(size, os.path.getsize(self.file))
+        admission = MemoryAdmission(1 << 30, 'stream')
+        self.assertEqual(admission.estimate([self.file]), 4 * size)
+        # A larger peak is followed quickly, a smaller one slowly
+        admission.observe(self.file, 12 * size)
+        self.assertEqual(admission.ratio, 8)
+        admission.observe(self.file, 3 * size)
+        self.assertEqual(admission.ratio, 7.5)
+        self.assertEqual(admission.estimate([]), 0)
+
+    def test_peak(self):
+        """
+        Test the measured peak memory
+        :return:
+        """
+        with PeakMemory() as memory:
+            data = bytearray(256 << 20)
+            del data
+        self.assertGreater(memory.peak, 200 << 20)
+        # Nothing is known when the memory is already resident
+        with PeakMemory() as memory:
+            data = bytearray(1 << 20)
+            del data
+        self.assertIsNone(memory.peak)
+        # The peak of a process says nothing about the workbooks of its threads
+        with self.assertRaises(ValueError):
+            batch_process_wb('./data', memory_budget=1 << 30, executor='thread')
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestMemoryBudget)
+unittest.TextTestRunner(verbosity=2).run(suite)
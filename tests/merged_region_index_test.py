@@ -0,0 +1,70 @@
+#
+# merged_region_index_test.py
+# Test the index of the merged regions of a table
+#
+
+import sys
+import unittest
+from openpyxl.worksheet.cell_range import CellRange
+from table_model import MergedRegionIndex
+
+sys.path.append('../')
+
+
+class TestMergedRegionIndex(unittest.TestCase):
+    """Test the merged region lookups and the row removal fixups"""
+
+    def setUp(self):
+        # A table at B2 with a two row top left cell, two top row spans and a bottom region
+        ranges = [CellRange('B2:B3'), CellRange('E2:F2'), CellRange('C2:D2'), CellRange('B8:D9')]
+        self.index = MergedRegionIndex.from_ranges(ranges, origin=(2, 2))
+
+    def test_regions(self):
+        """
+        Test the regions in table coordinates
+        :return:
+        """
+        self.assertEqual(self.index.regions[0], {'FirstRow': 0, 'LastRow': 1, 'FirstColumn': 0, 'LastColumn': 0})
+        self.assertEqual(self.index.regions[3], {'FirstRow': 6, 'LastRow': 7, 'FirstColumn': 0, 'LastColumn': 2})
+        self.assertTrue(self.index.has_region(0, 1, 0, 0))
+        self.assertFalse(self.index.has_region(0, 0, 0, 0))
+
+    def test_top_row_span(self):
+        """
+        Test that the top row spans are reported in the order of the regions
+        :return:
+        """
+        self.assertEqual(self.index.top_row_spans, [(3, 4), (1, 2)])
+        self.assertEqual(self.index.top_row_span(1), 1)
+        self.assertEqual(self.index.top_row_span(2), 1)
+        self.assertEqual(self.index.top_row_span(4), 0)
+        self.assertIsNone(self.index.top_row_span(0))
+        self.assertIsNone(self.index.top_row_span(5))
+
+    def test_region_at(self):
+        """
+        Test the region that covers a cell
+        :return:
+        """
+        self.assertIs(self.index.region_at(1, 0), self.index.regions[0])
+        self.assertIs(self.index.region_at(7, 2), self.index.regions[3])
+        self.assertIsNone(self.index.region_at(1, 1))
+        self.assertIsNone(self.index.region_at(7, 3))
+        self.assertIsNone(self.index.region_at(20, 0))
+
+    def test_adjusted(self):
+        """
+        Test the regions after the removal of an empty row and of the footnote rows
+        :return:
+        """
+        adjusted = self.index.adjusted(4, 7)
+        self.assertEqual(adjusted.regions[3], {'FirstRow': 5, 'LastRow': 6, 'FirstColumn': 0, 'LastColumn': 2})
+        self.assertEqual(self.index.regions[3]['FirstRow'], 6)
+        # The bottom region is dropped with the footnote rows
+        self.assertEqual(len(self.index.adjusted(None, 6).regions), 3)
+        # A removed first row does not move the regions
+        self.assertEqual(self.index.adjusted(0, 8).regions, self.index.regions)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestMergedRegionIndex)
+unittest.TextTestRunner(verbosity=2).run(suite)
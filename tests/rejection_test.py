@@ -0,0 +1,51 @@
+#
+# rejection_test.py
+# Test that rejected worksheets are discarded before the extraction of their styles
+#
+
+import sys
+import unittest
+import extraction_engine
+from extraction_engine import process_ws
+from openpyxl import load_workbook
+import os
+
+sys.path.append('../')
+
+
+class TestEarlyRejection(unittest.TestCase):
+    """Test the rejection of worksheets before the style extraction"""
+
+    def setUp(self):
+        # Load a test 10-K report
+        ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+        workbook = load_workbook(ROOT_DIR + '/test-data/10-K.xlsx')
+        self.worksheets = workbook.worksheets
+        extraction_engine.rejection_stats.clear()
+
+    def test_rejected_sheet(self):
+        """
+        Test that no style is extracted for a narrative (long text) sheet
+        :return:
+        """
+        style_cache = {}
+        # Significant Accounting Policies
+        self.assertIsNone(process_ws(self.worksheets[8], style_cache))
+        self.assertEqual(len(style_cache), 0)
+        stats = extraction_engine.rejection_stats['long_text']
+        self.assertEqual(stats['sheets'], 1)
+        self.assertEqual(stats['cells'], 8)
+
+    def test_accepted_sheet(self):
+        """
+        Test that the styles of an accepted sheet are extracted
+        :return:
+        """
+        style_cache = {}
+        self.assertIsNotNone(process_ws(self.worksheets[0], style_cache))
+        self.assertGreater(len(style_cache), 0)
+        self.assertNotIn('long_text', extraction_engine.rejection_stats)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestEarlyRejection)
+unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,94 @@
+#
+# run_manifest_test.py
+# Test the resumable batch runs
+#
+
+import sys
+import unittest
+import os
+import shutil
+import tempfile
+from extraction_engine import batch_process_wb
+from run_manifest import RunManifest, file_fingerprint, DONE, FAILED
+
+sys.path.append('../')
+
+
+class TestRunManifest(unittest.TestCase):
+    """Test the manifest of the batch runs"""
+
+    def setUp(self):
+        ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+        self.data_dir = ROOT_DIR + '/test-data'
+        self.directory = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory.name)
+        os.mkdir('data')
+        os.mkdir('output')
+        shutil.copy(self.data_dir + '/8-K.xlsx', 'data/8-K.xlsx')
+        with open('data/broken.xlsx', 'w') as fp:
+            fp.write('not a workbook')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def run_batch(self, **kwargs):
+        batch_process_wb('data', workers=0, manifest='output/manifest.jsonl', **kwargs)
+        with open('output/manifest.jsonl') as fp:
+            return len(fp.readlines())
+
+    def test_resume(self):
+        """
+        Test that the completed workbooks are skipped and the failed ones are retried on request
+        :return:
+        """
+        self.assertEqual(self.run_batch(), 2)
+        with RunManifest('output/manifest.jsonl') as manifest:
+            done = manifest.entries['data/8-K.xlsx']
+            failed = manifest.entries['data/broken.xlsx']
+        self.assertEqual(done['status'], DONE)
+        self.assertGreater(done['tables'], 0)
+        self.assertIsNone(done['error'])
+        self.assertEqual(done['hash'], file_fingerprint('data/8-K.xlsx')['hash'])
+        self.assertEqual(done['output'], './output/8-K.json')
+        self.assertEqual(failed['status'], FAILED)
+        self.assertIsNone(failed['tables'])
+        self.assertTrue(failed['error'])
+        # Nothing is processed again, unless requested
+        self.assertEqual(self.run_batch(), 2)
+        self.assertEqual(self.run_batch(retry_failed=True), 3)
+        self.assertEqual(self.run_batch(reprocess=True), 5)
+
+    def test_changed_files(self):
+        """
+        Test that the changed workbooks and the missing outputs are processed again
+        :return:
+        """
+        self.run_batch()
+        # A new modification time with the same content
+        os.utime('data/8-K.xlsx', (0, 0))
+        self.assertEqual(self.run_batch(), 2)
+        # A new content
+        shutil.copy(self.data_dir + '/10-Q.xlsx', 'data/8-K.xlsx')
+        self.assertEqual(self.run_batch(), 3)
+        os.remove('output/8-K.json')
+        self.assertEqual(self.run_batch(), 4)
+
+    def test_interrupted_write(self):
+        """
+        Test that a partial last entry is dropped
+        :return:
+        """
+        self.run_batch()
+        with open('output/manifest.jsonl', 'a') as fp:
+            fp.write('{"file": "data/8-K.xl')
+        with RunManifest('output/manifest.jsonl') as manifest:
+            self.assertEqual(len(manifest.entries), 2)
+            manifest.record({'file': 'other.xlsx', 'status': DONE})
+        with RunManifest('output/manifest.jsonl') as manifest:
+            self.assertEqual(sorted(manifest.entries), ['data/8-K.xlsx', 'data/broken.xlsx', 'other.xlsx'])
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestRunManifest)
+unittest.TextTestRunner(verbosity=2).run(suite)
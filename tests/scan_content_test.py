@@ -0,0 +1,58 @@
+#
+# scan_content_test.py
+# Test the single pass scan of the worksheet values
+#
+
+import sys
+import unittest
+from extraction_engine import _scan_content
+
+sys.path.append('../')
+
+
+class TestScanContent(unittest.TestCase):
+    """Test the empty row, footnote and long text verdicts of the content scan"""
+
+    def setUp(self):
+        self.content = [
+            ['Balance Sheet - USD ($) $ in Millions', 'Dec. 31, 2020', 'Dec. 31, 2019'],
+            ['Cash', 1234.5, 1000],
+            [None, '\xa0', ' None '],
+            ['Total assets [1]', 5000, None],
+            ['[1] ' + ' '.join(['word'] * 25), None, None],
+        ]
+        self.scan = _scan_content(self.content, 3)
+
+    def test_texts(self):
+        """
+        Test the text and normalized text of the cells
+        :return:
+        """
+        texts, normalized = self.scan[0], self.scan[1]
+        self.assertEqual(texts[1], ['Cash', '1234.5', '1000'])
+        self.assertEqual(texts[2], ['None', '\xa0', ' None '])
+        self.assertEqual(normalized[2], ['', '', 'None'])
+        self.assertEqual(normalized[3], ['Total assets [1]', '5000', ''])
+
+    def test_verdicts(self):
+        """
+        Test the empty, footnote and long text rows
+        :return:
+        """
+        _, _, empty_rows, footnote_rows, long_text_rows, footnote_error = self.scan
+        self.assertEqual(empty_rows, [2])
+        self.assertEqual(footnote_rows, [3, 4])
+        self.assertEqual(long_text_rows, [4])
+        self.assertIsNone(footnote_error)
+
+    def test_footnote_error(self):
+        """
+        Test that a non text first cell is reported as in the regular expression search
+        :return:
+        """
+        scan = _scan_content([['Title', 'a'], [2020, 1]], 2)
+        self.assertIsInstance(scan[5], TypeError)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestScanContent)
+unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,56 @@
+#
+# schedule_test.py
+# Test the order and the batches of the workbooks of a batch run
+#
+
+import sys
+import unittest
+import os
+import tempfile
+from extraction_engine import _schedule
+
+sys.path.append('../')
+
+
+class TestSchedule(unittest.TestCase):
+    """Test the size-aware scheduling"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.files = {}
+        for name, size in [('small1', 10), ('large', 1000), ('small2', 20), ('medium', 300), ('small3', 30)]:
+            path = os.path.join(self.directory.name, name)
+            with open(path, 'wb') as fp:
+                fp.write(b'x' * size)
+            self.files[name] = path
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def names(self, batches):
+        return [[os.path.basename(file) for file in batch] for batch in batches]
+
+    def test_longest_first(self):
+        """
+        Test that the largest workbooks are scheduled first, one per batch
+        :return:
+        """
+        batches = _schedule(list(self.files.values()), batch_bytes=1)
+        self.assertEqual(self.names(batches), [['large'], ['medium'], ['small3'], ['small2'], ['small1']])
+
+    def test_batches(self):
+        """
+        Test that the small workbooks are grouped by total size and number
+        :return:
+        """
+        files = list(self.files.values())
+        self.assertEqual(self.names(_schedule(files, batch_bytes=50)),
+                         [['large'], ['medium'], ['small3', 'small2'], ['small1']])
+        self.assertEqual(self.names(_schedule(files, batch_bytes=10000, batch_files=2)),
+                         [['large', 'medium'], ['small3', 'small2'], ['small1']])
+        # A missing file is scheduled last
+        self.assertEqual(self.names(_schedule(files + ['missing'], batch_bytes=1))[-1], ['missing'])
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestSchedule)
+unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,92 @@
+#
+# sheet_filter_test.py
+# Test the selection of the worksheets from the workbook metadata
+#
+
+import sys
+import unittest
+import os
+import tempfile
+import extraction_engine
+from extraction_engine import process_wb, batch_process_wb, iter_tables
+from sheet_filter import SheetFilter, parse_positions
+from table_writer import read_tables
+from xlsx_stream import StreamWorkbook
+
+sys.path.append('../')
+
+
+class TestSheetFilter(unittest.TestCase):
+    """Test the sheet prefilter"""
+
+    def setUp(self):
+        ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+        self.file = ROOT_DIR + '/test-data/10-K.xlsx'
+        self.workbook = StreamWorkbook(self.file)
+
+    def tearDown(self):
+        self.workbook.close()
+
+    def accepted(self, sheet_filter):
+        return [ws.position for ws in self.workbook.worksheets if sheet_filter.reject_reason(ws, ws.position) is None]
+
+    def test_metadata(self):
+        """
+        Test the metadata of the sheets, that are read without parsing them
+        :return:
+        """
+        worksheet = self.workbook.worksheets[1]
+        self.assertEqual(worksheet.title, 'CONSOLIDATED INCOME STATEMENT')
+        self.assertEqual(worksheet.declared_dimensions, 'A1:D37')
+        self.assertGreater(worksheet.uncompressed_size, worksheet.compressed_size)
+        self.assertIsNone(worksheet._cells_cache)
+
+    def test_criteria(self):
+        """
+        Test the title, position, size and dimension criteria
+        :return:
+        """
+        self.assertEqual(self.accepted(SheetFilter(include='income statement')), [1])
+        self.assertEqual(self.accepted(SheetFilter(positions=parse_positions('0-2, 5'))), [0, 1, 2, 5])
+        self.assertNotIn(0, self.accepted(SheetFilter(exclude='^Document')))
+        self.assertNotIn(0, self.accepted(SheetFilter(max_cells=4 * 147)))
+        self.assertIn(1, self.accepted(SheetFilter(max_cells=4 * 37)))
+        small = self.accepted(SheetFilter(max_size=3000))
+        self.assertIn(4, small)
+        self.assertNotIn(0, small)
+        self.assertEqual(self.accepted(SheetFilter(min_size=3000, max_size=3000)), [])
+
+    def test_process_wb(self):
+        """
+        Test that the rejected sheets are neither parsed nor extracted
+        :return:
+        """
+        extraction_engine.rejection_stats.clear()
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                os.mkdir('output')
+                process_wb(self.file, engine='stream', sheet_filter=SheetFilter(include='balance sheet$'))
+                tables = read_tables('output/10-K.json')
+            finally:
+                os.chdir(cwd)
+        self.assertEqual([table['SheetName'] for table in tables], ['CONSOLIDATED BALANCE SHEET'])
+        self.assertEqual(extraction_engine.rejection_stats['prefilter_title']['sheets'],
+                         len(self.workbook.worksheets) - 1)
+
+    def test_requires_stream_engine(self):
+        """
+        Test that the size criteria are refused with the openpyxl engine
+        :return:
+        """
+        with self.assertRaises(ValueError):
+            batch_process_wb('./data', engine='openpyxl', sheet_filter=SheetFilter(max_size=1000))
+        with self.assertRaises(ValueError):
+            process_wb(self.file, engine='openpyxl', sheet_filter=SheetFilter(max_cells=1000))
+        with self.assertRaises(ValueError):
+            list(iter_tables([self.file], engine='openpyxl', sheet_filter=SheetFilter(min_size=1000)))
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestSheetFilter)
+unittest.TextTestRunner(verbosity=2).run(suite)
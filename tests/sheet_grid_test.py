@@ -0,0 +1,91 @@
+#
+# sheet_grid_test.py
+# Test the saved grids of the worksheets and the rebuilding of the tables from them
+#
+
+import sys
+import unittest
+import json
+import os
+import tempfile
+from datetime import datetime
+from extraction_engine import read_grid, process_grid, process_wb, rederive_wb
+from openpyxl import load_workbook, Workbook
+from sheet_grid import SheetGrid, OpaqueValue, read_grids
+
+sys.path.append('../')
+
+
+def _saved(grid):
+    # The grid as it is read back from a grid file
+    return SheetGrid.from_json(json.loads(json.dumps(grid.materialize().to_json())))
+
+
+class TestSheetGrid(unittest.TestCase):
+    """Test the saved grids"""
+
+    def setUp(self):
+        ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+        self.file = ROOT_DIR + '/test-data/10-Q.xlsx'
+
+    def test_tables(self):
+        """
+        Test that the tables rebuilt from the saved grids are the same
+        :return:
+        """
+        workbook = load_workbook(self.file)
+        style_cache = {}
+        for worksheet in workbook.worksheets:
+            grid = read_grid(worksheet, style_cache)
+            saved = _saved(grid)
+            try:
+                expected = json.dumps(process_grid(grid))
+            except Exception as e:
+                with self.assertRaises(type(e)):
+                    process_grid(saved)
+                continue
+            self.assertEqual(json.dumps(process_grid(saved)), expected)
+
+    def test_values(self):
+        """
+        Test that the values that are not stored as they are keep their text and type
+        :return:
+        """
+        worksheet = Workbook().active
+        worksheet['A1'] = datetime(2020, 12, 31)
+        worksheet['B1'] = 'Dec. 31, 2020'
+        worksheet['A2'] = 'Cash'
+        worksheet['B2'] = 1234.5
+        saved = _saved(read_grid(worksheet))
+        self.assertIsInstance(saved.values[0][0], OpaqueValue)
+        self.assertEqual(str(saved.values[0][0]), '2020-12-31 00:00:00')
+        self.assertEqual(saved.values[1], ['Cash', 1234.5])
+        # A date in the first column fails the footnote check of the original worksheet too
+        with self.assertRaises(TypeError):
+            process_grid(saved)
+
+    def test_rederive(self):
+        """
+        Test that the rederived output file is the same as the original one
+        :return:
+        """
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                # The grids directory is created by process_wb
+                os.mkdir('output')
+                process_wb(self.file, save_grids=True)
+                with open('output/10-Q.json') as fp:
+                    expected = fp.read()
+                os.remove('output/10-Q.json')
+                self.assertEqual(len(list(read_grids('grids/10-Q.jsonl.gz'))), 58)
+                rederive_wb('grids/10-Q.jsonl.gz')
+                with open('output/10-Q.json') as fp:
+                    self.assertEqual(fp.read(), expected)
+            finally:
+                os.chdir(cwd)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestSheetGrid)
+unittest.TextTestRunner(verbosity=2).run(suite)
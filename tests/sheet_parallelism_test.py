@@ -0,0 +1,116 @@
+#
+# sheet_parallelism_test.py
+# Test the sheet-level units of work of the batch processing
+#
+
+import sys
+import unittest
+import json
+import logging
+import random
+import shutil
+import tempfile
+from extraction_engine import process_ws, process_sheet, _count_worksheets, _open_workbook, \
+    batch_process_wb, rootLogger, skippedLogger
+import os
+
+sys.path.append('../')
+
+
+class _ParentFileHandler(logging.FileHandler):
+    # A FileHandler that marks the records that another process than its own writes
+
+    def __init__(self, path):
+        super().__init__(path, 'w')
+        self.pid = os.getpid()
+
+    def emit(self, record):
+        if os.getpid() != self.pid:
+            record.msg = 'Written by a worker: ' + str(record.msg)
+        super().emit(record)
+
+
+class TestSheetParallelism(unittest.TestCase):
+    """Test the processing of single worksheets"""
+
+    def setUp(self):
+        ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+        self.file = ROOT_DIR + '/test-data/10-Q.xlsx'
+
+    def test_count_worksheets(self):
+        """
+        Test the number of worksheets of a workbook
+        :return:
+        """
+        self.assertEqual(_count_worksheets(self.file), (self.file, 58))
+        self.assertEqual(_count_worksheets(self.file + '.missing'), (self.file + '.missing', None))
+
+    def test_process_sheet(self):
+        """
+        Test that the worksheets processed one by one, in any order, give the same tables
+        :return:
+        """
+        workbook = _open_workbook(self.file, 'openpyxl')
+        expected = []
+        for worksheet in workbook.worksheets:
+            try:
+                expected.append(process_ws(worksheet))
+            except:
+                expected.append(None)
+        indices = list(range(len(expected)))
+        random.Random(0).shuffle(indices)
+        for index in indices:
+            file, sheet_index, table = process_sheet((self.file, index))
+            self.assertEqual(file, self.file)
+            self.assertEqual(sheet_index, index)
+            if table is None:
+                self.assertIsNone(expected[index])
+            else:
+                self.assertEqual(json.dumps(table.to_dict()), json.dumps(expected[index]))
+
+    def test_requires_stream_engine(self):
+        """
+        Test that sheet-level parallelism is refused with the openpyxl engine
+        :return:
+        """
+        with self.assertRaises(ValueError):
+            batch_process_wb('./data', engine='openpyxl', parallelism='sheet')
+
+    def test_logs(self):
+        """
+        Test that the workers of the sheets log through the listener, rather than writing to the log files
+        :return:
+        """
+        directory = tempfile.TemporaryDirectory()
+        cwd = os.getcwd()
+        os.chdir(directory.name)
+        handlers = [_ParentFileHandler('test.log') for _ in (rootLogger, skippedLogger)]
+        try:
+            os.mkdir('data')
+            os.mkdir('output')
+            shutil.copy(self.file, 'data/10-Q.xlsx')
+            for logger, handler in zip((rootLogger, skippedLogger), handlers):
+                handler.setFormatter(logging.Formatter('%(process)d %(name)s %(message)s'))
+                logger.addHandler(handler)
+            batch_process_wb('./data', engine='stream', parallelism='sheet', workers=2, manifest=None)
+            for logger in (rootLogger, skippedLogger):
+                for handler in [handler for handler in logger.handlers
+                                if isinstance(handler, logging.FileHandler) and
+                                handler.baseFilename == os.path.abspath('test.log')]:
+                    logger.removeHandler(handler)
+                    handler.close()
+            with open('test.log') as fp:
+                lines = fp.read().splitlines()
+        finally:
+            for logger, handler in zip((rootLogger, skippedLogger), handlers):
+                logger.removeHandler(handler)
+                handler.close()
+            os.chdir(cwd)
+            directory.cleanup()
+        self.assertIn(f'{os.getpid()} Main Processed file: ./data/10-Q.xlsx: Found 29 tables.', lines)
+        self.assertTrue([line for line in lines if line.split()[0] != str(os.getpid())])
+        self.assertFalse([line for line in lines if 'Written by a worker' in line])
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestSheetParallelism)
+unittest.TextTestRunner(verbosity=2).run(suite)
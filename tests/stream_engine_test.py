@@ -0,0 +1,80 @@
+#
+# stream_engine_test.py
+# Test that the streaming reader produces the same tables as openpyxl
+#
+
+import sys
+import unittest
+import json
+import os
+from extraction_engine import process_ws, _open_workbook
+
+sys.path.append('../')
+
+
+class TestStreamEngine(unittest.TestCase):
+    """Compare the tables extracted with the stream and the openpyxl engines"""
+
+    def setUp(self):
+        self.ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+    def _extract(self, filename, engine):
+        """
+        Extract the tables of all the sheets as JSON strings
+        :param filename: the test workbook
+        :param engine: the engine to use
+        :return: a list with a JSON string (or the error) per sheet
+        """
+        workbook = _open_workbook(self.ROOT_DIR + '/test-data/' + filename, engine)
+        tables = []
+        for worksheet in workbook.worksheets:
+            try:
+                tables.append(json.dumps(process_ws(worksheet)))
+            except Exception as e:
+                tables.append(type(e).__name__)
+        return tables
+
+    def _assert_identical(self, filename):
+        tables = self._extract(filename, 'openpyxl')
+        stream_tables = self._extract(filename, 'stream')
+        self.assertEqual(len(tables), len(stream_tables))
+        for table, stream_table in zip(tables, stream_tables):
+            self.assertEqual(table, stream_table)
+
+    def test_identical_10K(self):
+        """
+        Test the tables of the 10-K reports
+        :return:
+        """
+        self._assert_identical('10-K.xlsx')
+        self._assert_identical('10-K_sample2.xlsx')
+
+    def test_identical_10Q(self):
+        """
+        Test the tables of the 10-Q reports
+        :return:
+        """
+        self._assert_identical('10-Q.xlsx')
+        self._assert_identical('10-Q_sample2.xlsx')
+
+    def test_identical_8K(self):
+        """
+        Test the tables of the 8-K reports
+        :return:
+        """
+        self._assert_identical('8-K.xlsx')
+        self._assert_identical('8-K_sample2.xlsx')
+
+    def test_worksheet_titles(self):
+        """
+        Test that both engines list the same worksheets
+        :return:
+        """
+        workbook = _open_workbook(self.ROOT_DIR + '/test-data/10-Q.xlsx', 'openpyxl')
+        stream_workbook = _open_workbook(self.ROOT_DIR + '/test-data/10-Q.xlsx', 'stream')
+        self.assertEqual([ws.title for ws in workbook.worksheets],
+                         [ws.title for ws in stream_workbook.worksheets])
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestStreamEngine)
+unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,78 @@
+#
+# style_cache_test.py
+# Test the style attributes that are cached per style id
+#
+
+import sys
+import unittest
+from io import BytesIO
+from extraction_engine import _get_cell_style_attributes, _get_cell_font_attributes, \
+    _get_cell_data_attributes, _get_cell_border_attributes, _get_cell_alignment_attributes
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import PatternFill
+import os
+
+sys.path.append('../')
+
+
+class TestStyleCache(unittest.TestCase):
+    """Test the style attributes cache"""
+
+    def setUp(self):
+        # Load a test 10-K report
+        ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+        workbook = load_workbook(ROOT_DIR + '/test-data/10-K.xlsx')
+        worksheets = workbook.worksheets
+        self.worksheet = workbook[worksheets[0].title]
+
+    def test_cached_attributes(self):
+        """
+        Test that the cached attributes are the same as the ones computed per cell
+        :return:
+        """
+        style_cache = {}
+        for row in self.worksheet[self.worksheet.dimensions]:
+            for cell in row:
+                style = _get_cell_style_attributes(cell, style_cache)
+                self.assertEqual(style['BC'], 0)
+                for attrs in (_get_cell_font_attributes(cell), _get_cell_data_attributes(cell),
+                              _get_cell_border_attributes(cell), _get_cell_alignment_attributes(cell)):
+                    for key, value in attrs.items():
+                        self.assertEqual(style[key], value)
+        # A handful of styles for the whole sheet
+        self.assertLess(len(style_cache), 20)
+
+    def test_shared_attributes(self):
+        """
+        Test that cells with the same style share the same attributes dictionary
+        :return:
+        """
+        style_cache = {}
+        first_row = self.worksheet[self.worksheet.dimensions][2]
+        styles = [_get_cell_style_attributes(cell, style_cache) for cell in first_row]
+        # The value cells of the third row share their style
+        self.assertIs(styles[1], styles[2])
+
+    def test_background_color(self):
+        """
+        Test the background color flag
+        :return:
+        """
+        workbook = Workbook()
+        worksheet = workbook.active
+        worksheet['A1'] = 'red'
+        worksheet['A1'].fill = PatternFill(fill_type='solid', fgColor='FFFF0000')
+        worksheet['A2'] = 'white'
+        worksheet['A2'].fill = PatternFill(fill_type='solid', fgColor='FFFFFFFF')
+        worksheet['A3'] = 'none'
+        buffer = BytesIO()
+        workbook.save(buffer)
+        worksheet = load_workbook(buffer).active
+        style_cache = {}
+        self.assertEqual(_get_cell_style_attributes(worksheet['A1'], style_cache)['BC'], 1)
+        self.assertEqual(_get_cell_style_attributes(worksheet['A2'], style_cache)['BC'], 0)
+        self.assertEqual(_get_cell_style_attributes(worksheet['A3'], style_cache)['BC'], 0)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestStyleCache)
+unittest.TextTestRunner(verbosity=2).run(suite)
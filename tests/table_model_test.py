@@ -0,0 +1,101 @@
+#
+# table_model_test.py
+# Test the columnar table representation
+#
+
+import sys
+import unittest
+import pickle
+from extraction_engine import process_ws
+from table_model import ColumnarTable
+from openpyxl import load_workbook
+import os
+
+sys.path.append('../')
+
+
+class TestColumnarTable(unittest.TestCase):
+    """Test the columnar table representation"""
+
+    def setUp(self):
+        # Load a test 10-K report and extract data
+        ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+        workbook = load_workbook(ROOT_DIR + '/test-data/10-K.xlsx')
+        worksheets = workbook.worksheets
+        worksheet = workbook[worksheets[0].title]
+        self.table = process_ws(worksheet, columnar=True)
+        self.table_dict = process_ws(worksheet)
+
+    def test_table_shape(self):
+        """
+        Test the table dimensions and the shared texts and styles
+        :return:
+        """
+        self.assertEqual(self.table.num_rows, 148)
+        self.assertEqual(self.table.num_columns, 4)
+        self.assertEqual(len(self.table.text_ids), 148 * 4)
+        self.assertLess(len(self.table.strings), 148 * 4)
+        self.assertLess(len(self.table.palette), 20)
+
+    def test_lazy_cells(self):
+        """
+        Test that the cells are only built when requested
+        :return:
+        """
+        self.assertIsNone(self.table._cells)
+        self.assertEqual(self.table['Title'], 'Document and Entity Information - USD ($) $ in Billions')
+        self.assertEqual(self.table['TopHeaderRowsNumber'], 2)
+        self.assertIsNone(self.table._cells)
+        self.assertEqual(len(self.table['Cells']), 148)
+        self.assertIsNotNone(self.table._cells)
+
+    def test_cell_access(self):
+        """
+        Test the cell accessors against the legacy cells
+        :return:
+        """
+        for row in self.table_dict['Cells']:
+            for cell in row:
+                r, c = cell['coordinates']
+                self.assertEqual(self.table.value(r, c), cell['value'])
+                self.assertEqual(self.table.normalized_value(r, c), cell['V'])
+                self.assertEqual(self.table.style(r, c)['FB'], cell['FB'])
+                self.assertEqual(self.table.is_header(r), cell['is_header'])
+
+    def test_legacy_dict(self):
+        """
+        Test the conversion to the legacy dict
+        :return:
+        """
+        self.assertEqual(self.table.to_dict(), self.table_dict)
+        self.assertEqual(list(self.table.to_dict().keys()), list(self.table_dict.keys()))
+
+    def test_many_styles(self):
+        """
+        Test that the style ids are widened when the palette outgrows unsigned shorts
+        :return:
+        """
+        table = ColumnarTable({}, 1000)
+        styles = [{'id': i} for i in range(70000)]
+        for i in range(0, len(styles), 1000):
+            table.add_row([''] * 1000, styles[i:i + 1000], False, False)
+        table.add_row([''] * 1000, styles[-1000:], False, False)
+        self.assertEqual(table.style_ids.typecode, 'I')
+        self.assertEqual(table.style_ids[69999], 69999)
+        self.assertEqual(table.style_ids[70999], 69999)
+        self.assertEqual(table.style_ids[100], 100)
+        compact = ColumnarTable.from_compact(table.to_compact({}), {})
+        self.assertEqual(compact.style_ids, table.style_ids)
+
+    def test_pickle(self):
+        """
+        Test that the table survives pickling and is smaller than the legacy dict
+        :return:
+        """
+        data = pickle.dumps(self.table)
+        self.assertLess(len(data), len(pickle.dumps(self.table_dict)))
+        self.assertEqual(pickle.loads(data).to_dict(), self.table_dict)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestColumnarTable)
+unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,159 @@
+#
+# table_shards_test.py
+# Test the sharded output of the tables
+#
+
+import sys
+import unittest
+import os
+import json
+import tempfile
+from extraction_engine import batch_process_wb, process_wb, iter_tables
+from table_shards import ShardWriter, ShardIndex
+from table_writer import read_tables
+
+sys.path.append('../')
+
+
+class TestTableShards(unittest.TestCase):
+    """Test the shards"""
+
+    def setUp(self):
+        ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+        self.data_dir = ROOT_DIR + '/test-data'
+        self.files = [self.data_dir + '/' + name for name in ('8-K.xlsx', '10-Q.xlsx', '8-K_sample2.xlsx')]
+        self.directory = tempfile.TemporaryDirectory()
+        self.shards = os.path.join(self.directory.name, 'shards')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def expected(self):
+        tables = {}
+        for source, table in iter_tables(self.files):
+            tables.setdefault(source, []).append(table.to_dict())
+        return json.loads(json.dumps(tables))
+
+    def test_schemas(self):
+        """
+        Test that the tables are read back whole and one by one, in both schemas
+        :return:
+        """
+        expected = self.expected()
+        for schema in (1, 2):
+            shards = os.path.join(self.shards, str(schema))
+            with ShardWriter(shards, 'writer', schema=schema) as writer:
+                for source, table in iter_tables(self.files):
+                    # Each table is a workbook of its own
+                    with writer.workbook(source + '#' + table['SheetName']) as tables:
+                        tables.write(table)
+            index = ShardIndex(shards)
+            tables = {}
+            for file, table in index.iter_tables():
+                tables.setdefault(file.split('#')[0], []).append(table)
+            self.assertEqual({file: sorted(map(json.dumps, tables[file])) for file in tables},
+                             {file: sorted(map(json.dumps, expected[file])) for file in expected})
+            table = expected[self.files[1]][0]
+            self.assertEqual(json.dumps(index.read_table(self.files[1] + '#' + table['SheetName'],
+                                                         table['SheetName'])), json.dumps(table))
+            # A shard is a .jsonl.gz output file as well
+            shard, = [name for name in os.listdir(shards) if name.endswith('.gz')]
+            self.assertEqual(len(read_tables(os.path.join(shards, shard))), len(index))
+
+    def test_abort(self):
+        """
+        Test that an aborted workbook is neither indexed nor left in the shard, and that the shards roll over
+        :return:
+        """
+        table = self.expected()[self.files[0]][0]
+        with ShardWriter(self.shards, 'writer', max_bytes=1) as writer:
+            with self.assertRaises(RuntimeError):
+                with writer.workbook('failed') as tables:
+                    tables.write(table)
+                    raise RuntimeError()
+            self.assertEqual(os.path.getsize(os.path.join(self.shards, writer.shard)), 0)
+            with writer.workbook('first') as tables:
+                tables.write(table)
+            with writer.workbook('second') as tables:
+                tables.write(table)
+            with writer.workbook('empty'):
+                pass
+        index = ShardIndex(self.shards)
+        self.assertEqual(sorted(index.workbooks), ['empty', 'first', 'second'])
+        self.assertEqual(index.locate('empty'), [])
+        first, = index.locate('first')
+        second, = index.locate('second')
+        self.assertEqual((first['shard'], first['offset']), ('writer-00000.jsonl.gz', 0))
+        self.assertEqual((second['shard'], second['offset']), ('writer-00001.jsonl.gz', 0))
+        # A new writer with the same prefix continues the last shard, and its entries replace the earlier ones
+        with ShardWriter(self.shards, 'writer') as writer:
+            with writer.workbook('first') as tables:
+                tables.write(table)
+        first, = ShardIndex(self.shards).locate('first')
+        self.assertEqual((first['shard'], first['offset']), ('writer-00001.jsonl.gz', second['length']))
+
+    def test_killed(self):
+        """
+        Test that the next writer of a slot drops the tables that a killed writer has not indexed
+        :return:
+        """
+        source, table = next(iter_tables(self.files[:1]))
+        for schema in (1, 2):
+            shards = os.path.join(self.shards, str(schema))
+            with ShardWriter(shards, schema=schema) as writer:
+                prefix = writer.prefix
+                # A running writer holds its slot
+                self.assertNotEqual(ShardWriter(shards).prefix, prefix)
+                with writer.workbook('done') as tables:
+                    tables.write(table)
+                tables = writer.workbook('killed')
+                tables.write(table)
+                tables.write(table)
+                # Killed in the middle of a gzip member
+                writer._fp.truncate(writer._fp.tell() - 10)
+            with ShardWriter(shards, schema=schema) as writer:
+                self.assertEqual(writer.prefix, prefix)
+                with writer.workbook('next') as tables:
+                    tables.write(table)
+            shard, = [name for name in os.listdir(shards) if name.endswith('.gz')]
+            self.assertEqual(len(read_tables(os.path.join(shards, shard))), 2)
+            index = ShardIndex(shards)
+            self.assertEqual(sorted(index.workbooks), ['done', 'next'])
+            self.assertEqual(json.dumps(index.read_table('next', table['SheetName'])),
+                             json.dumps(self.expected()[source][0]))
+
+    def test_batch(self):
+        """
+        Test that the workers of a batch write their own shards, with the tables of all the workbooks
+        :return:
+        """
+        cwd = os.getcwd()
+        os.chdir(self.directory.name)
+        try:
+            os.mkdir('output')
+            for executor in ('process', 'thread'):
+                shards = 'shards-' + executor
+                batch_process_wb(self.data_dir, workers=2, executor=executor, shards=shards, manifest=None)
+                index = ShardIndex(shards)
+                self.assertEqual(len(index), len(os.listdir(self.data_dir)))
+                # Recycled workers and later runs continue the shards of the slots of the workers
+                batch_process_wb(self.data_dir, workers=2, executor=executor, shards=shards, manifest=None,
+                                 max_tasks_per_worker=1 if executor == 'process' else None)
+                batch_process_wb(self.data_dir, workers=2, executor=executor, shards=shards, manifest=None)
+                self.assertLessEqual(len([name for name in os.listdir(shards) if name.endswith('.gz')]), 2)
+                index = ShardIndex(shards)
+                self.assertEqual(len(index), len(os.listdir(self.data_dir)))
+                for file in self.files:
+                    self.assertEqual([table['sheet'] for table in index.locate(file)],
+                                     [table['SheetName'] for table in self.expected()[file]])
+            self.assertEqual(os.listdir('output'), [])
+            self.assertEqual(process_wb(self.files[0], shards='shards-process'),
+                             (len(index.locate(self.files[0])), None))
+            with self.assertRaises(ValueError):
+                batch_process_wb(self.data_dir, engine='stream', parallelism='sheet', shards='shards')
+        finally:
+            os.chdir(cwd)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestTableShards)
+unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,134 @@
+#
+# table_writer_test.py
+# Test the streaming output of the extracted tables
+#
+
+import sys
+import unittest
+import json
+import os
+import tempfile
+from extraction_engine import process_ws, process_wb
+from openpyxl import load_workbook
+from table_writer import TableWriter, output_path, read_tables, expand
+
+sys.path.append('../')
+
+
+class TestTableWriter(unittest.TestCase):
+    """Test the output layouts of the table writer"""
+
+    def setUp(self):
+        ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+        self.file = ROOT_DIR + '/test-data/8-K.xlsx'
+        workbook = load_workbook(self.file)
+        self.tables = [table for table in (process_ws(ws) for ws in workbook.worksheets) if table is not None]
+        workbook = load_workbook(ROOT_DIR + '/test-data/10-K.xlsx')
+        self.columnar_tables = []
+        for worksheet in workbook.worksheets[:20]:
+            try:
+                table = process_ws(worksheet, columnar=True)
+            except IndexError:
+                continue
+            if table is not None:
+                self.columnar_tables.append(table)
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_json_layout(self):
+        """
+        Test that the JSON layout is the same as the serialization of the list of the tables
+        :return:
+        """
+        path = os.path.join(self.directory.name, 'tables.json')
+        with TableWriter(path) as writer:
+            for table in self.tables:
+                writer.write(table)
+        with open(path) as fp:
+            self.assertEqual(fp.read(), json.dumps(self.tables))
+        with TableWriter(path) as writer:
+            pass
+        with open(path) as fp:
+            self.assertEqual(fp.read(), json.dumps([]))
+
+    def test_compressed_jsonl(self):
+        """
+        Test the gzip compressed JSONL layout
+        :return:
+        """
+        path = output_path(self.file, self.directory.name, 'jsonl', compress=True)
+        self.assertTrue(path.endswith('8-K.jsonl.gz'))
+        with TableWriter(path, 'jsonl', compress=True) as writer:
+            for table in self.tables:
+                writer.write(table)
+        self.assertEqual(read_tables(path), json.loads(json.dumps(self.tables)))
+
+    def test_abort(self):
+        """
+        Test that no output is left behind when the writer fails
+        :return:
+        """
+        path = os.path.join(self.directory.name, 'tables.json')
+        with self.assertRaises(RuntimeError):
+            with TableWriter(path) as writer:
+                writer.write(self.tables[0])
+                raise RuntimeError()
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_compact_schema(self):
+        """
+        Test that the v2 schema is expanded back to the same v1 tables, in both layouts
+        :return:
+        """
+        expected = json.dumps([table.to_dict() for table in self.columnar_tables])
+        for output_format in ('json', 'jsonl'):
+            path = os.path.join(self.directory.name, 'tables.' + output_format)
+            with TableWriter(path, output_format, schema=2) as writer:
+                for table in self.columnar_tables:
+                    writer.write(table)
+            self.assertEqual(json.dumps(read_tables(path)), expected)
+            expanded_path = os.path.join(self.directory.name, 'expanded.' + output_format + '.gz')
+            expand(path, expanded_path)
+            self.assertEqual(json.dumps(read_tables(expanded_path)), expected)
+            v1_path = os.path.join(self.directory.name, 'v1.' + output_format)
+            with TableWriter(v1_path, output_format) as writer:
+                for table in self.columnar_tables:
+                    writer.write(table)
+            self.assertLess(os.path.getsize(path), os.path.getsize(v1_path) / 3)
+
+    def test_compact_table(self):
+        """
+        Test the constants and the text fields of a v2 table
+        :return:
+        """
+        table = self.columnar_tables[0]
+        compact = json.loads(json.dumps(table.to_compact({'StorageAccount': 'EDGARExcelCrawled',
+                                                          'Language': 'greek'})))
+        self.assertNotIn('StorageAccount', compact['Metadata'])
+        self.assertEqual(compact['Metadata']['Language'], 'english')
+        self.assertEqual(len(compact['Text']), table.num_rows * table.num_columns)
+        self.assertEqual(len(compact['Strings']), len(set(compact['Strings'])))
+        # A normalized text that cannot be derived from the text is kept
+        table.normalized[0] = 'X'
+        compact = json.loads(json.dumps(table.to_compact()))
+        self.assertEqual(compact['Normalized'], {'0': 'X'})
+
+    def test_process_wb(self):
+        """
+        Test the output file of a workbook
+        :return:
+        """
+        cwd = os.getcwd()
+        os.chdir(self.directory.name)
+        try:
+            os.mkdir('output')
+            process_wb(self.file, output_format='jsonl', compress=True)
+            self.assertEqual(read_tables('output/8-K.jsonl.gz'), json.loads(json.dumps(self.tables)))
+        finally:
+            os.chdir(cwd)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestTableWriter)
+unittest.TextTestRunner(verbosity=2).run(suite)
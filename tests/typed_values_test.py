@@ -0,0 +1,77 @@
+#
+# typed_values_test.py
+# Test the typed numeric values of the cells and the scale factors of the tables
+#
+
+import sys
+import unittest
+import json
+from extraction_engine import process_ws, _parse_number, _parse_scale
+from openpyxl import load_workbook
+from table_model import ColumnarTable
+import os
+
+sys.path.append('../')
+
+
+class TestTypedValues(unittest.TestCase):
+    """Test the typed values of an income statement"""
+
+    def setUp(self):
+        # Load a test 10-K report and extract the income statement
+        ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+        workbook = load_workbook(ROOT_DIR + '/test-data/10-K.xlsx')
+        self.worksheet = workbook.worksheets[1]
+        self.table = process_ws(self.worksheet, columnar=True, typed_values=True)
+
+    def test_parse_number(self):
+        """
+        Test the numeric value of the cell texts
+        :return:
+        """
+        self.assertEqual(_parse_number('73620'), 73620)
+        self.assertEqual(_parse_number('1,234.5'), 1234.5)
+        self.assertEqual(_parse_number('(1,234)'), -1234)
+        self.assertEqual(_parse_number('$ 100'), 100)
+        self.assertEqual(_parse_number('1e-05'), 1e-05)
+        self.assertIsNone(_parse_number('None'))
+        self.assertIsNone(_parse_number('Dec. 31, 2020'))
+        self.assertIsNone(_parse_number('12,34'))
+        self.assertIsNone(_parse_number('(5'))
+
+    def test_parse_scale(self):
+        """
+        Test the scale factors of the titles
+        :return:
+        """
+        self.assertEqual(_parse_scale('INCOME STATEMENTS - USD ($) shares in Thousands, $ in Millions'),
+                         {'shares': 1000, '$': 1000000})
+        self.assertEqual(_parse_scale('Cash Flows'), {})
+
+    def test_table(self):
+        """
+        Test the typed values and the scale of the table
+        :return:
+        """
+        self.assertEqual(self.table['Scale'], {'$': 1000000})
+        cells = self.table['Cells']
+        self.assertEqual(cells[2][1]['T'], '73620')
+        self.assertEqual(cells[2][1]['N'], 73620)
+        self.assertIsNone(cells[2][0]['N'])
+        # The default output has no typed values
+        table = process_ws(self.worksheet)
+        self.assertNotIn('N', table['Cells'][2][1])
+        self.assertNotIn('Scale', table)
+
+    def test_compact(self):
+        """
+        Test that the typed values are kept in the compact schema
+        :return:
+        """
+        compact = json.loads(json.dumps(self.table.to_compact()))
+        self.assertEqual(json.dumps(ColumnarTable.from_compact(compact).to_dict()),
+                         json.dumps(self.table.to_dict()))
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestTypedValues)
+unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,101 @@
+#
+# used_range_test.py
+# Test the trimming of the worksheets to the range of the cells that hold values
+#
+
+import sys
+import unittest
+from io import BytesIO
+from extraction_engine import process_ws, _open_workbook, ENGINES
+from openpyxl import Workbook
+from openpyxl.styles import Font
+
+sys.path.append('../')
+
+
+class TestUsedRange(unittest.TestCase):
+    """Test the used range of the worksheets"""
+
+    def setUp(self):
+        # A table at B3:C6 and stray formatting far away from it
+        workbook = Workbook()
+        worksheet = workbook.active
+        worksheet['B3'] = 'Balance Sheet - USD ($)'
+        worksheet.merge_cells('B3:B4')
+        worksheet['C3'] = 'Dec. 31, 2020'
+        worksheet['C4'] = '12 Months Ended'
+        worksheet['B5'] = 'Cash'
+        worksheet['C5'] = 100
+        worksheet['B6'] = 'Total'
+        worksheet['C6'] = 200
+        worksheet['Z500'].font = Font(bold=True)
+        worksheet['A1000'].font = Font(bold=True)
+        workbook.create_sheet('Empty')['D4'].font = Font(bold=True)
+        self.buffer = BytesIO()
+        workbook.save(self.buffer)
+
+    def test_trimmed_range(self):
+        """
+        Test the range and the cells of the trimmed table
+        :return:
+        """
+        for engine in ENGINES:
+            worksheet = _open_workbook(BytesIO(self.buffer.getvalue()), engine).worksheets[0]
+            table = process_ws(worksheet)
+            self.assertEqual(table['RangeAddress'], 'B3:C6')
+            self.assertEqual(len(table['Cells']), 4)
+            for row in table['Cells']:
+                self.assertEqual(len(row), 2)
+            self.assertEqual(table['Cells'][2][0]['V'], 'Cash')
+            self.assertEqual(table['MergedRegions'],
+                             [{'FirstRow': 0, 'LastRow': 1, 'FirstColumn': 0, 'LastColumn': 0}])
+            self.assertEqual(table['TopHeaderRowsNumber'], 2)
+
+    def test_outside_merges(self):
+        """
+        Test that the merged ranges outside the trimmed table are dropped and those across it are clipped
+        :return:
+        """
+        workbook = Workbook()
+        worksheet = workbook.active
+        worksheet['C5'] = 'Balance Sheet - USD ($)'
+        worksheet['D5'] = 'Dec. 31, 2020'
+        worksheet['D6'] = 100
+        worksheet['C7'] = 'Total'
+        worksheet['D7'] = 200
+        worksheet.merge_cells('A1:B2')
+        worksheet.merge_cells('B6:C6')
+        worksheet.merge_cells('D7:E8')
+        worksheet.merge_cells('F10:G11')
+        buffer = BytesIO()
+        workbook.save(buffer)
+        for engine in ENGINES:
+            table = process_ws(_open_workbook(BytesIO(buffer.getvalue()), engine).worksheets[0])
+            self.assertEqual(table['RangeAddress'], 'C5:D7')
+            self.assertEqual(table['MergedRegions'],
+                             [{'FirstRow': 1, 'LastRow': 1, 'FirstColumn': 0, 'LastColumn': 0},
+                              {'FirstRow': 2, 'LastRow': 2, 'FirstColumn': 1, 'LastColumn': 1}])
+
+    def test_sparse_iteration(self):
+        """
+        Test that no cell is created for the empty coordinates of the worksheet
+        :return:
+        """
+        for engine in ENGINES:
+            worksheet = _open_workbook(BytesIO(self.buffer.getvalue()), engine).worksheets[0]
+            num_cells = len(worksheet._cells)
+            process_ws(worksheet)
+            self.assertEqual(len(worksheet._cells), num_cells)
+
+    def test_empty_sheet(self):
+        """
+        Test that a worksheet with formatting only has no table
+        :return:
+        """
+        for engine in ENGINES:
+            worksheet = _open_workbook(BytesIO(self.buffer.getvalue()), engine).worksheets[1]
+            self.assertIsNone(process_ws(worksheet))
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestUsedRange)
+unittest.TextTestRunner(verbosity=2).run(suite)
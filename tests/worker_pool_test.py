@@ -0,0 +1,105 @@
+#
+# worker_pool_test.py
+# Test the time and memory limits of the workers
+#
+
+import sys
+import unittest
+import os
+import queue
+import shutil
+import tempfile
+import time
+from extraction_engine import batch_process_wb
+from run_manifest import RunManifest, DONE, TIMEOUT
+from worker_pool import WorkerPool, WorkerKilled
+
+sys.path.append('../')
+
+
+class TestWorkerPool(unittest.TestCase):
+    """Test the worker pool"""
+
+    def run_tasks(self, pool, func, args_list):
+        results = queue.Queue()
+        for args in args_list:
+            pool.apply_async(func, args, callback=results.put, error_callback=results.put)
+        return [results.get(timeout=30) for _ in args_list]
+
+    def test_timeout(self):
+        """
+        Test that a worker over the time limit is killed and replaced
+        :return:
+        """
+        with WorkerPool(1, timeout=0.3) as pool:
+            start = time.perf_counter()
+            error, = self.run_tasks(pool, time.sleep, [(10,)])
+            self.assertLess(time.perf_counter() - start, 5)
+            self.assertIsInstance(error, WorkerKilled)
+            self.assertEqual(error.reason, 'timeout')
+            self.assertEqual(self.run_tasks(pool, time.sleep, [(0,)]), [None])
+
+    def test_memory_limit(self):
+        """
+        Test that a worker over the memory limit is killed
+        :return:
+        """
+        with WorkerPool(1, memory_limit=1 << 20) as pool:
+            error, = self.run_tasks(pool, time.sleep, [(10,)])
+            self.assertEqual(error.reason, 'memory')
+
+    def test_crash(self):
+        """
+        Test that a worker that dies is replaced, and that the exceptions of the tasks are passed on
+        :return:
+        """
+        with WorkerPool(1) as pool:
+            error, = self.run_tasks(pool, os._exit, [(3,)])
+            self.assertEqual(error.reason, 'crash')
+            error, result = self.run_tasks(pool, int, [('x',), ('7',)])
+            self.assertIsInstance(error, ValueError)
+            self.assertEqual(result, 7)
+
+    def test_recycling(self):
+        """
+        Test that the workers are replaced after a number of tasks
+        :return:
+        """
+        with WorkerPool(1, max_tasks=2) as pool:
+            pids = self.run_tasks(pool, os.getpid, [()] * 5)
+        self.assertEqual(len(set(pids)), 3)
+
+    def test_batch(self):
+        """
+        Test that a workbook over the time limit is recorded and the run goes on
+        :return:
+        """
+        ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                os.mkdir('data')
+                os.mkdir('output')
+                shutil.copy(ROOT_DIR + '/test-data/10-K.xlsx', 'data/10-K.xlsx')
+                shutil.copy(ROOT_DIR + '/test-data/8-K.xlsx', 'data/8-K.xlsx')
+                batch_process_wb('data', workers=1, timeout=0.01, max_tasks_per_worker=1,
+                                 manifest='output/manifest.jsonl')
+                with RunManifest('output/manifest.jsonl') as manifest:
+                    statuses = {file: entry['status'] for file, entry in manifest.entries.items()}
+                self.assertEqual(statuses['data/10-K.xlsx'], TIMEOUT)
+                # Neither the output nor its temporary file is left behind
+                self.assertFalse([name for name in os.listdir('output') if name.startswith('10-K')])
+                batch_process_wb('data', workers=1, timeout=60, manifest='output/manifest.jsonl',
+                                 retry_failed=True)
+                with RunManifest('output/manifest.jsonl') as manifest:
+                    self.assertEqual(manifest.entries['data/10-K.xlsx']['status'], DONE)
+                    self.assertEqual(manifest.entries['data/8-K.xlsx']['status'], DONE)
+                with self.assertRaises(ValueError):
+                    batch_process_wb('data', workers=0, timeout=60)
+            finally:
+                os.chdir(cwd)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestWorkerPool)
+unittest.TextTestRunner(verbosity=2).run(suite)
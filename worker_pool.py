@@ -0,0 +1,206 @@
+#
+# worker_pool.py
+# Process pool that enforces per-task time and memory limits
+#
+
+import itertools
+import os
+import queue
+import threading
+import time
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import wait
+
+
+class WorkerKilled(Exception):
+    """
+    The worker of a task has been killed, or has died, before the task completed.
+    reason is 'timeout' (the time limit), 'memory' (the memory limit) or 'crash'.
+    """
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+def _worker_loop(conn, max_tasks):
+    # Run the tasks received from the parent one at a time, and exit after max_tasks
+    for _ in (itertools.repeat(None) if max_tasks is None else range(max_tasks)):
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        func, args = task
+        try:
+            result = (True, func(*args))
+        except Exception as e:
+            result = (False, e)
+        try:
+            conn.send(result)
+        except Exception as e:
+            # The result or the exception cannot be pickled
+            conn.send((False, RuntimeError(repr(e))))
+
+
+def _rss(pid):
+    # The current RSS (bytes) of a process, or None if not available
+    try:
+        with open(f'/proc/{pid}/statm') as fp:
+            return int(fp.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _Worker(object):
+    def __init__(self, max_tasks):
+        self.conn, child_conn = Pipe()
+        self.process = Process(target=_worker_loop, args=(child_conn, max_tasks), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.tasks_left = max_tasks
+        # The running task: (callback, error_callback) and its start time
+        self.task = None
+        self.started = None
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class WorkerPool(object):
+    """
+    A pool of worker processes with the apply_async interface of multiprocessing.Pool
+    (the callbacks are called by a thread of the pool), where each worker runs one task
+    at a time, so that the parent knows which task each worker runs and since when:
+    - a worker that exceeds the time limit or the memory limit (RSS) with a task is killed
+      and replaced, and the error callback of the task gets a WorkerKilled error
+    - a worker that dies during a task (e.g. killed by the OOM killer) is replaced as well
+    - a worker exits after max_tasks tasks and is replaced, so that the memory it has
+      accumulated is returned to the system
+    The memory limit requires /proc (Linux).
+    """
+
+    def __init__(self, workers, timeout=None, memory_limit=None, max_tasks=None, poll_interval=0.1):
+        """
+        :param workers: the number of worker processes
+        :param timeout: the time limit of a task (seconds)
+        :param memory_limit: the memory limit of a worker (bytes)
+        :param max_tasks: the number of tasks after which a worker is replaced
+        :param poll_interval: the interval of the memory checks (seconds)
+        """
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.max_tasks = max_tasks
+        self.poll_interval = poll_interval
+        self._tasks = queue.Queue()
+        # Wakes up the dispatcher thread when a task is submitted or the pool is closed
+        self._wakeup_reader, self._wakeup_writer = Pipe(duplex=False)
+        self._closed = False
+        self._workers = [_Worker(max_tasks) for _ in range(workers)]
+        self._thread = threading.Thread(target=self._dispatch, daemon=True)
+        self._thread.start()
+
+    def apply_async(self, func, args=(), callback=None, error_callback=None):
+        """
+        Submit a task
+        :param func: the function (it must be picklable)
+        :param args: the arguments (they must be picklable)
+        :param callback: called with the result
+        :param error_callback: called with the exception raised by the task, or with WorkerKilled
+        :return:
+        """
+        self._tasks.put((func, args, callback, error_callback))
+        self._wakeup_writer.send_bytes(b'')
+
+    def _replace(self, index):
+        self._workers[index].kill()
+        self._workers[index] = _Worker(self.max_tasks)
+
+    def _finish(self, worker, ok, result):
+        callback, error_callback = worker.task
+        worker.task = None
+        worker.started = None
+        if ok:
+            if callback is not None:
+                callback(result)
+        elif error_callback is not None:
+            error_callback(result)
+
+    def _dispatch(self):
+        while not self._closed:
+            # Start the submitted tasks on the idle workers
+            for worker in self._workers:
+                if worker.task is None and worker.tasks_left != 0 and not self._tasks.empty():
+                    func, args, callback, error_callback = self._tasks.get()
+                    try:
+                        worker.conn.send((func, args))
+                    except Exception as e:
+                        if error_callback is not None:
+                            error_callback(e)
+                        continue
+                    worker.task = (callback, error_callback)
+                    worker.started = time.monotonic()
+                    if worker.tasks_left is not None:
+                        worker.tasks_left -= 1
+            # Wait for a result, an exit, a new task or the next check of the limits
+            timeout = None
+            if self.memory_limit is not None:
+                timeout = self.poll_interval
+            if self.timeout is not None:
+                for worker in self._workers:
+                    if worker.started is not None:
+                        left = max(0.0, worker.started + self.timeout - time.monotonic())
+                        timeout = left if timeout is None else min(timeout, left)
+            ready = wait([self._wakeup_reader] + [worker.conn for worker in self._workers] +
+                         [worker.process.sentinel for worker in self._workers], timeout)
+            if self._wakeup_reader in ready:
+                while self._wakeup_reader.poll():
+                    self._wakeup_reader.recv_bytes()
+            now = time.monotonic()
+            for index, worker in enumerate(self._workers):
+                if worker.task is not None and worker.conn in ready:
+                    try:
+                        ok, result = worker.conn.recv()
+                    except (EOFError, OSError):
+                        pass
+                    else:
+                        self._finish(worker, ok, result)
+                if worker.task is not None:
+                    error = None
+                    if not worker.process.is_alive():
+                        error = WorkerKilled('crash', f'The worker exited with code {worker.process.exitcode}')
+                    elif self.timeout is not None and now - worker.started >= self.timeout:
+                        error = WorkerKilled('timeout', f'Timed out after {self.timeout}s')
+                    elif self.memory_limit is not None:
+                        rss = _rss(worker.process.pid)
+                        if rss is not None and rss > self.memory_limit:
+                            error = WorkerKilled('memory', f'Exceeded the memory limit ({rss >> 20} MB)')
+                    if error is not None:
+                        self._replace(index)
+                        self._finish(worker, False, error)
+                elif not worker.process.is_alive():
+                    # Recycled after max_tasks tasks
+                    self._replace(index)
+
+    def terminate(self):
+        """
+        Stop the workers, without waiting for the tasks in progress
+        :return:
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup_writer.send_bytes(b'')
+        self._thread.join()
+        for worker in self._workers:
+            worker.kill()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.terminate()
+        return False
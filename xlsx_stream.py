@@ -0,0 +1,334 @@
+#
+# xlsx_stream.py
+# Lightweight streaming reader for xlsx workbooks
+#
+# The reader opens the zip parts directly: sharedStrings and styles.xml are
+# resolved once per workbook, and each sheet XML is parsed incrementally
+# only when the sheet is accessed. The worksheet objects expose the small
+# subset of the openpyxl worksheet API that process_ws() relies on
+# (title, dimensions, slicing by range, merged_cells) and reproduce the
+# cell bookkeeping that openpyxl performs in full mode (merged ranges,
+# hyperlinks, comments), so that the extracted tables are identical.
+#
+
+import re
+from copy import copy
+
+from openpyxl.cell.cell import ERROR_CODES, MergedCell
+from openpyxl.comments.comment_sheet import CommentSheet
+from openpyxl.packaging.manifest import Manifest
+from openpyxl.packaging.relationship import RelationshipList, get_dependents, get_rels_path
+from openpyxl.reader.excel import _find_workbook_part, _validate_archive
+from openpyxl.reader.strings import read_string_table
+from openpyxl.reader.workbook import WorkbookParser
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.styles.styleable import StyleableObject
+from openpyxl.styles.stylesheet import apply_stylesheet
+from openpyxl.utils import get_column_letter, range_boundaries
+from openpyxl.worksheet._reader import WorkSheetParser
+from openpyxl.worksheet.cell_range import MultiCellRange
+from openpyxl.worksheet.merge import MergedCellRange
+from openpyxl.worksheet.worksheet import Worksheet
+from openpyxl.xml.constants import ARC_CONTENT_TYPES, COMMENTS_NS, SHARED_STRINGS
+from openpyxl.xml.functions import fromstring
+
+# The dimension element precedes sheetData, so it is found in the first few KB of the sheet XML
+_DIMENSION_RE = re.compile(rb'<(?:\w+:)?dimension\s+ref="([^"]*)"')
+_SHEET_DATA_RE = re.compile(rb'<(?:\w+:)?sheetData[\s/>]')
+_DIMENSION_CHUNK_SIZE = 4096
+_DIMENSION_MAX_BYTES = 65536
+
+
+class StreamCell(StyleableObject):
+    """
+    A minimal cell: value, data type and a reference to the workbook style array.
+    The style array is shared between all the cells with the same style id and
+    is only copied when a cell is restyled (e.g. the borders of merged ranges).
+    """
+
+    __slots__ = ('row', 'column', 'value', 'data_type')
+
+    def __init__(self, worksheet, row, column, value=None, data_type='n', style_array=None):
+        self.parent = worksheet
+        self._style = style_array if style_array is not None else StyleArray()
+        self.row = row
+        self.column = column
+        self.value = value
+        self.data_type = data_type
+
+    @property
+    def coordinate(self):
+        return f'{get_column_letter(self.column)}{self.row}'
+
+    @property
+    def hyperlink(self):
+        return None
+
+    @hyperlink.setter
+    def hyperlink(self, link):
+        # Same as openpyxl: a hyperlink fills in the value (and type) of an empty cell
+        if self.value is None:
+            value = link.target or link.location
+            self.data_type = 'n'
+            if value is not None:
+                value = str(value)[:32767]
+                self.data_type = 's'
+                if len(value) > 1 and value.startswith('='):
+                    self.data_type = 'f'
+                elif value in ERROR_CODES:
+                    self.data_type = 'e'
+            self.value = value
+
+    def __repr__(self):
+        return f'<StreamCell {self.parent.title!r}.{self.coordinate}>'
+
+
+class StreamWorksheet(object):
+    """
+    A worksheet whose cells are parsed from the sheet XML on first access
+    """
+
+    def __init__(self, workbook, title, part, position=None):
+        self.parent = workbook
+        self.title = title
+        self.position = position
+        self._part = part
+        self._declared_dimensions = False
+        self._rels = None
+        self._cells_cache = None
+        self._merged_cells = None
+
+    @property
+    def _cells(self):
+        if self._cells_cache is None:
+            self._load()
+        return self._cells_cache
+
+    @property
+    def merged_cells(self):
+        if self._cells_cache is None:
+            self._load()
+        return self._merged_cells
+
+    @property
+    def compressed_size(self):
+        """
+        The size of the sheet XML in the archive (from the zip directory, nothing is decompressed)
+        """
+        return self.parent.archive.getinfo(self._part).compress_size
+
+    @property
+    def uncompressed_size(self):
+        """
+        The size of the decompressed sheet XML (from the zip directory, nothing is decompressed)
+        """
+        return self.parent.archive.getinfo(self._part).file_size
+
+    @property
+    def declared_dimensions(self):
+        """
+        The range of the dimension element of the sheet XML (e.g. A1:D20) or None if
+        there is none. Only the beginning of the sheet XML is decompressed.
+        """
+        if self._declared_dimensions is False:
+            self._declared_dimensions = None
+            head = b''
+            with self.parent.archive.open(self._part) as src:
+                while len(head) < _DIMENSION_MAX_BYTES:
+                    chunk = src.read(_DIMENSION_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    head += chunk
+                    match = _DIMENSION_RE.search(head)
+                    if match is not None:
+                        self._declared_dimensions = match.group(1).decode()
+                        break
+                    if _SHEET_DATA_RE.search(head):
+                        break
+        return self._declared_dimensions
+
+    def release(self):
+        """
+        Drop the parsed cells so that the memory is reclaimed once the sheet has been processed
+        """
+        self._cells_cache = None
+        self._merged_cells = None
+
+    def _load(self):
+        wb = self.parent
+        if self._rels is None:
+            self._rels = wb._get_rels(self._part)
+        self._cells_cache = {}
+        self._merged_cells = MultiCellRange()
+        with wb.archive.open(self._part) as src:
+            parser = WorkSheetParser(src, wb.shared_strings, False, wb.epoch,
+                                     wb._date_formats, wb._timedelta_formats)
+            self._bind_cells(parser)
+        self._bind_merged_cells(parser)
+        self._bind_hyperlinks(parser)
+        self._bind_comments()
+
+    def _bind_cells(self, parser):
+        cells = self._cells_cache
+        cell_styles = self.parent._cell_styles
+        for _, row in parser.parse():
+            for cell in row:
+                r = cell['row']
+                c = cell['column']
+                cells[(r, c)] = StreamCell(self, r, c, cell['value'], cell['data_type'],
+                                           cell_styles[cell['style_id']])
+
+    def _bind_merged_cells(self, parser):
+        if not parser.merged_cells:
+            return
+        ranges = []
+        for cr in parser.merged_cells.mergeCell:
+            # The top left cell gets restyled: detach it from the shared style array
+            min_col, min_row, _, _ = range_boundaries(cr.ref)
+            start_cell = self._cells_cache.get((min_row, min_col))
+            if start_cell is not None:
+                start_cell._style = StyleArray(start_cell._style)
+            mcr = MergedCellRange(self, cr.ref)
+            Worksheet._clean_merge_range(self, mcr)
+            ranges.append(mcr)
+        self._merged_cells = MultiCellRange(ranges)
+
+    def _bind_hyperlinks(self, parser):
+        for link in parser.hyperlinks.hyperlink:
+            if link.id:
+                link.target = self._rels[link.id].Target
+            if ":" in link.ref:
+                min_col, min_row, max_col, max_row = range_boundaries(link.ref)
+                for row in range(min_row, max_row + 1):
+                    for col in range(min_col, max_col + 1):
+                        cell = self.cell(row, col)
+                        try:
+                            cell.hyperlink = copy(link)
+                        except AttributeError:
+                            pass
+            else:
+                min_col, min_row, _, _ = range_boundaries(link.ref)
+                cell = self.cell(min_row, min_col)
+                if isinstance(cell, MergedCell):
+                    cell = None
+                    for rng in self._merged_cells:
+                        if link.ref in rng:
+                            cell = self.cell(*rng.top[0])
+                            break
+                cell.hyperlink = link
+
+    def _bind_comments(self):
+        # Comments carry no data but openpyxl creates their cells, which may widen the dimensions
+        for r in self._rels.find(COMMENTS_NS):
+            comment_sheet = CommentSheet.from_tree(fromstring(self.parent.archive.read(r.target)))
+            for ref, _ in comment_sheet.comments:
+                min_col, min_row, _, _ = range_boundaries(ref)
+                self.cell(min_row, min_col)
+
+    def cell(self, row, column):
+        """
+        Get the cell at the given position, creating an empty one if needed
+        :param row: the 1-based row index
+        :param column: the 1-based column index
+        :return: the cell
+        """
+        cell = self._cells.get((row, column))
+        if cell is None:
+            cell = StreamCell(self, row, column)
+            self._cells_cache[(row, column)] = cell
+        return cell
+
+    @property
+    def dimensions(self):
+        """
+        The range covered by the cells of the sheet, computed as openpyxl does
+        :return: a range string, e.g. A1:D20
+        """
+        if not self._cells:
+            return "A1:A1"
+        rows = set()
+        cols = set()
+        for row, col in self._cells:
+            rows.add(row)
+            cols.add(col)
+        return f"{get_column_letter(min(cols))}{min(rows)}:{get_column_letter(max(cols))}{max(rows)}"
+
+    def __getitem__(self, key):
+        """
+        Get the cells of the given range as a tuple of rows. Missing cells are
+        represented by an unstyled empty cell that is not stored in the sheet.
+        :param key: a range string, e.g. A1:D20
+        :return: a tuple of tuples with the cells
+        """
+        min_col, min_row, max_col, max_row = range_boundaries(key)
+        cells = self._cells
+        empty = StreamCell(self, None, None)
+        return tuple(
+            tuple(cells.get((row, col), empty) for col in range(min_col, max_col + 1))
+            for row in range(min_row, max_row + 1)
+        )
+
+
+class StreamWorkbook(object):
+    """
+    Read the sheets of an xlsx workbook without building the openpyxl object model.
+    Only the workbook part is read when the workbook is opened. Shared strings
+    and styles are loaded once, when the first sheet is parsed, and the sheets
+    are parsed lazily.
+    """
+
+    def __init__(self, filename):
+        self.archive = _validate_archive(filename)
+        self._valid_files = set(self.archive.namelist())
+        self._package = Manifest.from_tree(fromstring(self.archive.read(ARC_CONTENT_TYPES)))
+        self._shared_strings = None
+        self._styles_loaded = False
+        parser = WorkbookParser(self.archive, _find_workbook_part(self._package).PartName[1:])
+        parser.parse()
+        # The parser's (empty) workbook hosts the style tables that the cell styles refer to
+        self._wb = parser.wb
+        self.epoch = self._wb.epoch
+        self.worksheets = []
+        for sheet, rel in parser.find_sheets():
+            if rel.target not in self._valid_files or "chartsheet" in rel.Type:
+                continue
+            self.worksheets.append(StreamWorksheet(self, sheet.name, rel.target, len(self.worksheets)))
+
+    @property
+    def shared_strings(self):
+        if self._shared_strings is None:
+            self._shared_strings = []
+            ct = self._package.find(SHARED_STRINGS)
+            if ct is not None:
+                with self.archive.open(ct.PartName[1:]) as src:
+                    self._shared_strings = read_string_table(src)
+        return self._shared_strings
+
+    def _get_rels(self, part):
+        """
+        Get the relationships of a sheet part
+        :param part: the sheet part name
+        :return: a RelationshipList
+        """
+        rels_path = get_rels_path(part)
+        if rels_path in self._valid_files:
+            return get_dependents(self.archive, rels_path)
+        return RelationshipList()
+
+    def __getattr__(self, name):
+        # Style tables (_cell_styles, _fonts, _borders, ...) are looked up on the host workbook
+        if name.startswith('_') and name not in ('_wb', '_styles_loaded'):
+            if not self._styles_loaded:
+                apply_stylesheet(self.archive, self._wb)
+                self._styles_loaded = True
+            return getattr(self._wb, name)
+        raise AttributeError(name)
+
+    def __getitem__(self, title):
+        for ws in self.worksheets:
+            if ws.title == title:
+                return ws
+        raise KeyError(f"Worksheet {title} does not exist.")
+
+    def close(self):
+        self.archive.close()